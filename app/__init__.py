@@ -1,14 +1,26 @@
 from flask import Flask
 
+from . import authors, backup, db, isbn, metrics, readmodel
+from .config import Config
 from .models import init_db
 
 
 def create_app():
     app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.from_prefixed_env("BOOKTRACKER")
+    db.init_app(app)
+    authors.init_app(app)
+    backup.init_app(app)
+    isbn.init_app(app)
+    metrics.init_app(app)
+    readmodel.init_app(app)
 
     with app.app_context():
-        init_db()
-        from . import routes
+        # Other libraries are initialized on first use.
+        db.pool.init_hooks.append(init_db)
+        db.pool.open()
+        from . import commands, routes
 
     return app
 
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import Context
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qs
+
+from .isbn import isbn_lookup, prefetched_volumes
+
+# Request bodies larger than this are spooled to disk.
+MAX_MEMORY_BODY = 1024 * 1024
+
+_ISBN_PATH = re.compile(r"/api/books/isbn/(?!(?:batch|cache)$)([^/]+)")
+
+
+class AsgiApp:
+    """Serve the Flask app from an ASGI server such as uvicorn.
+
+    Views run unchanged in a bounded pool of `ASYNC_WORKERS` threads, so that
+    no more SQLite work than that runs at once. ISBN lookups are resolved on
+    the event loop before their view runs, see `IsbnLookup.prefetch`: while
+    Google Books is slow, the threads keep serving the other routes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config["ASYNC_WORKERS"], thread_name_prefix="booktracker"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await isbn_lookup.aclose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = SpooledTemporaryFile(max_size=MAX_MEMORY_BODY)
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                body.close()
+                return
+            body.write(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body.seek(0)
+
+        with body:
+            isbns = self._isbns(scope, body)
+            prefetched = await isbn_lookup.prefetch(isbns, self.executor) if isbns else None
+            environ = self._environ(scope, body)
+            loop = asyncio.get_running_loop()
+            # A new context per request, the threads are reused.
+            await loop.run_in_executor(
+                self.executor, Context().run, self._run, environ, prefetched, send, loop
+            )
+
+    def _isbns(self, scope, body) -> list:
+        """Return the ISBNs the request looks up, empty when it looks none up."""
+        path = scope["path"].removeprefix(scope.get("root_path", ""))
+        if scope["method"] == "GET" and (match := _ISBN_PATH.fullmatch(path)):
+            return [match.group(1)]
+        if scope["method"] != "POST" or path != "/api/books/isbn/batch":
+            return []
+
+        headers = dict(scope["headers"])
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        data = body.read()
+        body.seek(0)
+        if content_type.startswith("application/json"):
+            try:
+                payload = json.loads(data)
+            except ValueError:
+                return []
+            isbns = payload.get("isbns") if isinstance(payload, dict) else None
+        elif content_type.startswith("application/x-www-form-urlencoded"):
+            isbns = parse_qs(data.decode("latin-1")).get("isbn")
+        else:
+            return []
+        # Invalid batches are turned down by the view.
+        if not isinstance(isbns, list) or len(isbns) > self.app.config["ISBN_BATCH_MAX_SIZE"]:
+            return []
+        if not all(isinstance(isbn, str) for isbn in isbns):
+            return []
+        return isbns
+
+    @staticmethod
+    def _environ(scope, body) -> dict:
+        """Build the WSGI environ of a request, as PEP 3333 describes it."""
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+            "PATH_INFO": scope["path"]
+            .removeprefix(scope.get("root_path", ""))
+            .encode()
+            .decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1] or 80),
+            "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        if scope.get("client"):
+            environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = map(str, scope["client"])
+
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                name = f"HTTP_{name}"
+            if name in environ:
+                value = f"{environ[name]},{value}"
+            environ[name] = value
+        return environ
+
+    def _run(self, environ, prefetched, send, loop):
+        """Call the Flask app in a worker thread and send its response from the loop.
+
+        The response is sent chunk by chunk, waiting for each to be sent: a
+        streamed export is read on a single thread, at the pace of the client.
+        """
+        prefetched_volumes.set(prefetched)
+        started = []
+
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started and started[0] is None:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started[:] = [status, headers]
+            return write
+
+        def start():
+            if started and started[0] is not None:
+                status, headers = started
+                send_message(
+                    {
+                        "type": "http.response.start",
+                        "status": int(status.split(" ", 1)[0]),
+                        "headers": [
+                            (name.lower().encode("latin-1"), value.encode("latin-1"))
+                            for name, value in headers
+                        ],
+                    }
+                )
+                # Started, the headers can no longer change.
+                started[0] = None
+
+        def write(data):
+            start()
+            if data:
+                send_message({"type": "http.response.body", "body": data, "more_body": True})
+
+        result = self.app(environ, start_response)
+        try:
+            for chunk in result:
+                write(chunk)
+            start()
+            send_message({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
@@ -0,0 +1,254 @@
+import threading
+from collections import OrderedDict
+
+from .db import pool
+
+# Keep the number of bound parameters below SQLite's historical limit of 999.
+AUTHOR_LOOKUP_SIZE = 400
+
+_ASCII_LOWER = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"
+)
+
+
+def nocase(text):
+    """Fold a string the way SQLite's NOCASE collation does (ASCII only)."""
+    return text.translate(_ASCII_LOWER)
+
+
+def author_key(author_last, author_first) -> tuple[str, str]:
+    """Return the key identifying an author, as compared by the UNIQUE constraint."""
+    return nocase(author_last), nocase(author_first or "")
+
+
+# Inserts an author or touches the existing one, returning its ID either way.
+# The touch leaves the names as they are, the author triggers ignore it.
+_UPSERT_AUTHORS = """
+    INSERT INTO authors (author_last, author_first)
+    VALUES {values}
+    ON CONFLICT (author_last, author_first) DO UPDATE SET author_last = author_last
+    RETURNING id, author_last, author_first
+"""
+
+
+class AuthorResolver:
+    """Maps author names to IDs, creating missing authors.
+
+    Resolved IDs are kept in a bounded LRU cache keyed on the NOCASE-folded
+    names. IDs resolved in a transaction enter the cache once it commits: an
+    author inserted by a transaction that rolls back does not exist, and its ID
+    would be handed to the next new author.
+
+    Authors left without books are not deleted by the write that orphaned them:
+    they are recorded and swept in batches, see `sweep`.
+
+    The cache and the candidates are kept per library, with its pool.
+    """
+
+    def __init__(self, cache_size=4096, sweep_batch=100):
+        self.cache_size = cache_size
+        self.sweep_batch = sweep_batch
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def reset(self):
+        """Drop the cached IDs and the sweep candidates of the current library."""
+        cache, candidates = self._library()
+        with self._lock:
+            cache.clear()
+            candidates.clear()
+
+    @staticmethod
+    def _library() -> tuple[OrderedDict, set]:
+        """Return the cached IDs and the sweep candidates of the current library."""
+        state = pool.state
+        if "authors" not in state:
+            state.setdefault("authors", (OrderedDict(), set()))
+        return state["authors"]
+
+    # Resolution
+
+    def resolve(self, cursor, author_last, author_first) -> int:
+        """Return the ID of an author, inserting the author if needed."""
+        key = author_key(author_last, author_first)
+        author_id = self._cached(key, self._library()[0])
+        if author_id is None:
+            author_id = self._upsert(cursor, [(author_last, author_first or "")])[key]
+        return author_id
+
+    def resolve_many(self, cursor, names) -> dict:
+        """Map many `(author_last, author_first)` names to IDs at once.
+
+        The result is keyed with `author_key`. Missing authors are inserted
+        with one statement per `AUTHOR_LOOKUP_SIZE` names.
+        """
+        author_ids = {}
+        missing = {}
+        cache, _ = self._library()
+        for author_last, author_first in names:
+            key = author_key(author_last, author_first)
+            author_id = self._cached(key, cache)
+            if author_id is None:
+                missing.setdefault(key, (author_last, author_first or ""))
+            else:
+                author_ids[key] = author_id
+
+        missing = list(missing.values())
+        for i in range(0, len(missing), AUTHOR_LOOKUP_SIZE):
+            author_ids.update(self._upsert(cursor, missing[i : i + AUTHOR_LOOKUP_SIZE]))
+        return author_ids
+
+    def forget(self, author_last, author_first) -> None:
+        """Drop an author from the cache, after another process deleted them."""
+        key = author_key(author_last, author_first)
+        cache, _ = self._library()
+        with self._lock:
+            cache.pop(key, None)
+        pending = getattr(self._local, "pending", None)
+        if pending:
+            pending.pop(key, None)
+
+    def _cached(self, key, cache):
+        pending = getattr(self._local, "pending", None)
+        if pending and key in pending:
+            return pending[key]
+        with self._lock:
+            author_id = cache.get(key)
+            if author_id is not None:
+                cache.move_to_end(key)
+            return author_id
+
+    def _upsert(self, cursor, names) -> dict:
+        values = ", ".join(["(?, ?)"] * len(names))
+        cursor.execute(
+            _UPSERT_AUTHORS.format(values=values),
+            [part for name in names for part in name],
+        )
+        author_ids = {
+            author_key(author_last, author_first): author_id
+            for author_id, author_last, author_first in cursor.fetchall()
+        }
+        if getattr(self._local, "pending", None) is None:
+            self._local.pending = {}
+        self._local.pending.update(author_ids)
+        return author_ids
+
+    def apply(self, conn=None) -> None:
+        """Cache the IDs resolved in the transaction that just committed.
+
+        The sweep candidates it swept are dropped as well.
+        """
+        pending, self._local.pending = getattr(self._local, "pending", None), None
+        swept, self._local.swept = getattr(self._local, "swept", None), None
+        cache, candidates = self._library()
+        if swept:
+            with self._lock:
+                candidates.difference_update(swept)
+        if not pending or not self.cache_size:
+            return
+        with self._lock:
+            cache.update(pending)
+            for key in pending:
+                cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+    def discard(self, conn=None) -> None:
+        """Drop the IDs resolved in the transaction that rolled back.
+
+        The candidates it swept stay candidates.
+        """
+        self._local.pending = None
+        self._local.swept = None
+
+    def mark(self, conn=None):
+        """Return a callable dropping the IDs resolved from now on, for savepoints.
+
+        Authors inserted under a savepoint that rolls back do not exist either,
+        and the candidates swept under it stay candidates.
+        """
+        pending = getattr(self._local, "pending", None)
+        pending = dict(pending) if pending else None
+        swept = getattr(self._local, "swept", None)
+        swept = set(swept) if swept else None
+
+        def rewind(conn=None):
+            self._local.pending = pending
+            self._local.swept = swept
+
+        return rewind
+
+    # Orphan sweep
+
+    def release(self, cursor, author_id) -> None:
+        """Record that an author may have lost their last book.
+
+        Once `sweep_batch` authors are recorded, those left without books are
+        deleted in the current transaction. They stay recorded until it
+        commits: a sweep rolled back is taken again by a later write.
+        """
+        _, candidates = self._library()
+        swept = getattr(self._local, "swept", None) or set()
+        with self._lock:
+            candidates.add(author_id)
+            author_ids = candidates - swept
+        if len(author_ids) >= self.sweep_batch:
+            self.sweep(cursor, author_ids)
+
+    def sweep(self, cursor, author_ids=None) -> int:
+        """Delete the authors without books among `author_ids`, or all of them.
+
+        The swept candidates are dropped once the transaction commits. Return
+        the number of authors deleted.
+        """
+        cache, candidates = self._library()
+        if author_ids is None:
+            cursor.execute(
+                """
+                DELETE FROM authors
+                WHERE NOT EXISTS (SELECT 1 FROM books WHERE author_id = authors.id)
+                RETURNING id
+            """
+            )
+            deleted = {row[0] for row in cursor.fetchall()}
+            with self._lock:
+                author_ids = set(candidates)
+        else:
+            deleted = set()
+            author_ids = list(author_ids)
+            for i in range(0, len(author_ids), AUTHOR_LOOKUP_SIZE):
+                chunk = author_ids[i : i + AUTHOR_LOOKUP_SIZE]
+                cursor.execute(
+                    f"""
+                    DELETE FROM authors
+                    WHERE id IN ({", ".join("?" * len(chunk))})
+                    AND NOT EXISTS (SELECT 1 FROM books WHERE author_id = authors.id)
+                    RETURNING id
+                """,
+                    chunk,
+                )
+                deleted.update(row[0] for row in cursor.fetchall())
+
+        if getattr(self._local, "swept", None) is None:
+            self._local.swept = set()
+        self._local.swept.update(author_ids)
+        if deleted:
+            with self._lock:
+                for key in [key for key, value in cache.items() if value in deleted]:
+                    del cache[key]
+            pending = getattr(self._local, "pending", None)
+            for key in [key for key, value in (pending or {}).items() if value in deleted]:
+                del pending[key]
+        return len(deleted)
+
+
+author_resolver = AuthorResolver()
+
+
+def init_app(app):
+    """Size the author cache and sweep from the application config."""
+    author_resolver.cache_size = app.config["AUTHOR_CACHE_SIZE"]
+    author_resolver.sweep_batch = app.config["AUTHOR_SWEEP_BATCH"]
+    pool.commit_hooks.append(author_resolver.apply)
+    pool.rollback_hooks.append(author_resolver.discard)
+    pool.savepoint_hooks.append(author_resolver.mark)
@@ -0,0 +1,269 @@
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .db import pool
+
+MODES = ("online", "vacuum")
+
+
+class _Restarted(Exception):
+    """Raised to stop a copy restarted too often by writes."""
+
+
+class BackupManager:
+    """Snapshots of the libraries, taken and restored while the app serves them.
+
+    The snapshots of a library are `<directory>/<library>/<library>-<UTC time>Z.db`.
+    The online mode copies the database with SQLite's backup API,
+    `pages_per_step` pages at a time with `step_pause` seconds in between:
+    each step is a short read transaction, writers go on between steps and,
+    in WAL mode, never wait on one. A write of another connection restarts the
+    copy, after `max_restarts` restarts the rest is copied in a single step.
+    The vacuum mode writes a compacted copy with `VACUUM INTO`, in a single
+    read transaction.
+
+    A snapshot is written under a temporary name and renamed once complete,
+    then the oldest snapshots of the library beyond `retention` are deleted.
+    """
+
+    def __init__(
+        self, directory="backups", pages_per_step=256, step_pause=0.005, max_restarts=3, retention=7
+    ):
+        self.configure(directory, pages_per_step, step_pause, max_restarts, retention)
+
+    def configure(
+        self, directory="backups", pages_per_step=256, step_pause=0.005, max_restarts=3, retention=7
+    ):
+        self.directory = Path(directory)
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self.max_restarts = max_restarts
+        self.retention = retention
+
+    # Snapshots
+
+    def snapshots(self, library=None) -> list[Path]:
+        """Return the snapshots of a library, the current one by default, oldest first."""
+        library = library or pool.library
+        directory = self.directory / library
+        return sorted(directory.glob(f"{library}-*Z.db")) if directory.is_dir() else []
+
+    def snapshot(self, library=None, mode="online") -> dict:
+        """Take a snapshot of a library, the current one by default, and report on it."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown backup mode: {mode}")
+        library = library or pool.library
+        source_path = pool.path(library)
+        if not source_path.exists():
+            raise RuntimeError(f"No database for library {library}: {source_path}")
+
+        directory = self.directory / library
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")[:-3]
+        path = directory / f"{library}-{stamp}Z.db"
+        if path.exists():
+            raise RuntimeError(f"Snapshot {path} already exists")
+        partial = path.with_name(f"{path.name}.partial")
+        partial.unlink(missing_ok=True)
+
+        start = time.perf_counter()
+        source = self._connect(source_path)
+        try:
+            if mode == "vacuum":
+                source.execute("VACUUM INTO ?", (str(partial),))
+                steps, restarts = 1, 0
+            else:
+                steps, restarts = self._copy(source, partial)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        finally:
+            source.close()
+        partial.replace(path)
+        seconds = time.perf_counter() - start
+
+        return {
+            "library": library,
+            "mode": mode,
+            "path": str(path),
+            "seconds": round(seconds, 3),
+            "pages": self._page_count(path),
+            "steps": steps,
+            "restarts": restarts,
+            "size": path.stat().st_size,
+            "pruned": [str(expired) for expired in self.prune(library)],
+        }
+
+    def prune(self, library=None) -> list[Path]:
+        """Delete the oldest snapshots of a library beyond the retention, return them."""
+        if self.retention is None:
+            return []
+        snapshots = self.snapshots(library)
+        expired = snapshots[: max(len(snapshots) - self.retention, 0)]
+        for path in expired:
+            path.unlink(missing_ok=True)
+        return expired
+
+    def _copy(self, source, path) -> tuple[int, int]:
+        """Copy `source` into a new database at `path`, return the steps and restarts."""
+        progress = {"steps": 0, "restarts": 0, "remaining": None}
+
+        def on_step(status, remaining, total):
+            if progress["remaining"] is not None and remaining > progress["remaining"]:
+                progress["restarts"] += 1
+                if progress["restarts"] > self.max_restarts:
+                    raise _Restarted
+            progress["remaining"] = remaining
+            progress["steps"] += 1
+            if remaining and self.step_pause:
+                time.sleep(self.step_pause)
+
+        target = sqlite3.connect(path)
+        try:
+            try:
+                source.backup(target, pages=self.pages_per_step, progress=on_step)
+            except _Restarted:
+                # One read transaction, writers in WAL mode still go on.
+                source.backup(target)
+                progress["steps"] += 1
+            # The copy would otherwise open a write-ahead log of its own.
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+        return progress["steps"], progress["restarts"]
+
+    # Restore
+
+    def restore(self, snapshot, library=None) -> dict:
+        """Replace a library, the current one by default, with a snapshot.
+
+        The snapshot is checked and copied aside, where the library version is
+        moved past the live one and the change log replaced by an entry per
+        book, numbered past the live log. The copy then replaces the library in
+        a single step, one write transaction. Read models of every process see
+        a new version and, their log position being compacted away, reload, as
+        do delta sync clients. The row ID sequences are kept past the live
+        ones, IDs known before the restore are never handed out again.
+        """
+        library = library or pool.library
+        snapshot = Path(snapshot)
+        start = time.perf_counter()
+
+        check = self._connect(snapshot, read_only=True)
+        try:
+            problems = [row[0] for row in check.execute("PRAGMA quick_check")]
+        except sqlite3.DatabaseError as e:
+            raise RuntimeError(f"Failed to read snapshot {snapshot}: {e}")
+        finally:
+            check.close()
+        if problems != ["ok"]:
+            raise RuntimeError(f"Snapshot {snapshot} is damaged: {'; '.join(problems[:5])}")
+
+        live_path = pool.path(library)
+        live_path.parent.mkdir(parents=True, exist_ok=True)
+        live = self._connect(live_path)
+        try:
+            marks = self._marks(live)
+            with tempfile.TemporaryDirectory(dir=live_path.parent) as directory:
+                staged = sqlite3.connect(Path(directory) / "restore.db")
+                try:
+                    source = self._connect(snapshot, read_only=True)
+                    try:
+                        source.backup(staged)
+                    finally:
+                        source.close()
+                    self._supersede(staged, *marks)
+                    staged.commit()
+                    staged.backup(live)
+                finally:
+                    staged.close()
+        finally:
+            live.close()
+        # Migrate the restored schema and drop the state kept for the library.
+        pool.reset(library)
+        pool.open(library)
+
+        return {
+            "library": library,
+            "snapshot": str(snapshot),
+            "seconds": round(time.perf_counter() - start, 3),
+            "pages": self._page_count(live_path),
+        }
+
+    @staticmethod
+    def _marks(conn) -> tuple[int, dict]:
+        """Return the library version and the row ID sequences of a live database."""
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        version = 0
+        if "meta" in tables:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'library_version'").fetchone()
+            version = row[0] if row else 0
+        sequences = {}
+        if "sqlite_sequence" in tables:
+            sequences = dict(conn.execute("SELECT name, seq FROM sqlite_sequence"))
+        return version, sequences
+
+    @staticmethod
+    def _supersede(conn, version, sequences) -> None:
+        """Make a restored database newer than the live one it replaces."""
+        conn.execute(
+            "UPDATE meta SET value = MAX(value, ?) + 1 WHERE key = 'library_version'",
+            (version,),
+        )
+        for name, seq in sequences.items():
+            conn.execute(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (seq, name)
+            )
+            conn.execute(
+                """
+                INSERT INTO sqlite_sequence (name, seq)
+                SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+            """,
+                (name, seq, name),
+            )
+        conn.execute("DELETE FROM books_changes")
+        conn.execute("INSERT INTO books_changes (book_id) SELECT id FROM books")
+        conn.execute(
+            """
+            UPDATE meta SET value = (SELECT IFNULL(MIN(seq), 0) FROM books_changes)
+            WHERE key = 'changes_compacted_seq'
+        """
+        )
+
+    # Connections
+
+    @staticmethod
+    def _connect(path, read_only=False):
+        """Open a connection of its own, pooled connections stay with the requests."""
+        if read_only:
+            conn = sqlite3.connect(
+                f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, timeout=pool.timeout
+            )
+        else:
+            conn = sqlite3.connect(path, timeout=pool.timeout)
+        conn.execute(f"PRAGMA busy_timeout = {int(pool.timeout * 1000)}")
+        return conn
+
+    def _page_count(self, path) -> int:
+        conn = self._connect(path, read_only=True)
+        try:
+            return conn.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            conn.close()
+
+
+backups = BackupManager()
+
+
+def init_app(app):
+    """Configure the shared backups from the application config."""
+    backups.configure(
+        directory=app.config["BACKUP_PATH"],
+        pages_per_step=app.config["BACKUP_PAGES_PER_STEP"],
+        step_pause=app.config["BACKUP_STEP_PAUSE"],
+        max_restarts=app.config["BACKUP_MAX_RESTARTS"],
+        retention=app.config["BACKUP_RETENTION"],
+    )
@@ -0,0 +1,368 @@
+import re
+import sqlite3
+import time
+
+import click
+from flask import current_app
+
+from .backup import backups
+from .db import pool
+from .importer import import_data
+from .migrations import migrate, schema_version
+from .metrics import normalize_query
+from .models import Book, BookRepository, fts_query
+from .queries import FACETS, SORTS, BookFilter, facet_query, page_query
+from .readmodel import read_model
+from .stats import StatsRepository
+
+
+@current_app.cli.command("import-books")
+@click.argument("filename", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", type=int, help="Rows parsed and inserted per batch.")
+@click.option("--chunk-size", type=int, help="Rows per transaction (default: one).")
+def import_books(filename, batch_size, chunk_size) -> None:
+    """Bulk import books from a `;`-delimited CSV export."""
+    report = import_data(
+        filename,
+        batch_size=batch_size or current_app.config["IMPORT_BATCH_SIZE"],
+        chunk_size=chunk_size or current_app.config["IMPORT_CHUNK_SIZE"],
+    )
+    click.echo(report)
+
+
+@current_app.cli.command("seed-library")
+@click.argument(
+    "filename", default="data.csv", type=click.Path(exists=True, dir_okay=False)
+)
+def seed_library(filename) -> None:
+    """Import a CSV export into the library, only if it is still empty."""
+    if not BookRepository.is_empty():
+        click.echo("The library already holds books, nothing to seed")
+        return
+    report = import_data(
+        filename,
+        batch_size=current_app.config["IMPORT_BATCH_SIZE"],
+        chunk_size=current_app.config["IMPORT_CHUNK_SIZE"],
+    )
+    click.echo(report)
+
+
+@current_app.cli.command("migrate")
+def migrate_schema() -> None:
+    """Apply the pending schema migrations."""
+    with pool.connection() as conn:
+        applied = migrate(conn)
+        version = schema_version(conn)
+    if applied:
+        click.echo(f"Applied migrations {', '.join(map(str, applied))}")
+    click.echo(f"Schema at version {version}")
+
+
+@current_app.cli.command("libraries")
+def list_libraries() -> None:
+    """List the libraries with their size, last write and whether they are hot.
+
+    A library is hot while a process has it open or its log is not checkpointed.
+    """
+    # The connections of this process would keep its libraries hot.
+    pool.close()
+    libraries = pool.libraries()
+    if not libraries:
+        click.echo("No library")
+    for library in libraries:
+        modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(library["modified"]))
+        click.echo(
+            f"{library['library']:<24} {library['size'] / 1024 / 1024:>10.1f} MiB  "
+            f"{modified}  {'hot' if library['hot'] else 'cold'}"
+        )
+
+
+def _echo_snapshot(report) -> None:
+    click.echo(
+        f"{report['library']}: {report['path']}, {report['size'] / 1024 / 1024:.1f} MiB, "
+        f"{report['pages']} pages in {report['seconds']:.2f}s "
+        f"({report['mode']}, {report['steps']} steps, {report['restarts']} restarts)"
+    )
+    for path in report["pruned"]:
+        click.echo(f"    Deleted {path}")
+
+
+@current_app.cli.command("backup")
+@click.option("--vacuum", is_flag=True, help="Write a compacted copy with VACUUM INTO.")
+@click.option("--all", "all_libraries", is_flag=True, help="Snapshot every library.")
+def backup_library(vacuum, all_libraries) -> None:
+    """Take a snapshot of the library while the app keeps serving it."""
+    if all_libraries:
+        libraries = [library["library"] for library in pool.libraries()]
+    else:
+        libraries = [pool.library]
+    for library in libraries:
+        _echo_snapshot(backups.snapshot(library, "vacuum" if vacuum else "online"))
+
+
+@current_app.cli.command("backup-schedule")
+@click.option("--interval", type=float, help="Seconds between snapshots.")
+@click.option("--vacuum", is_flag=True, help="Write compacted copies with VACUUM INTO.")
+def backup_schedule(interval, vacuum) -> None:
+    """Snapshot every library at a fixed interval, until interrupted."""
+    interval = interval or current_app.config["BACKUP_INTERVAL"]
+    mode = "vacuum" if vacuum else "online"
+    while True:
+        started = time.monotonic()
+        for library in pool.libraries():
+            try:
+                _echo_snapshot(backups.snapshot(library["library"], mode))
+            except (RuntimeError, OSError, sqlite3.Error) as e:
+                click.echo(f"{library['library']}: backup failed: {e}", err=True)
+        time.sleep(max(interval - (time.monotonic() - started), 0))
+
+
+@current_app.cli.command("snapshots")
+def list_snapshots() -> None:
+    """List the snapshots of the library, oldest first."""
+    snapshots = backups.snapshots()
+    if not snapshots:
+        click.echo("No snapshot")
+    for path in snapshots:
+        click.echo(f"{path}  {path.stat().st_size / 1024 / 1024:>10.1f} MiB")
+
+
+@current_app.cli.command("restore")
+@click.argument("snapshot", type=click.Path(exists=True, dir_okay=False))
+@click.option("--force", is_flag=True, help="Restore even while the library is hot.")
+def restore_library(snapshot, force) -> None:
+    """Replace the library with a snapshot.
+
+    Processes serving the library keep caches of it, such as author IDs and
+    its schema version: stop them first, or restart them after a forced
+    restore.
+    """
+    library = pool.library
+    # The connections of this process would keep the library hot.
+    pool.close()
+    if not force and any(
+        entry["library"] == library and entry["hot"] for entry in pool.libraries()
+    ):
+        raise click.ClickException(
+            f"Library {library} is hot, stop the processes serving it or use --force"
+        )
+    report = backups.restore(snapshot, library)
+    click.echo(
+        f"Restored {report['library']} from {report['snapshot']}, "
+        f"{report['pages']} pages in {report['seconds']:.2f}s"
+    )
+
+
+@current_app.cli.command("sweep-authors")
+def sweep_authors() -> None:
+    """Delete the authors left without books."""
+    click.echo(f"Deleted {BookRepository.sweep_authors()} authors without books")
+
+
+@current_app.cli.command("build-search-index")
+@click.option("--batch-size", default=1000, show_default=True)
+def build_search_index(batch_size) -> None:
+    """Index the books that predate the full-text search index."""
+    indexed = BookRepository.build_search_index(batch_size)
+    click.echo(f"Indexed {indexed} books")
+
+
+@current_app.cli.command("find-duplicates")
+@click.option("--threshold", type=float, help="Similarity from 0 to 1.")
+def find_duplicates(threshold) -> None:
+    """List the groups of near-duplicate books."""
+    groups = BookRepository.find_duplicates(
+        threshold or current_app.config["DUPLICATE_THRESHOLD"],
+        current_app.config["DUPLICATE_BUCKET_LIMIT"],
+    )
+    for group in groups:
+        click.echo(f"Similarity {group['similarity']}:")
+        for book in group["books"]:
+            author = " ".join(filter(None, (book.author_first, book.author_last)))
+            click.echo(f"    {book.id}: {book.title} ({author})")
+    click.echo(f"{len(groups)} groups of possible duplicates")
+
+
+@current_app.cli.command("rebuild-stats")
+def rebuild_stats() -> None:
+    """Recompute the statistics and check them against the live data."""
+    for difference in StatsRepository.check():
+        click.echo(
+            "Drift in {dimension} {value!r}: stored {stored}, live {live}".format(**difference)
+        )
+
+    StatsRepository.rebuild()
+    differences = StatsRepository.check()
+    if differences:
+        raise click.ClickException(f"{len(differences)} statistics still differ after rebuild")
+    click.echo("Statistics rebuilt and consistent with the library")
+
+
+# Query plan step reading a whole table rather than an index.
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(books|authors|read_status)$")
+
+# Query plan step walking a whole index of a table, in the order of the index.
+INDEX_SCAN = re.compile(r"^SCAN (?:TABLE )?(books|authors|read_status) USING (?:COVERING )?INDEX ")
+
+# One filter per dimension, alone and combined, to check the listing plans with.
+SAMPLE_FILTERS = {
+    "no filter": BookFilter(),
+    "status": BookFilter(status=("read",)),
+    "status not_read": BookFilter(status=("not_read",)),
+    "genre": BookFilter(genre=("",)),
+    "language": BookFilter(language=("",)),
+    "written_form": BookFilter(written_form=("",)),
+    "publisher": BookFilter(publisher=("",)),
+    "author": BookFilter(author=(1,)),
+    "year": BookFilter(year_min=1900, year_max=1999),
+    "combined": BookFilter(status=("read",), genre=("",), year_min=1900),
+}
+
+
+# Statements of the workload that have no query plan to check.
+UNPLANNED = re.compile(r"^\s*(?:--|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA)", re.I)
+
+
+class _Rollback(Exception):
+    """Raised to roll the query plan workload back."""
+
+
+def _repository_workload() -> None:
+    """Call every repository query once, on a book created for the purpose."""
+    book = Book(title="Query plan check", author_last="Check", author_first="Plan", year=2000)
+    seq = BookRepository.get_change_seq()
+    book_id = BookRepository.create(book)
+    BookRepository.find_by_id(book_id)
+    BookRepository.update(book_id, book)
+    BookRepository.update_reading_status(book_id, "read")
+    BookRepository.find_all()
+    list(BookRepository.iter_all())
+    _, key = BookRepository.find_page(1)
+    BookRepository.find_page(1, key)
+    BookRepository.find_facets(BookFilter(), 1)
+    BookRepository.search(fts_query("check"), 1)
+    BookRepository.find_duplicates_of(book, 1.0, book_id)
+    BookRepository.find_duplicates(1.0, 2)
+    BookRepository.find_changes(seq, 10)
+    BookRepository.is_empty()
+    BookRepository.get_version()
+    author_id = BookRepository.find_by_id(book_id).author_id
+    BookRepository.delete(book_id)
+    BookRepository.sweep_authors([author_id])
+    BookRepository.compact_changes(current_app.config["CHANGES_RETENTION"])
+    BookRepository.build_search_index(1)
+    BookRepository.build_duplicate_index(1)
+    StatsRepository.summary()
+
+
+def trace_repository_queries() -> list[str]:
+    """Run every repository query once and return the statements they issued.
+
+    The workload runs in a single transaction that is rolled back, the library
+    is left as it was.
+    """
+    statements = []
+    try:
+        with pool.connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                _repository_workload()
+            finally:
+                # Connect hooks install the instrumentation's own callback.
+                conn.set_trace_callback(None)
+                for hook in pool.connect_hooks:
+                    hook(conn)
+            raise _Rollback
+    except _Rollback:
+        pass
+    return [s for s in dict.fromkeys(statements) if not UNPLANNED.match(s)]
+
+
+def listing_queries():
+    """Yield the `(name, (sql, params), page, unfiltered)` of listing pages and facet counts.
+
+    Pages are planned for every sample filter and sort, first and next pages.
+    """
+    for filter_name, book_filter in SAMPLE_FILTERS.items():
+        for sort in SORTS.values():
+            after = tuple(key_type() for key_type in sort.key_types)
+            for page, key in (("first", None), ("next", after)):
+                yield (
+                    f"{filter_name}, sort {sort.name}, {page} page",
+                    page_query(book_filter, sort, key, 1),
+                    True,
+                    book_filter == BookFilter(),
+                )
+        for dimension in FACETS:
+            yield (
+                f"{filter_name}, {dimension} facet",
+                facet_query(dimension, book_filter, 1),
+                False,
+                book_filter == BookFilter(),
+            )
+
+
+def plan_scans(plan, page=False, unfiltered=False) -> list[str]:
+    """Return the steps of a query plan that read a whole table.
+
+    A page of the unfiltered listing may walk a table in listing order, it
+    stops at the end of the page. A filtered page may not walk a whole index
+    either: with a filter matching few books, it would read every row to fill
+    the page.
+    """
+    if page and unfiltered:
+        if any("FOR ORDER BY" in step for step in plan):
+            return [step for step in plan if FULL_SCAN.match(step)]
+        return []
+    if page:
+        return [step for step in plan if FULL_SCAN.match(step) or INDEX_SCAN.match(step)]
+    return [step for step in plan if FULL_SCAN.match(step)]
+
+
+@current_app.cli.command("check-query-plans")
+@click.option("--verbose", is_flag=True, help="Print every query plan.")
+def check_query_plans(verbose) -> None:
+    """Check that no repository query, listing filter, order or facet count scans a table.
+
+    Pages of the unfiltered listing may scan in listing order, they stop at
+    the end of the page.
+    """
+    queries = [
+        (normalize_query(statement), (statement, ()), False, False)
+        for statement in trace_repository_queries()
+    ]
+    queries += listing_queries()
+
+    failures = 0
+    for name, (sql, params), page, unfiltered in queries:
+        plan = BookRepository.explain(sql, params)
+        scans = plan_scans(plan, page, unfiltered)
+        if scans:
+            failures += 1
+            click.echo(f"{name}: {', '.join(scans)}")
+        if verbose:
+            click.echo(f"{name}:\n    " + "\n    ".join(plan))
+    if failures:
+        raise click.ClickException(f"{failures} of {len(queries)} queries scan a whole table")
+    click.echo(f"{len(queries)} query plans checked, none scans a whole table")
+
+
+@current_app.cli.command("check-read-model")
+def check_read_model() -> None:
+    """Load the in-process read model and check it against the database."""
+    differences = read_model.check()
+    for difference in differences[:20]:
+        click.echo("Book {id}: {problem}".format(**difference))
+    if differences:
+        raise click.ClickException(f"{len(differences)} books differ from the database")
+    click.echo(f"Read model consistent with the library ({len(read_model.find_all())} books)")
+
+
+@current_app.cli.command("compact-changes")
+@click.option("--retention", type=int, help="Seconds of change log to keep.")
+def compact_changes(retention) -> None:
+    """Compact the change log used for delta sync."""
+    removed = BookRepository.compact_changes(
+        retention if retention is not None else current_app.config["CHANGES_RETENTION"]
+    )
+    click.echo(f"Removed {removed} change log entries")
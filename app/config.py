@@ -0,0 +1,74 @@
+from pathlib import Path
+
+
+class Config:
+    """Default settings, overridable with ``BOOKTRACKER_*`` environment variables."""
+
+    # Database
+    DATABASE_PATH = Path("BookTracker.db")
+    DATABASE_POOL_SIZE = 8
+    DATABASE_TIMEOUT = 5.0  # seconds to wait on a locked database
+    DATABASE_CACHED_STATEMENTS = 256
+    DATABASE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,  # in KiB when negative
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    }
+
+    # Libraries
+    LIBRARIES_PATH = None  # directory of one database per library, None for DATABASE_PATH alone
+    LIBRARIES_OPEN_LIMIT = 16  # libraries kept open per process
+    DEFAULT_LIBRARY = "default"  # library of the requests and commands naming none
+
+    # Backups, see backup.py
+    BACKUP_PATH = Path("backups")  # one directory of snapshots per library
+    BACKUP_PAGES_PER_STEP = 256  # pages copied per read transaction
+    BACKUP_STEP_PAUSE = 0.005  # seconds between steps, left to the writers
+    BACKUP_MAX_RESTARTS = 3  # copies restarted by writes before the rest is copied at once
+    BACKUP_RETENTION = 7  # snapshots kept per library, None to keep them all
+    BACKUP_INTERVAL = 24 * 3600  # seconds between the snapshots of backup-schedule
+
+    # Authors
+    AUTHOR_CACHE_SIZE = 4096  # author IDs cached per process, 0 to disable
+    AUTHOR_SWEEP_BATCH = 100  # authors possibly orphaned before a sweep
+
+    # Bulk import
+    IMPORT_BATCH_SIZE = 500
+    IMPORT_CHUNK_SIZE = None  # rows per transaction, None for a single one
+
+    # Listing
+    BOOKS_PAGE_SIZE = 100
+    BOOKS_MAX_PAGE_SIZE = 1000
+    FACET_LIMIT = 100  # values returned per facet dimension
+    SEARCH_LIMIT = 50
+    CHANGES_RETENTION = 30 * 24 * 3600  # seconds of change log kept for delta sync
+    READ_MODEL_ENABLED = False  # serve listings and books from an in-process copy
+
+    # Duplicate detection
+    DUPLICATE_THRESHOLD = 0.7  # trigram similarity of the titles, from 0 to 1
+    DUPLICATE_BUCKET_LIMIT = 50  # larger MinHash buckets are skipped by the report
+
+    # Batch writes
+    BATCH_MAX_SIZE = 1000
+
+    # Instrumentation
+    METRICS_ENABLED = True  # Server-Timing headers and the /metrics endpoint
+
+    # Async serving, see asgi.py
+    ASYNC_WORKERS = 8  # threads running the views, and so SQLite, at once
+
+    # ISBN lookups
+    GOOGLE_BOOKS_BASE_URL = "https://www.googleapis.com/books/v1"
+    GOOGLE_BOOKS_TIMEOUT = 5.0
+    GOOGLE_BOOKS_RETRIES = 2
+    GOOGLE_BOOKS_BACKOFF = 0.5  # seconds, doubled on each retry
+    GOOGLE_BOOKS_RATE_LIMIT = 10  # requests per second, None to disable
+    GOOGLE_BOOKS_RATE_BURST = 5
+    ISBN_BATCH_WORKERS = 4
+    ISBN_BATCH_MAX_SIZE = 100
+    ISBN_CACHE_SIZE = 1024
+    ISBN_CACHE_TTL = 30 * 24 * 3600
+    ISBN_CACHE_NEGATIVE_TTL = 24 * 3600
@@ -0,0 +1,357 @@
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from queue import Empty, LifoQueue
+
+# Library of the current request or command, see `LibraryPools`.
+current_library = ContextVar("current_library", default=None)
+
+LIBRARY_NAME = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+
+
+class ConnectionPool:
+    """Bounded pool of tuned SQLite connections.
+
+    Nested ``connection()`` blocks on the same thread share one connection, and
+    therefore one transaction, which is committed when the outermost block exits.
+    """
+
+    def __init__(self, database, size=8, timeout=5.0, cached_statements=256, pragmas=None):
+        self._local = threading.local()
+        self._idle = LifoQueue()
+        self.factory = sqlite3.Connection
+        self.connect_hooks = []  # called with each new connection
+        self.release_hooks = []  # called with each connection returned to the pool
+        self.commit_hooks = []  # called once the outermost block committed
+        self.rollback_hooks = []  # called once the outermost block rolled back
+        self.state = {}  # kept by other modules for this database, such as caches
+        self._borrowed_lock = threading.Lock()
+        self.borrowed = 0
+        self.configure(database, size, timeout, cached_statements, pragmas)
+
+    def configure(self, database, size=8, timeout=5.0, cached_statements=256, pragmas=None):
+        """(Re)configure the pool, closing any idle connection."""
+        self.close()
+        self.retired = False
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = dict(pragmas or {})
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        """Yield a pooled connection, committing or rolling back on exit."""
+        local = self._local
+        if getattr(local, "conn", None) is not None:
+            local.depth += 1
+            try:
+                yield local.conn
+            finally:
+                local.depth -= 1
+            return
+
+        conn = self._acquire()
+        local.conn, local.depth = conn, 1
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            for hook in self.rollback_hooks:
+                hook(conn)
+            raise
+        else:
+            for hook in self.commit_hooks:
+                hook(conn)
+        finally:
+            local.conn = None
+            self._release(conn)
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+    def retire(self):
+        """Close every idle connection, and the others as they are released."""
+        self.retired = True
+        self.close()
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("Connection pool exhausted")
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            try:
+                conn = self._connect()
+            except BaseException:
+                self._slots.release()
+                raise
+        with self._borrowed_lock:
+            self.borrowed += 1
+        return conn
+
+    def _release(self, conn):
+        for hook in self.release_hooks:
+            hook(conn)
+        if self.retired:
+            conn.close()
+        else:
+            self._idle.put(conn)
+        with self._borrowed_lock:
+            self.borrowed -= 1
+        self._slots.release()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+            factory=self.factory,
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        for hook in self.connect_hooks:
+            hook(conn)
+        return conn
+
+
+@contextmanager
+def savepoint(conn, name="savepoint"):
+    """Run a block under a savepoint, rolled back alone if the block raises.
+
+    Each of `pool.savepoint_hooks` is called with the connection on entry and
+    returns a callable, called with it if the savepoint rolls back.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    conn.execute(f"SAVEPOINT {name}")
+    undo = [hook(conn) for hook in pool.savepoint_hooks]
+    try:
+        yield
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        for hook in undo:
+            hook(conn)
+        raise
+    conn.execute(f"RELEASE {name}")
+
+
+class LibraryPools:
+    """Connection pools of the libraries, one SQLite file each.
+
+    Connections are borrowed from the pool of `current_library`, or of
+    `default_library`. Without a `directory` there is a single library, in
+    `database`. Otherwise each library lives in `<directory>/<library>.db`:
+    its pool is opened on first use and kept in an LRU, and beyond
+    `open_limit` libraries the least recently used ones with no connection in
+    use are closed. Libraries share no file, writes to two of them never wait
+    on each other.
+
+    The first time the process opens a library, the `init_hooks` are called
+    with it selected, to bring its schema up to date. The other hooks are
+    shared by the pools of every library, as is the connection `factory`.
+    """
+
+    def __init__(self, database, size=8, timeout=5.0, cached_statements=256, pragmas=None):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pools = OrderedDict()
+        self._initialized = set()
+        self._init_locks = {}
+        self.factory = sqlite3.Connection
+        self.init_hooks = []  # called once per library and process, before its first use
+        self.connect_hooks = []
+        self.release_hooks = []
+        self.commit_hooks = []
+        self.rollback_hooks = []
+        self.savepoint_hooks = []  # called on entering a `savepoint`, see there
+        self.configure(database, size, timeout, cached_statements, pragmas)
+
+    def configure(
+        self,
+        database,
+        size=8,
+        timeout=5.0,
+        cached_statements=256,
+        pragmas=None,
+        directory=None,
+        open_limit=16,
+        default_library="default",
+    ):
+        """(Re)configure the pools, closing any idle connection."""
+        self.close()
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = dict(pragmas or {})
+        self.directory = Path(directory) if directory is not None else None
+        self.open_limit = open_limit
+        self.default_library = default_library
+        with self._lock:
+            self._initialized.clear()
+
+    @property
+    def library(self) -> str:
+        """The library connections are borrowed for."""
+        if self.directory is None:
+            return self.default_library
+        return current_library.get() or self.default_library
+
+    @property
+    def state(self) -> dict:
+        """The state other modules keep for the current library, dropped with its pool."""
+        return self.pool().state
+
+    def path(self, library) -> Path:
+        """Return the database file of a library."""
+        if self.directory is None:
+            return Path(self.database)
+        return self.directory / f"{library}.db"
+
+    def connection(self):
+        """Borrow a connection of the current library, see `ConnectionPool.connection`."""
+        return self.open().connection()
+
+    def open(self, library=None) -> ConnectionPool:
+        """Return the pool of a library, initializing the library on first use."""
+        library = library or self.library
+        if library not in self._initialized:
+            self._initialize(library)
+        return self.pool(library)
+
+    def pool(self, library=None) -> ConnectionPool:
+        """Return the pool of a library, the current one by default."""
+        library = library or self.library
+        with self._lock:
+            pool = self._pools.get(library)
+            if pool is not None:
+                self._pools.move_to_end(library)
+                return pool
+            pool = self._pools[library] = self._open(library)
+            self._evict()
+        return pool
+
+    def close(self):
+        """Close every idle connection, the pools are opened again on next use."""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.retire()
+
+    def reset(self, library) -> None:
+        """Close the pool of a library and initialize it again on next use."""
+        with self._lock:
+            pool = self._pools.pop(library, None)
+            self._initialized.discard(library)
+        if pool is not None:
+            pool.retire()
+
+    def _open(self, library) -> ConnectionPool:
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        pool = ConnectionPool(
+            str(self.path(library)),
+            self.size,
+            self.timeout,
+            self.cached_statements,
+            self.pragmas,
+        )
+        pool.factory = self.factory
+        pool.connect_hooks = self.connect_hooks
+        pool.release_hooks = self.release_hooks
+        pool.commit_hooks = self.commit_hooks
+        pool.rollback_hooks = self.rollback_hooks
+        return pool
+
+    def _evict(self) -> None:
+        # The most recently used pool, just opened, is kept.
+        for library, pool in list(self._pools.items())[:-1]:
+            if len(self._pools) <= self.open_limit:
+                return
+            if not pool.borrowed:
+                del self._pools[library]
+                pool.retire()
+
+    def _initialize(self, library) -> None:
+        # The hooks borrow connections of the library being initialized.
+        initializing = getattr(self._local, "initializing", None)
+        if initializing is None:
+            initializing = self._local.initializing = set()
+        if library in initializing:
+            return
+        with self._lock:
+            lock = self._init_locks.setdefault(library, threading.Lock())
+        with lock:
+            if library in self._initialized:
+                return
+            initializing.add(library)
+            token = current_library.set(library)
+            try:
+                for hook in self.init_hooks:
+                    hook()
+            finally:
+                current_library.reset(token)
+                initializing.discard(library)
+            self._initialized.add(library)
+
+    def libraries(self) -> list[dict]:
+        """Describe the libraries on disk, by name.
+
+        A library is hot while its write-ahead log exists: a process has it
+        open, or the log was not checkpointed yet.
+        """
+        if self.directory is None:
+            paths = {self.default_library: self.path(self.default_library)}
+        else:
+            files = sorted(self.directory.glob("*.db")) if self.directory.is_dir() else []
+            paths = {path.stem: path for path in files if LIBRARY_NAME.fullmatch(path.stem)}
+
+        libraries = []
+        for library, path in paths.items():
+            if not path.exists():
+                continue
+            files = [path, path.with_name(f"{path.name}-wal")]
+            stats = [file.stat() for file in files if file.exists()]
+            libraries.append(
+                {
+                    "library": library,
+                    "path": str(path),
+                    "size": sum(stat.st_size for stat in stats),
+                    "modified": max(stat.st_mtime for stat in stats),
+                    "hot": len(stats) > 1,
+                }
+            )
+        return libraries
+
+
+pool = LibraryPools("BookTracker.db")
+
+
+def init_app(app):
+    """Configure the shared connection pools from the application config."""
+    pool.configure(
+        database=app.config["DATABASE_PATH"],
+        size=app.config["DATABASE_POOL_SIZE"],
+        timeout=app.config["DATABASE_TIMEOUT"],
+        cached_statements=app.config["DATABASE_CACHED_STATEMENTS"],
+        pragmas=app.config["DATABASE_PRAGMAS"],
+        directory=app.config["LIBRARIES_PATH"],
+        open_limit=app.config["LIBRARIES_OPEN_LIMIT"],
+        default_library=app.config["DEFAULT_LIBRARY"],
+    )
@@ -0,0 +1,169 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Self
+
+from .isbn import normalize_isbn
+
+# Title signatures are cut into bands of rows, two books agreeing on any band
+# are compared. With 8 bands of 3 rows, titles with a similarity of 0.7 are
+# compared 96% of the time, those below 0.3 less than 20%.
+SIGNATURE_BANDS = 8
+BAND_ROWS = 3
+SIGNATURE_SIZE = SIGNATURE_BANDS * BAND_ROWS
+
+SHINGLE_SIZE = 3
+
+# Trigram similarity from which two spellings are taken for the same author.
+AUTHOR_SIMILARITY = 0.6
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text) -> str:
+    """Fold case and accents and keep the words of a text, separated by a space."""
+    text = text or ""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_WORD.findall(text.casefold()))
+
+
+def _author_words(book) -> list[str]:
+    # Sorted, so that swapped first and last names match.
+    return sorted(normalize(f"{book.author_first or ''} {book.author_last}").split())
+
+
+@lru_cache(maxsize=65536)
+def _trigrams(text) -> frozenset:
+    text = f" {text} "
+    return frozenset(text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+
+@lru_cache(maxsize=65536)
+def _shingle_hash(shingle) -> int:
+    return int.from_bytes(blake2b(shingle.encode(), digest_size=8).digest())
+
+
+def signature(shingle_set) -> list:
+    """Return the MinHash signature of a set of shingles.
+
+    Shingles are hashed once and each hash competes in a single bin
+    (one-permutation hashing), empty bins borrow the value of the next
+    filled bin. Return an empty list for an empty set.
+    """
+    if not shingle_set:
+        return []
+    bins = [None] * SIGNATURE_SIZE
+    for value in map(_shingle_hash, shingle_set):
+        index = value % SIGNATURE_SIZE
+        value //= SIGNATURE_SIZE
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+
+    values = []
+    for index in range(SIGNATURE_SIZE):
+        # The distance tells borrowed values apart from the bin's own.
+        distance = 0
+        while bins[(index + distance) % SIGNATURE_SIZE] is None:
+            distance += 1
+        values.append(bins[(index + distance) % SIGNATURE_SIZE] * SIGNATURE_SIZE + distance)
+    return values
+
+
+def buckets(book) -> list[tuple[int, int]]:
+    """Return the `(band, bucket)` pairs indexing a book, see `SIGNATURE_BANDS`.
+
+    Only the title is hashed: authors are compared once candidates are found,
+    and the books of a prolific author would otherwise all look alike.
+    """
+    title = normalize(book.title)
+    values = signature(_trigrams(title) if title else ())
+    pairs = []
+    for band in range(SIGNATURE_BANDS if values else 0):
+        rows = values[band::SIGNATURE_BANDS]
+        digest = blake2b(repr(rows).encode(), digest_size=8).digest()
+        pairs.append((band, int.from_bytes(digest, signed=True)))
+    return pairs
+
+
+def jaccard(a, b) -> float:
+    """Return the Jaccard similarity of two sets."""
+    common = len(a & b)
+    return common / (len(a) + len(b) - common) if common else 0.0
+
+
+def _isbn(book):
+    try:
+        return normalize_isbn(book.isbn) if book.isbn else None
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class Fingerprint:
+    """The normalized parts of a book that tell whether it duplicates another."""
+
+    title: frozenset  # trigrams
+    author: frozenset  # trigrams
+    author_words: frozenset
+    numbers: frozenset  # of the title
+    volume: object  # of the series
+    isbn: object
+
+    @classmethod
+    def of(cls, book) -> Self:
+        """Fingerprint a book, a book record or an imported row."""
+        title = normalize(book.title)
+        words = _author_words(book)
+        return cls(
+            title=_trigrams(title),
+            author=_trigrams(" ".join(words)),
+            author_words=frozenset(words),
+            numbers=frozenset(word for word in title.split() if word.isdigit()),
+            volume=str(book.volume) if book.series and book.volume is not None else None,
+            isbn=_isbn(book),
+        )
+
+    def similarity(self, other) -> float:
+        """Return the trigram similarity of the titles, 0 if the books differ.
+
+        Authors match when their trigram similarity reaches `AUTHOR_SIMILARITY`
+        or when the names of one are among those of the other ("Hugo" and
+        "Victor Hugo"). Volumes of a series, books with different ISBNs and
+        titles with different numbers ("Tome 1", "Tome 2") look alike but are
+        different books.
+        """
+        if self.volume and other.volume and self.volume != other.volume:
+            return 0.0
+        if self.isbn and other.isbn and self.isbn != other.isbn:
+            return 0.0
+        if self.numbers and other.numbers and self.numbers != other.numbers:
+            return 0.0
+        if not (
+            self.author_words <= other.author_words
+            or other.author_words <= self.author_words
+            or jaccard(self.author, other.author) >= AUTHOR_SIMILARITY
+        ):
+            return 0.0
+        return jaccard(self.title, other.title)
+
+
+def group_pairs(pairs) -> list[set]:
+    """Merge pairs of IDs into the groups they connect."""
+    parent = {}
+
+    def root(item):
+        while parent.setdefault(item, item) != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for a, b in pairs:
+        parent[root(a)] = root(b)
+    groups = {}
+    for item in parent:
+        groups.setdefault(root(item), set()).add(item)
+    return list(groups.values())
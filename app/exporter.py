@@ -0,0 +1,52 @@
+import csv
+import zlib
+from io import StringIO
+
+from .importer import CSV_HEADER, format_row
+from .records import records_json
+
+# Books written per yielded chunk.
+CHUNK_SIZE = 500
+
+
+def _chunks(books, size=CHUNK_SIZE):
+    chunk = []
+    for book in books:
+        chunk.append(book)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_ndjson(books):
+    """Yield book records as newline-delimited JSON, one object per line."""
+    for chunk in _chunks(books):
+        yield "".join([line + "\n" for line in records_json(chunk, ensure_ascii=False)])
+
+
+def export_csv(books):
+    """Yield books as `;`-delimited CSV in the layout read by the importer."""
+    buffer = StringIO()
+    writer = csv.writer(buffer, delimiter=";", lineterminator="\n")
+
+    writer.writerow(CSV_HEADER)
+    for chunk in _chunks(books):
+        writer.writerows(format_row(book) for book in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_stream(chunks):
+    """Compress text chunks into a gzip stream on the fly."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
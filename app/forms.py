@@ -0,0 +1,34 @@
+from wtforms import Form, IntegerField, StringField, validators
+
+
+class BookForm(Form):
+    title = StringField("Title", [validators.DataRequired()])
+    author_last = StringField("Author Last Name", [validators.DataRequired()])
+    author_first = StringField("Author First Name", [validators.Optional()])
+    series = StringField("Series", [validators.Optional()])
+    volume = IntegerField(
+        "Volume",
+        [validators.Optional(), validators.NumberRange(min=0)],
+    )
+    year = IntegerField(
+        "Year",
+        [validators.Optional(), validators.NumberRange(min=1000, max=2100)],
+    )
+    language = StringField("Language", [validators.Optional()])
+    genre = StringField("Genre", [validators.Optional()])
+    written_form = StringField("Written Form", [validators.Optional()])
+    publisher = StringField("Publisher", [validators.Optional()])
+    collection = StringField("Collection", [validators.Optional()])
+    isbn = IntegerField("ISBN", [validators.Optional()])
+
+    def process(self, formdata=None, obj=None, data=None, **kwargs):
+        """Override the process method to clean input data."""
+        super().process(formdata, obj, data, **kwargs)
+
+        for field in (self.title, self.series):
+            if field.data:
+                field.data = field.data.strip()
+
+        for field in (self.author_last, self.author_first, self.language, self.genre):
+            if field.data:
+                field.data = field.data.strip().capitalize()
@@ -0,0 +1,341 @@
+import sqlite3
+import time
+from csv import reader
+from dataclasses import dataclass, field
+from itertools import chain, islice
+
+from .authors import author_key, author_resolver
+from .db import pool
+from .duplicates import buckets
+
+INSERT_BOOK = """
+    INSERT INTO books (
+        id,
+        title,
+        author_id,
+        series,
+        volume,
+        year,
+        language,
+        genre,
+        written_form,
+        publisher,
+        collection,
+        isbn
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_BUCKETS = """
+    INSERT INTO books_minhash (book_id, band, bucket)
+    VALUES (?, ?, ?)
+"""
+
+INSERT_STATUS = """
+    INSERT INTO read_status (book_id, status)
+    VALUES (?, ?)
+    ON CONFLICT(book_id) DO UPDATE SET status = excluded.status
+"""
+
+CSV_HEADER = [
+    "Titre",
+    "Auteur",
+    "Série",
+    "Année",
+    "Forme",
+    "Genre",
+    "Éditeur",
+    "Langue",
+    "Lu",
+    "ISBN",
+]
+
+STATUS_LABELS = {"read": "Oui", "reading": "En cours", "not_read": "Non"}
+_STATUS_BY_LABEL = {label: status for status, label in STATUS_LABELS.items()}
+
+
+@dataclass
+class ParsedRow:
+    line: int
+    title: str
+    author_last: str
+    author_first: str
+    series: str | None
+    volume: int | None
+    year: int | None
+    language: str | None
+    genre: str | None
+    written_form: str | None
+    publisher: str | None
+    collection: str | None
+    isbn: int | None
+    status: str
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    failures: list[dict] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Throughput in processed rows per second."""
+        processed = self.imported + len(self.failures)
+        return processed / self.elapsed if self.elapsed else 0.0
+
+    def fail(self, line, title, error) -> None:
+        self.failures.append({"line": line, "title": title, "error": str(error)})
+
+    def to_dict(self) -> dict:
+        return {
+            "imported": self.imported,
+            "failed": len(self.failures),
+            "failures": self.failures,
+            "elapsed": round(self.elapsed, 3),
+            "rows_per_second": round(self.rate, 1),
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"Imported {self.imported} books ({len(self.failures)} failed) "
+            f"in {self.elapsed:.2f}s ({self.rate:.0f} rows/s)"
+        )
+
+
+def _parse_number(value, name) -> int | None:
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"invalid {name} {value!r}, expected a number")
+
+
+def parse_row(line, row) -> ParsedRow:
+    """Parse a `;`-delimited export row into its book fields.
+
+    The trailing ISBN column is optional, older exports stop at the status.
+    """
+    if len(row) < 9:
+        raise ValueError(f"expected 9 columns, got {len(row)}")
+
+    title = row[0]
+
+    try:
+        author_last, author_first = row[1].split("\n")[0].split(", ")
+    except ValueError:
+        author_last = row[1]
+        author_first = ""
+
+    if row[2]:
+        # The volume is optional, `Series` alone is a series without one.
+        series, _, volume = row[2].rpartition(" #")
+        if not series:
+            series, volume = row[2], None
+        volume = _parse_number(volume, "volume")
+    else:
+        series = None
+        volume = None
+
+    if row[6]:
+        text = row[6].split(" - ")
+        publisher = text[0] or None
+        collection = ", ".join(text[1:]) or None
+    else:
+        publisher = None
+        collection = None
+
+    return ParsedRow(
+        line=line,
+        title=title,
+        author_last=author_last,
+        author_first=author_first,
+        series=series,
+        volume=volume,
+        year=_parse_number(row[3], "year"),
+        language=row[7] or None,
+        genre=row[5] or None,
+        written_form=row[4] or None,
+        publisher=publisher,
+        collection=collection,
+        isbn=(row[9] or None) if len(row) > 9 else None,
+        status=_STATUS_BY_LABEL.get(row[8], "not_read"),
+    )
+
+
+def format_row(book) -> list:
+    """Format a book record as a `;`-delimited export row, the inverse of `parse_row`."""
+    author = book.author_last
+    if book.author_first:
+        author = f"{author}, {book.author_first}"
+
+    series = ""
+    if book.series:
+        series = book.series
+        if book.volume is not None:
+            series = f"{series} #{book.volume}"
+
+    publisher = book.publisher or ""
+    if book.collection:
+        publisher = f"{publisher} - {book.collection}"
+
+    return [
+        book.title,
+        author,
+        series,
+        book.year if book.year is not None else "",
+        book.written_form or "",
+        book.genre or "",
+        publisher,
+        book.language or "",
+        STATUS_LABELS.get(book.status, STATUS_LABELS["not_read"]),
+        book.isbn if book.isbn is not None else "",
+    ]
+
+
+class BulkImporter:
+    """Stream a CSV export into the database in batches.
+
+    Rows are parsed `batch_size` at a time, authors are resolved once per batch
+    and books, statuses and duplicate buckets are written with `executemany`.
+    Everything happens in a single transaction unless `chunk_size` is set, in
+    which case a commit is issued every `chunk_size` rows. A row that fails to
+    parse or to insert is recorded in the report and does not abort the rest of
+    its batch.
+    """
+
+    def __init__(self, batch_size=500, chunk_size=None):
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+
+    def run(self, lines, skip_header=True) -> ImportReport:
+        """Import CSV lines (a file object or any iterable of strings)."""
+        report = ImportReport()
+        start = time.perf_counter()
+
+        rows = enumerate(reader(lines, delimiter=";"), start=1)
+        if skip_header:
+            next(rows, None)
+
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            self._begin(cursor)
+            next_id = self._next_book_id(cursor)
+            uncommitted = 0
+
+            while batch := list(islice(rows, self.batch_size)):
+                parsed = []
+                for line, row in batch:
+                    try:
+                        parsed.append(parse_row(line, row))
+                    except ValueError as e:
+                        report.fail(line, row[0] if row else "", e)
+
+                next_id = self._import_batch(cursor, parsed, next_id, report)
+
+                uncommitted += len(batch)
+                if self.chunk_size and uncommitted >= self.chunk_size:
+                    conn.commit()
+                    self._begin(cursor)
+                    next_id = self._next_book_id(cursor)
+                    uncommitted = 0
+
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def _import_batch(self, cursor, parsed, next_id, report) -> int:
+        """Insert one parsed batch and return the next free book ID."""
+        if not parsed:
+            return next_id
+
+        author_ids = author_resolver.resolve_many(
+            cursor, {(row.author_last, row.author_first) for row in parsed}
+        )
+        book_params = []
+        status_params = []
+        bucket_params = []
+        for book_id, row in enumerate(parsed, start=next_id):
+            author_id = author_ids[author_key(row.author_last, row.author_first)]
+            book_params.append(self._book_params(book_id, author_id, row))
+            status_params.append((book_id, row.status))
+            bucket_params.append([(book_id, band, bucket) for band, bucket in buckets(row)])
+
+        cursor.execute("SAVEPOINT import_batch")
+        try:
+            cursor.executemany(INSERT_BOOK, book_params)
+            cursor.executemany(INSERT_STATUS, status_params)
+            cursor.executemany(INSERT_BUCKETS, chain.from_iterable(bucket_params))
+        except sqlite3.IntegrityError:
+            # Retry row by row so that only the offending rows are rejected.
+            cursor.execute("ROLLBACK TO import_batch")
+            cursor.execute("RELEASE import_batch")
+            self._import_rows(
+                cursor, parsed, book_params, status_params, bucket_params, report
+            )
+        else:
+            cursor.execute("RELEASE import_batch")
+            report.imported += len(parsed)
+
+        return next_id + len(parsed)
+
+    @staticmethod
+    def _import_rows(cursor, parsed, book_params, status_params, bucket_params, report) -> None:
+        rows = zip(parsed, book_params, status_params, bucket_params)
+        for row, book, status, bucket_rows in rows:
+            cursor.execute("SAVEPOINT import_row")
+            try:
+                cursor.execute(INSERT_BOOK, book)
+                cursor.execute(INSERT_STATUS, status)
+                cursor.executemany(INSERT_BUCKETS, bucket_rows)
+            except sqlite3.Error as e:
+                cursor.execute("ROLLBACK TO import_row")
+                report.fail(row.line, row.title, e)
+            else:
+                report.imported += 1
+            cursor.execute("RELEASE import_row")
+
+    @staticmethod
+    def _book_params(book_id, author_id, row) -> tuple:
+        return (
+            book_id,
+            row.title,
+            author_id,
+            row.series,
+            row.volume,
+            row.year,
+            row.language,
+            row.genre,
+            row.written_form,
+            row.publisher,
+            row.collection,
+            row.isbn,
+        )
+
+    @staticmethod
+    def _begin(cursor) -> None:
+        """Take the write lock up front so that reserved book IDs stay free."""
+        if not cursor.connection.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+
+    @staticmethod
+    def _next_book_id(cursor) -> int:
+        cursor.execute(
+            """
+            SELECT MAX(
+                COALESCE((SELECT MAX(id) FROM books), 0),
+                COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'books'), 0)
+            ) + 1
+            """
+        )
+        return cursor.fetchone()[0]
+
+
+def import_data(filename, batch_size=500, chunk_size=None) -> ImportReport:
+    """Import a `;`-delimited CSV export into the database."""
+    with open(filename, newline="", encoding="utf-8") as f:
+        report = BulkImporter(batch_size, chunk_size).run(f)
+
+    for failure in report.failures:
+        print(f"Failed to import line {failure['line']} {failure['title']}: {failure['error']}")
+    return report
@@ -0,0 +1,391 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from urllib.parse import urlsplit
+
+from .db import pool
+from .metrics import record_http
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# `(volume, exception)` of the ISBNs looked up before the current request, see
+# `IsbnLookup.prefetch`.
+prefetched_volumes = ContextVar("prefetched_volumes", default=None)
+
+
+def normalize_isbn(isbn) -> str:
+    """Return the ISBN-13 form of an ISBN-10 or ISBN-13, without separators."""
+    digits = str(isbn).replace("-", "").replace(" ", "").upper()
+
+    if len(digits) == 10 and digits[:9].isdigit() and digits[9] in "0123456789X":
+        digits = "978" + digits[:9]
+        total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+        return digits + str(-total % 10)
+
+    if len(digits) == 13 and digits.isdigit():
+        return digits
+
+    raise ValueError(f"Invalid ISBN: {isbn}")
+
+
+class IsbnCache:
+    """Two-tier cache of Google Books volumes keyed by ISBN-13.
+
+    Lookups go through an in-process LRU, then the `isbn_cache` table, and only
+    then to the loader. Unknown ISBNs are cached as None with a shorter TTL.
+    """
+
+    def __init__(self, size=1024, ttl=30 * 24 * 3600, negative_ttl=24 * 3600):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.configure(size, ttl, negative_ttl)
+
+    def configure(self, size, ttl, negative_ttl):
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clear()
+
+    def clear(self):
+        """Empty the in-process tier and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.memory_hits = 0
+            self.database_hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.database_hits + self.misses
+            hits = self.memory_hits + self.database_hits
+            return {
+                "size": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "database_hits": self.database_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 3) if lookups else None,
+            }
+
+    def get(self, isbn, loader):
+        """Return the cached volume of `isbn`, calling `loader(isbn)` on a miss."""
+        isbn = normalize_isbn(isbn)
+        now = time.time()
+
+        entry = self._recall(isbn, now)
+        if entry is not None:
+            return entry[0]
+        entry = self._reload(isbn, self._load(isbn), now)
+        if entry is not None:
+            return entry[0]
+
+        with self._lock:
+            self.misses += 1
+        volume = loader(isbn)
+        self._store(isbn, volume, now)
+        self._remember(isbn, volume, self._expiry(volume, now))
+        return volume
+
+    async def get_async(self, isbn, loader, executor):
+        """Like `get` with a coroutine `loader`, the table is read and written in `executor`."""
+        isbn = normalize_isbn(isbn)
+        now = time.time()
+        loop = asyncio.get_running_loop()
+
+        entry = self._recall(isbn, now)
+        if entry is not None:
+            return entry[0]
+        row = await loop.run_in_executor(executor, self._load, isbn)
+        entry = self._reload(isbn, row, now)
+        if entry is not None:
+            return entry[0]
+
+        with self._lock:
+            self.misses += 1
+        volume = await loader(isbn)
+        await loop.run_in_executor(executor, self._store, isbn, volume, now)
+        self._remember(isbn, volume, self._expiry(volume, now))
+        return volume
+
+    def _recall(self, isbn, now):
+        """Return the fresh `(volume, expires_at)` entry of the in-process tier, or None."""
+        with self._lock:
+            entry = self._entries.get(isbn)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(isbn)
+                self.memory_hits += 1
+                return entry
+        return None
+
+    def _reload(self, isbn, row, now):
+        """Keep a fresh row of the table in the in-process tier and return it, or None."""
+        if row is None or row[1] <= now:
+            return None
+        with self._lock:
+            self.database_hits += 1
+        self._remember(isbn, *row)
+        return row
+
+    def _expiry(self, volume, fetched_at) -> float:
+        return fetched_at + (self.ttl if volume is not None else self.negative_ttl)
+
+    def _remember(self, isbn, volume, expires_at) -> None:
+        with self._lock:
+            self._entries[isbn] = (volume, expires_at)
+            self._entries.move_to_end(isbn)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _load(self, isbn):
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT volume, fetched_at FROM isbn_cache WHERE isbn = ?", (isbn,)
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        volume = json.loads(row[0]) if row[0] is not None else None
+        return volume, self._expiry(volume, row[1])
+
+    @staticmethod
+    def _store(isbn, volume, fetched_at) -> None:
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO isbn_cache (isbn, volume, fetched_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(isbn) DO UPDATE
+                SET volume = excluded.volume, fetched_at = excluded.fetched_at
+                """,
+                (isbn, json.dumps(volume) if volume is not None else None, fetched_at),
+            )
+
+
+class RateLimiter:
+    """Token bucket shared by every thread, allowing `rate` calls per second."""
+
+    def __init__(self, rate=None, burst=1):
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+
+    def configure(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def acquire(self):
+        """Block until a call is allowed."""
+        while wait := self._reserve():
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait until a call is allowed, without blocking the event loop."""
+        while wait := self._reserve():
+            await asyncio.sleep(wait)
+
+    def _reserve(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        if not self.rate:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+
+class IsbnLookup:
+    """Resolve ISBNs to Google Books volumes through an `IsbnCache`.
+
+    Requests share one pooled HTTP session, are throttled by a `RateLimiter` and
+    retried with exponential backoff on connection errors and 429/5xx answers.
+    The `*_async` methods do the same on an asyncio event loop, with an httpx
+    client, for the ASGI server.
+    """
+
+    def __init__(self):
+        self.base_url = "https://www.googleapis.com/books/v1"
+        self.timeout = 5.0
+        self.retries = 2
+        self.backoff = 0.5
+        self.workers = 4
+        self.cache = IsbnCache()
+        self.rate_limiter = RateLimiter()
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._client = None
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                # Imported on first use, requests is slow to import.
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+                self._session = requests.Session()
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+            return self._session
+
+    @property
+    def client(self):
+        """The httpx client of the async lookups, bound to the running event loop."""
+        if self._client is None:
+            # Imported on first use, only the ASGI server needs it.
+            import httpx
+
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def aclose(self):
+        """Close the httpx client, before its event loop stops."""
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    def get_volume(self, isbn):
+        """Return the volume of an ISBN, or None if Google Books has none."""
+        prefetched = prefetched_volumes.get()
+        if prefetched is not None and str(isbn) in prefetched:
+            volume, error = prefetched[str(isbn)]
+            if error is not None:
+                raise error
+            return volume
+        return self.cache.get(isbn, self.fetch_volume)
+
+    async def get_volume_async(self, isbn, executor):
+        """Return the volume of an ISBN like `get_volume`, reading the cache table in `executor`."""
+        return await self.cache.get_async(isbn, self.fetch_volume_async, executor)
+
+    async def prefetch(self, isbns, executor) -> dict:
+        """Look ISBNs up on the event loop, at most `workers` at once.
+
+        Return the `(volume, None)` or `(None, exception)` of each ISBN, keyed
+        by its text. Once set in `prefetched_volumes`, `get_volume` answers from
+        it instead of blocking its thread on Google Books.
+        """
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def lookup(isbn):
+            async with semaphore:
+                try:
+                    return await self.get_volume_async(isbn, executor), None
+                except Exception as e:
+                    return None, e
+
+        keys = list(dict.fromkeys(map(str, isbns)))
+        results = await asyncio.gather(*map(lookup, keys))
+        return dict(zip(keys, results))
+
+    def map_concurrently(self, function, isbns) -> list:
+        """Call `function` on each ISBN in a bounded thread pool.
+
+        Return `(result, None)` or `(None, exception)` for each ISBN, in order.
+        Each call runs in a copy of the caller's context, so that its timings are
+        still accounted to the current request.
+        """
+        context = copy_context()
+
+        def call(isbn):
+            try:
+                return function(isbn), None
+            except Exception as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(lambda isbn: context.copy().run(call, isbn), isbns))
+
+    def fetch_volume(self, isbn):
+        """Fetch a volume from Google Books, bypassing the cache."""
+        import requests
+
+        url = f"{self.base_url}/volumes"
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(
+                    url, params={"q": f"isbn:{isbn}"}, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                record_http(host, time.perf_counter() - start, type(e).__name__)
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2**attempt
+            else:
+                record_http(host, time.perf_counter() - start, str(response.status_code))
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    items = response.json().get("items")
+                    return items[0] if items else None
+                delay = self._retry_after(response) or self.backoff * 2**attempt
+            time.sleep(delay)
+
+    async def fetch_volume_async(self, isbn):
+        """Fetch a volume like `fetch_volume`, each attempt lasting at most `timeout`."""
+        import httpx
+
+        url = f"{self.base_url}/volumes"
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            await self.rate_limiter.acquire_async()
+            start = time.perf_counter()
+            try:
+                async with asyncio.timeout(self.timeout):
+                    response = await self.client.get(url, params={"q": f"isbn:{isbn}"})
+            except (httpx.TransportError, TimeoutError) as e:
+                record_http(host, time.perf_counter() - start, type(e).__name__)
+                if attempt == self.retries:
+                    if isinstance(e, TimeoutError):
+                        raise TimeoutError(f"No answer from {host} in {self.timeout}s") from e
+                    raise
+                delay = self.backoff * 2**attempt
+            else:
+                record_http(host, time.perf_counter() - start, str(response.status_code))
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    items = response.json().get("items")
+                    return items[0] if items else None
+                delay = self._retry_after(response) or self.backoff * 2**attempt
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            return None
+
+
+isbn_lookup = IsbnLookup()
+
+
+def init_app(app):
+    """Configure the shared ISBN lookup from the application config."""
+    isbn_lookup.base_url = app.config["GOOGLE_BOOKS_BASE_URL"].rstrip("/")
+    isbn_lookup.timeout = app.config["GOOGLE_BOOKS_TIMEOUT"]
+    isbn_lookup.retries = app.config["GOOGLE_BOOKS_RETRIES"]
+    isbn_lookup.backoff = app.config["GOOGLE_BOOKS_BACKOFF"]
+    isbn_lookup.workers = app.config["ISBN_BATCH_WORKERS"]
+    isbn_lookup.rate_limiter.configure(
+        rate=app.config["GOOGLE_BOOKS_RATE_LIMIT"],
+        burst=app.config["GOOGLE_BOOKS_RATE_BURST"],
+    )
+    isbn_lookup.cache.configure(
+        size=app.config["ISBN_CACHE_SIZE"],
+        ttl=app.config["ISBN_CACHE_TTL"],
+        negative_ttl=app.config["ISBN_CACHE_NEGATIVE_TTL"],
+    )
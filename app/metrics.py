@@ -0,0 +1,285 @@
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+
+from .db import pool
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """Prometheus-style histogram of durations, one series per label set."""
+
+    def __init__(self, name, description, label_names, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels, seconds):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[0][i] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        """Return the histogram in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, (buckets, total, count) in series:
+            label_text = ",".join(
+                f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)
+            )
+            prefix = f"{label_text}," if label_text else ""
+            for bound, bucket_count in zip(self.buckets, buckets):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "booktracker_request_duration_seconds",
+    "Duration of HTTP requests by route.",
+    ("method", "route", "status"),
+)
+query_duration = Histogram(
+    "booktracker_sql_query_duration_seconds",
+    "Duration of SQL statements, from execution to the last fetched row.",
+    ("query",),
+)
+http_client_duration = Histogram(
+    "booktracker_http_client_duration_seconds",
+    "Duration of outbound HTTP requests by host.",
+    ("host", "outcome"),
+)
+HISTOGRAMS = (request_duration, query_duration, http_client_duration)
+
+
+class RequestStats:
+    """Time spent per component while serving one request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.counts = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+
+_current_stats = ContextVar("request_stats", default=None)
+
+
+def _record(name, seconds):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.add(name, seconds)
+
+
+@contextmanager
+def timed(name):
+    """Account the time spent in a block to the current request under `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def record_http(host, seconds, outcome):
+    """Record an outbound HTTP request."""
+    http_client_duration.observe((host, outcome), seconds)
+    _record("http", seconds)
+
+
+_PLACEHOLDER_LISTS = re.compile(r"\((?:\?, )+\?\)(?:, \((?:\?, )+\?\))+")
+
+_PLACEHOLDER_IN = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+
+def normalize_query(sql):
+    """Collapse whitespace and variable-length placeholder lists into a stable label.
+
+    Multi-row `VALUES` lists and `IN (?, ...)` lists of any length give the
+    same label, the labels of a statement stay bounded whatever its batch size.
+    """
+    sql = " ".join(sql.split())
+    sql = _PLACEHOLDER_LISTS.sub("(...)", sql)
+    return _PLACEHOLDER_IN.sub("IN (...)", sql)
+
+
+# SQL instrumentation
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor timing each statement, from its execution to its last fetched row."""
+
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        self.flush()
+        return self._timed(sql, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.flush()
+        return self._timed(sql, super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        self.flush()
+        return self._timed("<script>", super().executescript, sql_script)
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is None:
+            self.flush()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(super().fetchmany, size if size is not None else self.arraysize)
+        if not rows:
+            self.flush()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        self.flush()
+        return rows
+
+    def close(self):
+        self.flush()
+        super().close()
+
+    def flush(self):
+        """Record the pending statement, if any."""
+        if self._pending is not None:
+            sql, seconds = self._pending
+            self._pending = None
+            query_duration.observe((normalize_query(sql),), seconds)
+            _record("db", seconds)
+
+    def _timed(self, sql, method, *args):
+        self.connection.cursors.add(self)
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._pending = (sql, time.perf_counter() - start)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._pending is not None:
+                sql, seconds = self._pending
+                self._pending = (sql, seconds + time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection handing out `InstrumentedCursor`s."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursors = weakref.WeakSet()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def flush(self):
+        """Record the statements still pending on any cursor."""
+        for cursor in list(self.cursors):
+            cursor.flush()
+
+
+def _trace(statement):
+    # Called for every statement, including each trigger program that fires.
+    _record("sql_statements", 0.0)
+
+
+def _on_connect(conn):
+    conn.set_trace_callback(_trace)
+
+
+def _on_release(conn):
+    conn.flush()
+
+
+# Request instrumentation
+
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    g.request_stats = RequestStats()
+    g.request_stats_token = _current_stats.set(g.request_stats)
+
+
+def _finish_request(response):
+    stats = g.pop("request_stats", None)
+    if stats is None:
+        return response
+    _current_stats.reset(g.pop("request_stats_token"))
+    total = time.perf_counter() - g.pop("request_start")
+
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    request_duration.observe((request.method, route, str(response.status_code)), total)
+
+    durations, counts = stats.durations, stats.counts
+    timings = []
+    if "db" in durations:
+        timings.append(
+            f'db;dur={durations["db"] * 1000:.2f};desc="{counts["db"]} queries, '
+            f'{counts.get("sql_statements", 0)} statements"'
+        )
+    for name in sorted(durations.keys() - {"db", "sql_statements"}):
+        timings.append(f"{name};dur={durations[name] * 1000:.2f}")
+    timings.append(f"total;dur={total * 1000:.2f}")
+    response.headers.add("Server-Timing", ", ".join(timings))
+    return response
+
+
+def render():
+    """Return every histogram in the Prometheus text exposition format."""
+    return "\n".join(histogram.render() for histogram in HISTOGRAMS) + "\n"
+
+
+def init_app(app):
+    """Instrument requests and pooled SQLite connections."""
+    if not app.config["METRICS_ENABLED"]:
+        return
+
+    pool.close()
+    pool.factory = InstrumentedConnection
+    pool.connect_hooks.append(_on_connect)
+    pool.release_hooks.append(_on_release)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
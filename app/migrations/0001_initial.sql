@@ -0,0 +1,286 @@
+-- Baseline schema. Libraries created before migrations already hold some of
+-- these objects, hence the IF NOT EXISTS clauses.
+
+CREATE TABLE IF NOT EXISTS books
+(
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    title        TEXT NOT NULL,
+    author_id    INTEGER,
+    series       TEXT,
+    volume       INTEGER CHECK (volume IS NULL OR volume > 0),
+    year         INTEGER CHECK (year >= 0),
+    language     TEXT,
+    genre        TEXT,
+    written_form TEXT,
+    publisher    TEXT,
+    collection   TEXT,
+    isbn         INTEGER UNIQUE,
+    FOREIGN KEY (author_id) REFERENCES authors (id)
+);
+
+CREATE TABLE IF NOT EXISTS authors
+(
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    author_last  TEXT NOT NULL COLLATE NOCASE,
+    author_first TEXT NOT NULL COLLATE NOCASE,
+    UNIQUE (author_last, author_first)
+);
+
+CREATE TABLE IF NOT EXISTS read_status
+(
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id INTEGER NOT NULL,
+    status  TEXT    NOT NULL CHECK (status IN ('not_read', 'reading', 'read')),
+    FOREIGN KEY (book_id) REFERENCES books (id),
+    UNIQUE (book_id)
+);
+
+CREATE TABLE IF NOT EXISTS meta
+(
+    key   TEXT PRIMARY KEY,
+    value
+);
+
+-- Full-text search
+
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5
+(
+    title,
+    author,
+    series,
+    publisher,
+    collection,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- Books that existed before the index are indexed in batches by the backfill.
+INSERT OR IGNORE INTO meta (key, value)
+SELECT 'search_backfill_target', IFNULL(MAX(id), 0) FROM books;
+INSERT OR IGNORE INTO meta (key, value)
+VALUES ('search_backfill_progress', 0);
+
+CREATE TRIGGER IF NOT EXISTS books_fts_insert
+    AFTER INSERT
+    ON books
+BEGIN
+    INSERT INTO books_fts (rowid, title, author, series, publisher, collection)
+    VALUES (NEW.id,
+            NEW.title,
+            (SELECT author_first || ' ' || author_last FROM authors WHERE id = NEW.author_id),
+            NEW.series,
+            NEW.publisher,
+            NEW.collection);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_update
+    AFTER UPDATE
+    ON books
+BEGIN
+    DELETE FROM books_fts WHERE rowid = OLD.id;
+    INSERT INTO books_fts (rowid, title, author, series, publisher, collection)
+    VALUES (NEW.id,
+            NEW.title,
+            (SELECT author_first || ' ' || author_last FROM authors WHERE id = NEW.author_id),
+            NEW.series,
+            NEW.publisher,
+            NEW.collection);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_delete
+    AFTER DELETE
+    ON books
+BEGIN
+    DELETE FROM books_fts WHERE rowid = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_author_update
+    AFTER UPDATE
+    ON authors
+BEGIN
+    UPDATE books_fts
+    SET author = NEW.author_first || ' ' || NEW.author_last
+    WHERE rowid IN (SELECT id FROM books WHERE author_id = NEW.id);
+END;
+
+-- Google Books volumes by ISBN-13, a NULL volume caches an unknown ISBN
+
+CREATE TABLE IF NOT EXISTS isbn_cache
+(
+    isbn       TEXT PRIMARY KEY,
+    volume     TEXT,
+    fetched_at REAL NOT NULL
+);
+
+-- Library version, bumped by every write to serve conditional GETs
+
+INSERT OR IGNORE INTO meta (key, value)
+VALUES ('library_version', 0);
+
+CREATE TRIGGER IF NOT EXISTS books_version_insert AFTER INSERT ON books
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_version_update AFTER UPDATE ON books
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_version_delete AFTER DELETE ON books
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS authors_version_insert AFTER INSERT ON authors
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS authors_version_update AFTER UPDATE ON authors
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS authors_version_delete AFTER DELETE ON authors
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS read_status_version_insert AFTER INSERT ON read_status
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS read_status_version_update AFTER UPDATE ON read_status
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS read_status_version_delete AFTER DELETE ON read_status
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+-- Statistics, kept up to date incrementally
+
+CREATE TABLE IF NOT EXISTS stats
+(
+    dimension TEXT    NOT NULL,
+    value     TEXT    NOT NULL,
+    count     INTEGER NOT NULL,
+    PRIMARY KEY (dimension, value)
+) WITHOUT ROWID;
+
+-- Libraries that predate the statistics need a rebuild.
+INSERT OR IGNORE INTO meta (key, value)
+SELECT 'stats_stale', COUNT(*) > 0 FROM (SELECT 1 FROM books LIMIT 1);
+
+CREATE TRIGGER IF NOT EXISTS books_stats_insert AFTER INSERT ON books
+BEGIN
+    INSERT INTO stats (dimension, value, count)
+    VALUES ('total', '', 1),
+           ('author', NEW.author_id, 1),
+           ('genre', IFNULL(NEW.genre, ''), 1),
+           ('language', IFNULL(NEW.language, ''), 1),
+           ('publisher', IFNULL(NEW.publisher, ''), 1),
+           ('decade', IFNULL(NEW.year / 10 * 10, ''), 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_stats_update
+    AFTER UPDATE OF author_id, genre, language, publisher, year
+    ON books
+BEGIN
+    INSERT INTO stats (dimension, value, count)
+    VALUES ('author', OLD.author_id, -1),
+           ('genre', IFNULL(OLD.genre, ''), -1),
+           ('language', IFNULL(OLD.language, ''), -1),
+           ('publisher', IFNULL(OLD.publisher, ''), -1),
+           ('decade', IFNULL(OLD.year / 10 * 10, ''), -1),
+           ('author', NEW.author_id, 1),
+           ('genre', IFNULL(NEW.genre, ''), 1),
+           ('language', IFNULL(NEW.language, ''), 1),
+           ('publisher', IFNULL(NEW.publisher, ''), 1),
+           ('decade', IFNULL(NEW.year / 10 * 10, ''), 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_stats_delete AFTER DELETE ON books
+BEGIN
+    INSERT INTO stats (dimension, value, count)
+    VALUES ('total', '', -1),
+           ('author', OLD.author_id, -1),
+           ('genre', IFNULL(OLD.genre, ''), -1),
+           ('language', IFNULL(OLD.language, ''), -1),
+           ('publisher', IFNULL(OLD.publisher, ''), -1),
+           ('decade', IFNULL(OLD.year / 10 * 10, ''), -1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS read_status_stats_insert AFTER INSERT ON read_status
+BEGIN
+    INSERT INTO stats (dimension, value, count)
+    VALUES ('status', NEW.status, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS read_status_stats_update AFTER UPDATE OF status ON read_status
+BEGIN
+    INSERT INTO stats (dimension, value, count)
+    VALUES ('status', OLD.status, -1),
+           ('status', NEW.status, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS read_status_stats_delete AFTER DELETE ON read_status
+BEGIN
+    INSERT INTO stats (dimension, value, count)
+    VALUES ('status', OLD.status, -1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count;
+END;
+
+-- Change log for delta sync, a book missing from `books` has been deleted
+
+CREATE TABLE IF NOT EXISTS books_changes
+(
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id    INTEGER NOT NULL,
+    changed_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+);
+
+CREATE INDEX IF NOT EXISTS books_changes_book_id ON books_changes (book_id);
+
+-- Highest sequence number removed by compaction, older cursors must resync.
+INSERT OR IGNORE INTO meta (key, value)
+VALUES ('changes_compacted_seq', 0);
+
+CREATE TRIGGER IF NOT EXISTS books_changes_insert AFTER INSERT ON books
+BEGIN
+    INSERT INTO books_changes (book_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_changes_update AFTER UPDATE ON books
+BEGIN
+    INSERT INTO books_changes (book_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_changes_delete AFTER DELETE ON books
+BEGIN
+    INSERT INTO books_changes (book_id) VALUES (OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS read_status_changes_insert AFTER INSERT ON read_status
+BEGIN
+    INSERT INTO books_changes (book_id) VALUES (NEW.book_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS read_status_changes_update AFTER UPDATE ON read_status
+BEGIN
+    INSERT INTO books_changes (book_id) VALUES (NEW.book_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS read_status_changes_delete AFTER DELETE ON read_status
+BEGIN
+    INSERT INTO books_changes (book_id) VALUES (OLD.book_id);
+END;
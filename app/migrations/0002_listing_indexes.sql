@@ -0,0 +1,19 @@
+-- Indexes of the filtered and sorted listing and of its facet counts.
+
+-- Listing by author, and the author filter and facet.
+CREATE INDEX books_author_year ON books (author_id, IFNULL(year, -1));
+
+-- Listing by title.
+CREATE INDEX books_title ON books (title COLLATE NOCASE);
+
+-- Listing by year, the year range filter, and the decade facet it covers.
+CREATE INDEX books_year ON books (IFNULL(year, -1), year);
+
+-- Facet filters and counts.
+CREATE INDEX books_genre ON books (genre);
+CREATE INDEX books_language ON books (language);
+CREATE INDEX books_written_form ON books (written_form);
+CREATE INDEX books_publisher ON books (publisher);
+
+-- Status filter and facet, covering the lookup of a book's status.
+CREATE INDEX read_status_status ON read_status (status, book_id);
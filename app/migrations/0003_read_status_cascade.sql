@@ -0,0 +1,76 @@
+-- Delete the reading status of a book together with the book, enforced once
+-- the connections enable foreign keys. SQLite cannot alter a foreign key, the
+-- table is rebuilt and its indexes and triggers created again.
+
+-- Statuses left behind by books deleted before the cascade.
+DELETE FROM read_status WHERE book_id NOT IN (SELECT id FROM books);
+
+CREATE TABLE read_status_new
+(
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id INTEGER NOT NULL,
+    status  TEXT    NOT NULL CHECK (status IN ('not_read', 'reading', 'read')),
+    FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE,
+    UNIQUE (book_id)
+);
+
+INSERT INTO read_status_new (id, book_id, status)
+SELECT id, book_id, status FROM read_status;
+
+DROP TABLE read_status;
+
+ALTER TABLE read_status_new RENAME TO read_status;
+
+CREATE INDEX read_status_status ON read_status (status, book_id);
+
+CREATE TRIGGER read_status_version_insert AFTER INSERT ON read_status
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER read_status_version_update AFTER UPDATE ON read_status
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER read_status_version_delete AFTER DELETE ON read_status
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
+
+CREATE TRIGGER read_status_stats_insert AFTER INSERT ON read_status
+BEGIN
+    INSERT INTO stats (dimension, value, count)
+    VALUES ('status', NEW.status, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER read_status_stats_update AFTER UPDATE OF status ON read_status
+BEGIN
+    INSERT INTO stats (dimension, value, count)
+    VALUES ('status', OLD.status, -1),
+           ('status', NEW.status, 1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER read_status_stats_delete AFTER DELETE ON read_status
+BEGIN
+    INSERT INTO stats (dimension, value, count)
+    VALUES ('status', OLD.status, -1)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count;
+END;
+
+CREATE TRIGGER read_status_changes_insert AFTER INSERT ON read_status
+BEGIN
+    INSERT INTO books_changes (book_id) VALUES (NEW.book_id);
+END;
+
+CREATE TRIGGER read_status_changes_update AFTER UPDATE ON read_status
+BEGIN
+    INSERT INTO books_changes (book_id) VALUES (NEW.book_id);
+END;
+
+CREATE TRIGGER read_status_changes_delete AFTER DELETE ON read_status
+BEGIN
+    INSERT INTO books_changes (book_id) VALUES (OLD.book_id);
+END;
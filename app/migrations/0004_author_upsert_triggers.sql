@@ -0,0 +1,26 @@
+-- Authors are resolved with an upsert that touches the existing row. Only a
+-- change of name reindexes the author's books and bumps the library version.
+
+DROP TRIGGER books_fts_author_update;
+
+CREATE TRIGGER books_fts_author_update
+    AFTER UPDATE
+    ON authors
+    WHEN NEW.author_last IS NOT OLD.author_last COLLATE BINARY
+        OR NEW.author_first IS NOT OLD.author_first COLLATE BINARY
+BEGIN
+    UPDATE books_fts
+    SET author = NEW.author_first || ' ' || NEW.author_last
+    WHERE rowid IN (SELECT id FROM books WHERE author_id = NEW.id);
+END;
+
+DROP TRIGGER authors_version_update;
+
+CREATE TRIGGER authors_version_update
+    AFTER UPDATE
+    ON authors
+    WHEN NEW.author_last IS NOT OLD.author_last COLLATE BINARY
+        OR NEW.author_first IS NOT OLD.author_first COLLATE BINARY
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'library_version';
+END;
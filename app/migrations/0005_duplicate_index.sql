@@ -0,0 +1,20 @@
+-- MinHash buckets of the normalized title of each book, one row per band, used
+-- to find near-duplicates without comparing every pair of books.
+-- They are computed by the application on each write.
+
+CREATE TABLE books_minhash
+(
+    book_id INTEGER NOT NULL,
+    band    INTEGER NOT NULL,
+    bucket  INTEGER NOT NULL,
+    PRIMARY KEY (book_id, band),
+    FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX books_minhash_bucket ON books_minhash (band, bucket, book_id);
+
+-- Books that existed before the index are indexed in batches by the backfill.
+INSERT INTO meta (key, value)
+SELECT 'duplicate_backfill_target', IFNULL(MAX(id), 0) FROM books;
+INSERT INTO meta (key, value)
+VALUES ('duplicate_backfill_progress', 0);
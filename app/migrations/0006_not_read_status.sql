@@ -0,0 +1,13 @@
+-- Every book has a status row, not_read until set otherwise. Listing the books
+-- not read is then a search of read_status_status, rather than a walk of every
+-- book skipping those read.
+
+INSERT INTO read_status (book_id, status)
+SELECT id, 'not_read' FROM books
+WHERE id NOT IN (SELECT book_id FROM read_status);
+
+CREATE TRIGGER books_status_insert AFTER INSERT ON books
+BEGIN
+    INSERT INTO read_status (book_id, status) VALUES (NEW.id, 'not_read')
+    ON CONFLICT (book_id) DO NOTHING;
+END;
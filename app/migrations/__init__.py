@@ -0,0 +1,66 @@
+"""Schema migrations, applied in order and tracked with ``PRAGMA user_version``.
+
+Each migration is a ``NNNN_description.sql`` file of this package, where
+``NNNN`` is the schema version it upgrades to. Migrations are never edited once
+released, a schema change is a new file.
+"""
+
+import re
+import sqlite3
+from pathlib import Path
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent
+
+_MIGRATION_NAME = re.compile(r"^(\d{4})_\w+\.sql$")
+
+
+def list_migrations() -> list[tuple[int, Path]]:
+    """Return the `(version, path)` of every migration, in order."""
+    migrations = []
+    for path in MIGRATIONS_DIR.iterdir():
+        match = _MIGRATION_NAME.match(path.name)
+        if match:
+            migrations.append((int(match.group(1)), path))
+    return sorted(migrations)
+
+
+def split_statements(script):
+    """Split an SQL script into complete statements, trigger bodies included."""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ""
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> list[int]:
+    """Apply the pending migrations and return the versions applied.
+
+    Each migration runs in its own write transaction together with the version
+    bump, and the version is read again once the write lock is held, so that
+    concurrent processes never apply a migration twice. A database that is
+    already current costs one pragma read.
+    """
+    migrations = list_migrations()
+    if schema_version(conn) >= migrations[-1][0]:
+        return []
+
+    applied = []
+    for version, path in migrations:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) < version:
+                for statement in split_statements(path.read_text(encoding="utf-8")):
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return applied
@@ -1,106 +1,54 @@
+import json
+import re
 import sqlite3
-from csv import reader
-from dataclasses import asdict, dataclass, fields
-from pathlib import Path
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dataclasses import dataclass, fields
+from itertools import combinations
 from typing import Optional, Self
 
-import requests
-from wtforms import Form, IntegerField, StringField, validators
-
-DATABASE_PATH = Path("BookTracker.db")
-SCHEMA_PATH = Path("./app/schema.sql")
+from .authors import author_resolver
+from .db import pool, savepoint
+from .duplicates import Fingerprint, buckets, group_pairs
+from .isbn import isbn_lookup
+from .metrics import timed
+from .migrations import migrate
+from .queries import DEFAULT_SORT, FACETS, BookFilter, facet_query, page_query
+from .readmodel import read_model
+from .records import BOOK_COLUMNS, BookRecord, book_row
+from .stats import STATS_FACETS, StatsRepository
 
 
 def init_db():
-    with sqlite3.connect(DATABASE_PATH) as conn, open(SCHEMA_PATH) as f:
-        cursor = conn.cursor()
-        cursor.executescript(f.read())
-
-        cursor.execute("SELECT * FROM books")
-        if not cursor.fetchone():
-            import_data("data.csv")
-
-        conn.commit()
+    """Bring the schema up to date and finish any interrupted backfill.
 
+    Seeding an empty library is left to the `seed-library` command.
+    """
+    with pool.connection() as conn:
+        migrate(conn)
 
-def import_data(filename):
-
-    with open(filename) as f:
-        r = reader(f, delimiter=";")
-        next(r)
-        for row in r:
-
-            title = row[0]
-
-            try:
-                author_last, author_first = row[1].split("\n")[0].split(", ")
-            except ValueError:
-                author_last = row[1]
-                author_first = ""
+    BookRepository.build_search_index()
+    BookRepository.build_duplicate_index()
+    if StatsRepository.is_stale():
+        StatsRepository.rebuild()
 
-            if row[2]:
-                series, volume = row[2].split(" #")
-            else:
-                series = None
-                volume = None
 
-            if row[3]:
-                year = row[3]
-            else:
-                year = None
+# Keyset pagination helpers
+def encode_cursor(key) -> str:
+    """Encode a listing sort key as an opaque URL-safe cursor."""
+    return urlsafe_b64encode(json.dumps(key).encode()).decode()
 
-            if row[7]:
-                language = row[7]
-            else:
-                language = None
 
-            if row[5]:
-                genre = row[5]
-            else:
-                genre = None
+def decode_cursor(cursor, sort=DEFAULT_SORT) -> tuple:
+    """Decode a cursor produced by `encode_cursor` for a listing order."""
+    try:
+        return sort.parse_key(json.loads(urlsafe_b64decode(cursor.encode())))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
 
-            if row[4]:
-                written_form = row[4]
-            else:
-                written_form = None
 
-            if row[6]:
-                text = row[6].split(" - ")
-                publisher = text[0]
-                if len(text) > 1:
-                    collection = ", ".join(text[1:])
-            else:
-                publisher = None
-                collection = None
-
-            isbn = None
-
-            if row[8] == "Oui":
-                status = "read"
-            else:
-                status = "not_read"
-
-            book = Book(
-                title=title,
-                author_last=author_last,
-                author_first=author_first,
-                series=series,
-                volume=volume,
-                year=year,
-                language=language,
-                genre=genre,
-                written_form=written_form,
-                publisher=publisher,
-                collection=collection,
-                isbn=isbn,
-            )
-
-            try:
-                book_id = BookRepository.create(book)
-                BookRepository.update_reading_status(book_id, status)
-            except Exception as e:
-                print(f"Failed to import {title}: {e}")
-                print(book)
+def fts_query(text) -> str:
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
 
 
 class BookRepository:
@@ -109,8 +57,15 @@ class BookRepository:
     # Database connection
     @staticmethod
     def get_connection():
-        """Create a connection to the SQLite database."""
-        return sqlite3.connect(DATABASE_PATH)
+        """Borrow a connection from the pool, committing when the block exits."""
+        return pool.connection()
+
+    @staticmethod
+    def book_cursor(conn):
+        """Return a cursor of `conn` reading `BOOK_COLUMNS` rows as `BookRecord`s."""
+        cursor = conn.cursor()
+        cursor.row_factory = book_row
+        return cursor
 
     # Core CRUD operations
     @classmethod
@@ -119,10 +74,8 @@ class BookRepository:
         with cls.get_connection() as conn:
             cursor = conn.cursor()
 
-            author_id = cls._ensure_author_exists(
-                cursor, book.author_last, book.author_first
-            )
-            cursor.execute(
+            cls._write_book(
+                cursor,
                 """
                 INSERT INTO books (
                     title, 
@@ -139,66 +92,148 @@ class BookRepository:
                 )
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
-                (
-                    book.title,
-                    author_id,
-                    book.series,
-                    book.volume,
-                    book.year,
-                    book.language,
-                    book.genre,
-                    book.written_form,
-                    book.publisher,
-                    book.collection,
-                    book.isbn,
-                ),
+                book,
             )
-
             book_id = cursor.lastrowid
-            conn.commit()
 
+            cls._index_duplicates(cursor, book_id, book)
+            read_model.stage(conn, book_id)
             return book_id
 
     @classmethod
     def find_all(cls):
         """Retrieve all books, ordered by author and year."""
         with cls.get_connection() as conn:
-            cursor = conn.cursor()
+            cursor = cls.book_cursor(conn)
 
             cursor.execute(
-                """
-                SELECT books.*, authors.author_first, authors.author_last, read_status.status
+                f"""
+                SELECT {BOOK_COLUMNS}
                 FROM books
                 JOIN authors ON books.author_id = authors.id
                 LEFT JOIN read_status ON books.id = read_status.book_id
-                ORDER BY authors.author_last, authors.author_first, books.year
+                ORDER BY authors.author_last, authors.author_first, IFNULL(books.year, -1), books.id
             """
             )
 
-            rows = cursor.fetchall()
-            return [
-                dict(zip([column[0] for column in cursor.description], row))
-                for row in rows
-            ]
+            return cursor.fetchall()
+
+    @classmethod
+    def iter_all(cls, batch_size=500):
+        """Yield all books in listing order, fetching `batch_size` rows at a time."""
+        with cls.get_connection() as conn:
+            cursor = cls.book_cursor(conn)
+
+            cursor.execute(
+                f"""
+                SELECT {BOOK_COLUMNS}
+                FROM books
+                JOIN authors ON books.author_id = authors.id
+                LEFT JOIN read_status ON books.id = read_status.book_id
+                ORDER BY authors.author_last, authors.author_first, IFNULL(books.year, -1), books.id
+            """
+            )
+
+            while rows := cursor.fetchmany(batch_size):
+                yield from rows
+
+    @classmethod
+    def find_page(cls, limit, after=None, book_filter=None, sort=DEFAULT_SORT):
+        """Retrieve up to `limit` books matching a filter, following the `after` key.
+
+        Books are ordered by `sort`, whose last column is the book ID, so that a
+        page can be resumed from the key of its last book without OFFSET.
+        Return the books and the key to resume from, or None on the last page.
+        """
+        sql, params = page_query(book_filter or BookFilter(), sort, after, limit + 1)
+        with cls.get_connection() as conn:
+            cursor = cls.book_cursor(conn)
+            cursor.execute(sql, params)
+            books = cursor.fetchall()
+
+        if len(books) <= limit:
+            return books, None
+        books = books[:limit]
+        return books, sort.key(books[-1])
+
+    @classmethod
+    def find_facets(cls, book_filter, limit):
+        """Count the books matching a filter per value of each facet dimension.
+
+        A dimension is counted under the filters of the other dimensions only,
+        so that its other values can still be offered. Return up to `limit`
+        values per dimension, the most frequent first; author values come
+        with a label.
+        """
+        facets = {}
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            for dimension in FACETS:
+                if dimension in STATS_FACETS and not book_filter.dimensions() - {dimension}:
+                    # Counted over the whole library, the statistics have them.
+                    rows = StatsRepository.facet(dimension, limit)
+                else:
+                    cursor.execute(*facet_query(dimension, book_filter, limit))
+                    rows = cursor.fetchall()
+                if dimension == "author":
+                    facets[dimension] = [
+                        {"value": value, "label": label, "count": count}
+                        for value, label, count in rows
+                    ]
+                else:
+                    facets[dimension] = [{"value": value, "count": count} for value, count in rows]
+        return facets
+
+    @classmethod
+    def explain(cls, sql, params) -> list[str]:
+        """Return the query plan of a statement, one line per step."""
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[3] for row in cursor.fetchall()]
+
+    @classmethod
+    def search(cls, query, limit):
+        """Retrieve the books best matching a full-text query."""
+        with cls.get_connection() as conn:
+            cursor = cls.book_cursor(conn)
+
+            # Matches on the title weigh more than on the author, then the series.
+            cursor.execute(
+                f"""
+                SELECT {BOOK_COLUMNS}
+                FROM books_fts
+                JOIN books ON books.id = books_fts.rowid
+                JOIN authors ON books.author_id = authors.id
+                LEFT JOIN read_status ON books.id = read_status.book_id
+                WHERE books_fts MATCH ?
+                ORDER BY bm25(books_fts, 10.0, 5.0, 3.0, 1.0, 1.0)
+                LIMIT ?
+            """,
+                (query, limit),
+            )
+
+            return cursor.fetchall()
 
     @classmethod
     def find_by_id(cls, book_id):
         """Retrieve a single book by its ID."""
         with cls.get_connection() as conn:
-            cursor = conn.cursor()
+            cursor = cls.book_cursor(conn)
 
             cursor.execute(
-                """
-                SELECT books.*, authors.author_first, authors.author_last 
+                f"""
+                SELECT {BOOK_COLUMNS}
                 FROM books
                 JOIN authors ON books.author_id = authors.id
+                LEFT JOIN read_status ON books.id = read_status.book_id
                 WHERE books.id = ?
             """,
                 (book_id,),
             )
 
-            row = cursor.fetchone()
-            return dict(zip([column[0] for column in cursor.description], row))
+            return cursor.fetchone()
 
     @classmethod
     def update(cls, book_id, book):
@@ -206,11 +241,9 @@ class BookRepository:
         with cls.get_connection() as conn:
             cursor = conn.cursor()
 
-            cls._remove_unused_author(cursor, book_id)
-            author_id = cls._ensure_author_exists(
-                cursor, book.author_last, book.author_first
-            )
-            cursor.execute(
+            previous_author_id = cls._find_author_id(cursor, book_id)
+            cls._write_book(
+                cursor,
                 """
                 UPDATE books
                 SET title = ?, 
@@ -226,23 +259,12 @@ class BookRepository:
                     isbn = ?
                 WHERE id = ?
             """,
-                (
-                    book.title,
-                    author_id,
-                    book.series,
-                    book.volume,
-                    book.year,
-                    book.language,
-                    book.genre,
-                    book.written_form,
-                    book.publisher,
-                    book.collection,
-                    book.isbn,
-                    book_id,
-                ),
+                book,
+                book_id,
             )
-
-            conn.commit()
+            cls._index_duplicates(cursor, book_id, book)
+            author_resolver.release(cursor, previous_author_id)
+            read_model.stage(conn, book_id)
 
     @classmethod
     def delete(cls, book_id):
@@ -250,11 +272,11 @@ class BookRepository:
         with cls.get_connection() as conn:
             cursor = conn.cursor()
 
-            cls._remove_unused_author(cursor, book_id)
+            author_id = cls._find_author_id(cursor, book_id)
+            # The reading status and duplicate buckets go with the foreign key cascade.
             cursor.execute("DELETE FROM books WHERE id = ?", (book_id,))
-            cursor.execute("DELETE FROM read_status WHERE book_id = ?", (book_id,))
-
-            conn.commit()
+            author_resolver.release(cursor, author_id)
+            read_model.stage(conn, book_id)
 
     # Status management
     @classmethod
@@ -266,83 +288,448 @@ class BookRepository:
             cursor.execute(
                 """
                 INSERT INTO read_status (book_id, status)
-                VALUES (?, ?)
+                SELECT ?, ? WHERE EXISTS (SELECT 1 FROM books WHERE id = ?)
                 ON CONFLICT(book_id) DO UPDATE SET status = excluded.status
             """,
-                (book_id, status),
+                (book_id, status, book_id),
             )
+            if cursor.rowcount == 0:
+                raise LookupError(f"No book with ID {book_id}")
+            read_model.stage(conn, book_id)
 
-            conn.commit()
+    # Batch writes
+    @classmethod
+    def run_batch(cls, operations, atomic=True):
+        """Run write operations in one transaction, each under its own savepoint.
+
+        Return a `(result, error)` pair per operation that was run. In atomic
+        mode the first error rolls the whole transaction back and stops the
+        batch, otherwise failed operations are undone alone and the rest commit.
+        """
+        results = []
+        with cls.get_connection() as conn:
+            for operation in operations:
+                try:
+                    with savepoint(conn, "batch_item"):
+                        results.append((operation(), None))
+                except Exception as e:
+                    results.append((None, e))
+                    if atomic:
+                        conn.rollback()
+                        for hook in pool.rollback_hooks:
+                            hook(conn)
+                        break
+        return results
 
-    # Author management helpers
+    # Change tracking
     @classmethod
-    def _ensure_author_exists(cls, cursor, author_last, author_first):
-        """Ensure author exists and return their ID."""
-        cursor.execute(
+    def is_empty(cls):
+        """Tell whether the library holds no book."""
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM books)")
+            return bool(cursor.fetchone()[0])
+
+    @classmethod
+    def get_version(cls):
+        """Return the library version, bumped by every write."""
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT value FROM meta WHERE key = 'library_version'")
+            return cursor.fetchone()[0]
+
+    @classmethod
+    def get_change_seq(cls):
+        """Return the sequence number of the latest logged change.
+
+        Once compaction removed every entry, this is the compacted sequence
+        number, which cursors resume from without a resync.
+        """
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                SELECT MAX(
+                    (SELECT IFNULL(MAX(seq), 0) FROM books_changes),
+                    (SELECT value FROM meta WHERE key = 'changes_compacted_seq')
+                )
             """
-            INSERT OR IGNORE INTO authors (author_last, author_first)
-            VALUES (?, ?)
+            )
+            return cursor.fetchone()[0]
+
+    @classmethod
+    def find_changes(cls, since, limit):
+        """Retrieve the books changed or deleted after the `since` sequence number.
+
+        At most `limit` log entries are read. Return None when entries after
+        `since` were compacted away, meaning the caller must resync entirely.
+        """
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                SELECT
+                    (SELECT value FROM meta WHERE key = 'changes_compacted_seq'),
+                    (SELECT IFNULL(MAX(seq), 0) FROM books_changes)
+            """
+            )
+            compacted_seq, latest_seq = cursor.fetchone()
+            latest_seq = max(latest_seq, compacted_seq)
+            if since < compacted_seq or since > latest_seq:
+                return None
+
+            cursor.execute(
+                """
+                SELECT IFNULL(MAX(seq), ?) FROM (
+                    SELECT seq FROM books_changes
+                    WHERE seq > ?
+                    ORDER BY seq
+                    LIMIT ?
+                )
             """,
-            (author_last, author_first),
-        )
-        cursor.execute(
+                (since, since, limit),
+            )
+            until = cursor.fetchone()[0]
+
+            book_cursor = cls.book_cursor(conn)
+            book_cursor.execute(
+                f"""
+                SELECT {BOOK_COLUMNS}
+                FROM books
+                JOIN authors ON books.author_id = authors.id
+                LEFT JOIN read_status ON books.id = read_status.book_id
+                WHERE books.id IN (
+                    SELECT book_id FROM books_changes WHERE seq > ? AND seq <= ?
+                )
+            """,
+                (since, until),
+            )
+            books = book_cursor.fetchall()
+
+            cursor.execute(
+                """
+                SELECT DISTINCT book_id FROM books_changes
+                WHERE seq > ? AND seq <= ?
+                AND book_id NOT IN (SELECT id FROM books)
+            """,
+                (since, until),
+            )
+            deleted = [row[0] for row in cursor.fetchall()]
+
+            return {
+                "books": books,
+                "deleted": deleted,
+                "seq": until,
+                "more": until < latest_seq,
+            }
+
+    @classmethod
+    def compact_changes(cls, retention):
+        """Drop superseded log entries and entries older than `retention` seconds.
+
+        Expiring entries bumps the library version. Return the number of
+        entries removed.
+        """
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            # Only the latest entry of a book matters to any cursor.
+            cursor.execute(
+                """
+                DELETE FROM books_changes
+                WHERE seq NOT IN (SELECT MAX(seq) FROM books_changes GROUP BY book_id)
             """
-            SELECT id FROM authors 
-            WHERE author_last = ? AND author_first = ?
+            )
+            removed = cursor.rowcount
+
+            cursor.execute(
+                """
+                SELECT MAX(seq) FROM books_changes
+                WHERE changed_at < CAST(strftime('%s', 'now') AS INTEGER) - ?
             """,
-            (author_last, author_first),
+                (retention,),
+            )
+            expired_seq = cursor.fetchone()[0]
+            if expired_seq is not None:
+                cursor.execute("DELETE FROM books_changes WHERE seq <= ?", (expired_seq,))
+                removed += cursor.rowcount
+                cursor.execute(
+                    "UPDATE meta SET value = MAX(value, ?) WHERE key = 'changes_compacted_seq'",
+                    (expired_seq,),
+                )
+                # Pages embedding a sequence number now compacted away must be served again.
+                cursor.execute("UPDATE meta SET value = value + 1 WHERE key = 'library_version'")
+            return removed
+
+    # Search index maintenance
+    @classmethod
+    def build_search_index(cls, batch_size=1000):
+        """Index the books that predate the search index, one batch at a time.
+
+        Each batch is committed with its progress, so an interrupted build
+        resumes where it stopped. Return the number of books indexed.
+        """
+        indexed = 0
+        while True:
+            with cls.get_connection() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute(
+                    """
+                    SELECT
+                        (SELECT value FROM meta WHERE key = 'search_backfill_progress'),
+                        (SELECT value FROM meta WHERE key = 'search_backfill_target')
+                """
+                )
+                progress, target = cursor.fetchone()
+                if progress >= target:
+                    return indexed
+
+                cursor.execute(
+                    """
+                    SELECT IFNULL(MAX(id), ?) FROM (
+                        SELECT id FROM books
+                        WHERE id > ? AND id <= ?
+                        ORDER BY id
+                        LIMIT ?
+                    )
+                """,
+                    (target, progress, target, batch_size),
+                )
+                upper = cursor.fetchone()[0]
+
+                cursor.execute(
+                    """
+                    INSERT INTO books_fts (rowid, title, author, series, publisher, collection)
+                    SELECT books.id,
+                           books.title,
+                           authors.author_first || ' ' || authors.author_last,
+                           books.series,
+                           books.publisher,
+                           books.collection
+                    FROM books
+                    LEFT JOIN authors ON books.author_id = authors.id
+                    WHERE books.id > ? AND books.id <= ?
+                    AND NOT EXISTS (SELECT 1 FROM books_fts WHERE rowid = books.id)
+                """,
+                    (progress, upper),
+                )
+                indexed += cursor.rowcount
+                cursor.execute(
+                    "UPDATE meta SET value = ? WHERE key = 'search_backfill_progress'",
+                    (upper,),
+                )
+
+    # Duplicate detection
+    @classmethod
+    def find_duplicates_of(cls, book, threshold, exclude_id=None):
+        """Retrieve the near-duplicates of a book, the most similar first.
+
+        Only the books sharing a MinHash bucket with it are compared.
+        """
+        pairs = buckets(book)
+        if not pairs:
+            return []
+        conditions = " OR ".join(["(band = ? AND bucket = ?)"] * len(pairs))
+        with cls.get_connection() as conn:
+            cursor = cls.book_cursor(conn)
+
+            cursor.execute(
+                f"""
+                SELECT {BOOK_COLUMNS}
+                FROM books
+                JOIN authors ON books.author_id = authors.id
+                LEFT JOIN read_status ON books.id = read_status.book_id
+                WHERE books.id IN (SELECT book_id FROM books_minhash WHERE {conditions})
+            """,
+                [value for pair in pairs for value in pair],
+            )
+            candidates = cursor.fetchall()
+
+        fingerprint = Fingerprint.of(book)
+        scored = [
+            (fingerprint.similarity(Fingerprint.of(candidate)), candidate)
+            for candidate in candidates
+            if candidate.id != exclude_id
+        ]
+        scored.sort(key=lambda item: (-item[0], item[1].id))
+        return [candidate for score, candidate in scored if score >= threshold]
+
+    @classmethod
+    def find_duplicates(cls, threshold, bucket_limit):
+        """Group the books of the library that are near-duplicates of each other.
+
+        Pairs of books sharing a MinHash bucket are compared, buckets shared by
+        more than `bucket_limit` books are skipped. Return the groups, the
+        closest first, each with its books and the highest similarity between
+        two of them.
+        """
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                SELECT group_concat(book_id) FROM books_minhash
+                GROUP BY band, bucket
+                HAVING COUNT(*) BETWEEN 2 AND ?
+            """,
+                (bucket_limit,),
+            )
+            pairs = set()
+            for (book_ids,) in cursor.fetchall():
+                pairs.update(combinations(sorted(map(int, book_ids.split(","))), 2))
+
+            cursor = cls.book_cursor(conn)
+            cursor.execute(
+                f"""
+                SELECT {BOOK_COLUMNS}
+                FROM books
+                JOIN authors ON books.author_id = authors.id
+                LEFT JOIN read_status ON books.id = read_status.book_id
+                WHERE books.id IN (SELECT value FROM json_each(?))
+            """,
+                (json.dumps(sorted({book_id for pair in pairs for book_id in pair})),),
+            )
+            books = {book.id: book for book in cursor.fetchall()}
+
+        fingerprints = {book_id: Fingerprint.of(book) for book_id, book in books.items()}
+        scores = {}
+        for a, b in pairs:
+            # A book deleted between the two queries is left out.
+            if a in books and b in books:
+                score = fingerprints[a].similarity(fingerprints[b])
+                if score >= threshold:
+                    scores[a, b] = score
+
+        groups = [sorted(book_ids) for book_ids in group_pairs(scores)]
+        best = [0.0] * len(groups)
+        group_of = {
+            book_id: index for index, book_ids in enumerate(groups) for book_id in book_ids
+        }
+        for (a, _), score in scores.items():
+            best[group_of[a]] = max(best[group_of[a]], score)
+
+        groups = [
+            {"books": [books[book_id] for book_id in book_ids], "similarity": round(score, 3)}
+            for book_ids, score in zip(groups, best)
+        ]
+        groups.sort(key=lambda group: (-group["similarity"], group["books"][0].id))
+        return groups
+
+    @classmethod
+    def build_duplicate_index(cls, batch_size=1000):
+        """Index the books that predate the duplicate index, one batch at a time.
+
+        Each batch is committed with its progress, so an interrupted build
+        resumes where it stopped. Return the number of books indexed.
+        """
+        indexed = 0
+        while True:
+            with cls.get_connection() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute(
+                    """
+                    SELECT
+                        (SELECT value FROM meta WHERE key = 'duplicate_backfill_progress'),
+                        (SELECT value FROM meta WHERE key = 'duplicate_backfill_target')
+                """
+                )
+                progress, target = cursor.fetchone()
+                if progress >= target:
+                    return indexed
+
+                books = cls.book_cursor(conn)
+                books.execute(
+                    f"""
+                    SELECT {BOOK_COLUMNS}
+                    FROM books
+                    JOIN authors ON books.author_id = authors.id
+                    LEFT JOIN read_status ON books.id = read_status.book_id
+                    WHERE books.id > ? AND books.id <= ?
+                    AND NOT EXISTS (SELECT 1 FROM books_minhash WHERE book_id = books.id)
+                    ORDER BY books.id
+                    LIMIT ?
+                """,
+                    (progress, target, batch_size),
+                )
+                batch = books.fetchall()
+
+                cursor.executemany(
+                    "INSERT INTO books_minhash (book_id, band, bucket) VALUES (?, ?, ?)",
+                    [(book.id, band, bucket) for book in batch for band, bucket in buckets(book)],
+                )
+                indexed += len(batch)
+                cursor.execute(
+                    "UPDATE meta SET value = ? WHERE key = 'duplicate_backfill_progress'",
+                    (batch[-1].id if len(batch) == batch_size else target,),
+                )
+
+    @classmethod
+    def _index_duplicates(cls, cursor, book_id, book):
+        """Replace the MinHash buckets of a written book."""
+        cursor.execute("DELETE FROM books_minhash WHERE book_id = ?", (book_id,))
+        cursor.executemany(
+            "INSERT INTO books_minhash (book_id, band, bucket) VALUES (?, ?, ?)",
+            [(book_id, band, bucket) for band, bucket in buckets(book)],
         )
-        return cursor.fetchone()[0]
 
+    # Author management helpers
     @classmethod
-    def _remove_unused_author(cls, cursor, book_id):
-        """Remove author if they have no other books."""
+    def sweep_authors(cls, author_ids=None):
+        """Delete the authors left without books, see `AuthorResolver.sweep`."""
+        with cls.get_connection() as conn:
+            return author_resolver.sweep(conn.cursor(), author_ids)
+
+    @classmethod
+    def _write_book(cls, cursor, sql, book, *params):
+        """Run an INSERT or UPDATE of the book columns, resolving the author first.
+
+        `sql` binds the book columns in table order, then `params`. A cached
+        author deleted by another process fails the foreign key, the author is
+        then resolved again.
+        """
+        for attempt in range(2):
+            author_id = author_resolver.resolve(cursor, book.author_last, book.author_first)
+            try:
+                cursor.execute(
+                    sql,
+                    (
+                        book.title,
+                        author_id,
+                        book.series,
+                        book.volume,
+                        book.year,
+                        book.language,
+                        book.genre,
+                        book.written_form,
+                        book.publisher,
+                        book.collection,
+                        book.isbn,
+                        *params,
+                    ),
+                )
+                return
+            except sqlite3.IntegrityError as e:
+                if attempt or "FOREIGN KEY" not in str(e):
+                    raise
+                author_resolver.forget(book.author_last, book.author_first)
+
+    @classmethod
+    def _find_author_id(cls, cursor, book_id):
+        """Return the author ID of a book, raise LookupError if there is no such book."""
         cursor.execute("SELECT author_id FROM books WHERE id = ?", (book_id,))
-        author_id = cursor.fetchone()[0]
-        cursor.execute(
-            """
-                DELETE FROM authors 
-                WHERE id = ?
-                AND (SELECT COUNT(*) FROM books WHERE author_id = ?) = 1;
-        """,
-            (author_id, author_id),
-        )
+        row = cursor.fetchone()
+        if row is None:
+            raise LookupError(f"No book with ID {book_id}")
+        return row[0]
 
 
-class BookForm(Form):
-    title = StringField("Title", [validators.DataRequired()])
-    author_last = StringField("Author Last Name", [validators.DataRequired()])
-    author_first = StringField("Author First Name", [validators.Optional()])
-    series = StringField("Series", [validators.Optional()])
-    volume = IntegerField(
-        "Volume",
-        [validators.Optional(), validators.NumberRange(min=0)],
-    )
-    year = IntegerField(
-        "Year",
-        [validators.Optional(), validators.NumberRange(min=1000, max=2100)],
-    )
-    language = StringField("Language", [validators.Optional()])
-    genre = StringField("Genre", [validators.Optional()])
-    written_form = StringField("Written Form", [validators.Optional()])
-    publisher = StringField("Publisher", [validators.Optional()])
-    collection = StringField("Collection", [validators.Optional()])
-    isbn = IntegerField("ISBN", [validators.Optional()])
-
-    def process(self, formdata=None, obj=None, data=None, **kwargs):
-        """Override the process method to clean input data."""
-        super().process(formdata, obj, data, **kwargs)
-
-        for field in (self.title, self.series):
-            if field.data:
-                field.data = field.data.strip()
-
-        for field in (self.author_last, self.author_first, self.language, self.genre):
-            if field.data:
-                field.data = field.data.strip().capitalize()
-
-
-@dataclass
+@dataclass(slots=True)
 class Book:
     title: str
     author_last: str
@@ -358,84 +745,105 @@ class Book:
     isbn: Optional[int] = None
 
     def __init__(self, **kwargs) -> None:
-        """Initialize a book with provided field values."""
-        for field_name in {f.name for f in fields(self)}:
-            if field_name in kwargs:
-                setattr(self, field_name, kwargs[field_name])
+        """Initialize a book with provided field values, the others are None."""
+        for field_name in BOOK_FIELD_NAMES:
+            setattr(self, field_name, kwargs.get(field_name))
 
     @classmethod
     def from_id(cls, book_id) -> Self:
         """Create a book instance from repository by ID."""
         try:
-            book_data = BookRepository.find_by_id(book_id)
-            return cls(**book_data)
+            if read_model.enabled:
+                record = read_model.find_by_id(book_id)
+            else:
+                record = BookRepository.find_by_id(book_id)
+            if record is None:
+                raise LookupError("no such book")
+            with timed("model"):
+                return cls.from_record(record)
         except Exception as e:
             raise RuntimeError(f"Failed to fetch book {book_id}: {e}")
 
+    @classmethod
+    def from_record(cls, record) -> Self:
+        """Create a book instance from a repository record."""
+        book = cls.__new__(cls)
+        for field_name in BOOK_FIELD_NAMES:
+            setattr(book, field_name, getattr(record, field_name))
+        return book
+
     @classmethod
     def from_isbn(cls, isbn) -> Self:
         """Create a book instance from Google Books API by ISBN."""
-        api_url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}"
-        response = requests.get(api_url)
-
         try:
-            data = response.json()
-            if "items" in data:
-                book_info = data["items"][0]["volumeInfo"]
-
-                authors = book_info.get("authors", [""])
-                author = authors[0].split(" ")
-                author_first = " ".join(author[:-1])
-                author_last = author[-1]
-
-                year = book_info.get("publishedDate", None)
-                if year:
-                    year = int(year[:4])
-                else:
-                    year = None
-
-                language_iso_639_1 = book_info.get("language", None)
-                iso_639_1_to_french = {
-                    "en": "Anglais",
-                    "es": "Espagnol",
-                    "fr": "Français",
-                    "de": "Allemand",
-                    "it": "Italien",
-                    "nl": "Néerlandais",
-                    "pt": "Portugais",
-                }
-                language = iso_639_1_to_french.get(
-                    language_iso_639_1, language_iso_639_1
-                )
-
-                industry_identifiers = book_info.get("industryIdentifiers", [])
-                for identifier in industry_identifiers:
-                    if identifier["type"] == "ISBN_13":
-                        isbn = identifier["identifier"]
-                        break
-                    elif identifier["type"] == "ISBN_10":
-                        isbn = identifier["identifier"]
-
-                return cls(
-                    title=book_info.get("title", ""),
-                    author_last=author_last,
-                    author_first=author_first,
-                    series=None,
-                    volume=None,
-                    year=year,
-                    language=language,
-                    genre=None,
-                    written_form=None,
-                    publisher=book_info.get("publisher", None),
-                    collection=None,
-                    isbn=isbn,
-                )
+            volume = isbn_lookup.get_volume(isbn)
+            if volume is not None:
+                return cls.from_volume(volume, isbn)
         except Exception as e:
             raise RuntimeError(f"Failed to fetch book isbn: {isbn}: {e}")
+        raise RuntimeError(f"No book found for isbn: {isbn}")
+
+    @classmethod
+    def from_isbns(cls, isbns) -> list[tuple[Optional[Self], Optional[Exception]]]:
+        """Create book instances from many ISBNs, looked up concurrently."""
+        return isbn_lookup.map_concurrently(cls.from_isbn, isbns)
+
+    @classmethod
+    def from_volume(cls, volume, isbn=None) -> Self:
+        """Create a book instance from a Google Books volume."""
+        book_info = volume["volumeInfo"]
+
+        authors = book_info.get("authors", [""])
+        author = authors[0].split(" ")
+        author_first = " ".join(author[:-1])
+        author_last = author[-1]
+
+        year = book_info.get("publishedDate", None)
+        if year:
+            year = int(year[:4])
+        else:
+            year = None
+
+        language_iso_639_1 = book_info.get("language", None)
+        iso_639_1_to_french = {
+            "en": "Anglais",
+            "es": "Espagnol",
+            "fr": "Français",
+            "de": "Allemand",
+            "it": "Italien",
+            "nl": "Néerlandais",
+            "pt": "Portugais",
+        }
+        language = iso_639_1_to_french.get(language_iso_639_1, language_iso_639_1)
+
+        industry_identifiers = book_info.get("industryIdentifiers", [])
+        for identifier in industry_identifiers:
+            if identifier["type"] == "ISBN_13":
+                isbn = identifier["identifier"]
+                break
+            elif identifier["type"] == "ISBN_10":
+                isbn = identifier["identifier"]
+
+        return cls(
+            title=book_info.get("title", ""),
+            author_last=author_last,
+            author_first=author_first,
+            series=None,
+            volume=None,
+            year=year,
+            language=language,
+            genre=None,
+            written_form=None,
+            publisher=book_info.get("publisher", None),
+            collection=None,
+            isbn=isbn,
+        )
 
     @classmethod
     def from_form(cls, form_data) -> Self:
         """Create a book instance from form data with validation."""
+        from .forms import BookForm
+
         form = BookForm(form_data)
         if not form.validate():
             raise ValueError(f"Invalid form data: {form.errors}")
@@ -443,7 +851,8 @@ class Book:
 
     def to_dict(self) -> dict:
         """Convert a book instance to dictionary."""
-        return asdict(self)
+        with timed("model"):
+            return {field_name: getattr(self, field_name) for field_name in BOOK_FIELD_NAMES}
 
     def create(self) -> int:
         """Save a book in the repository."""
@@ -460,13 +869,88 @@ class Book:
             raise RuntimeError(f"Failed to update book {book_id}: {e}")
 
     @staticmethod
-    def get_all() -> list[dict]:
-        """Retrieve all books from repository."""
+    def get_all() -> list[BookRecord]:
+        """Retrieve all books from the read model or repository."""
         try:
+            if read_model.enabled:
+                return read_model.find_all()
             return BookRepository.find_all()
         except Exception as e:
             raise RuntimeError(f"Failed to fetch books: {e}")
 
+    @staticmethod
+    def get_page(
+        limit, cursor=None, book_filter=None, sort=DEFAULT_SORT
+    ) -> tuple[list[BookRecord], Optional[str]]:
+        """Retrieve a page of books matching a filter and the cursor of the next page."""
+        after = decode_cursor(cursor, sort) if cursor else None
+        try:
+            if read_model.enabled and not book_filter and sort == DEFAULT_SORT:
+                books, next_key = read_model.find_page(limit, after)
+            else:
+                books, next_key = BookRepository.find_page(limit, after, book_filter, sort)
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch books: {e}")
+        return books, encode_cursor(next_key) if next_key else None
+
+    @staticmethod
+    def get_facets(book_filter, limit) -> dict:
+        """Retrieve the facet counts of the books matching a filter."""
+        try:
+            return BookRepository.find_facets(book_filter, limit)
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch facets: {e}")
+
+    @staticmethod
+    def search(text, limit) -> list[BookRecord]:
+        """Retrieve the books best matching free text, best match first."""
+        query = fts_query(text)
+        if not query:
+            return []
+        try:
+            return BookRepository.search(query, limit)
+        except Exception as e:
+            raise RuntimeError(f"Failed to search books: {e}")
+
+    def find_duplicates(self, threshold) -> list[BookRecord]:
+        """Retrieve the books this one would duplicate, the most similar first."""
+        try:
+            return BookRepository.find_duplicates_of(self, threshold)
+        except Exception as e:
+            raise RuntimeError(f"Failed to check for duplicates: {e}")
+
+    @staticmethod
+    def get_duplicates(threshold, bucket_limit) -> list[dict]:
+        """Retrieve the groups of near-duplicate books of the library."""
+        try:
+            return BookRepository.find_duplicates(threshold, bucket_limit)
+        except Exception as e:
+            raise RuntimeError(f"Failed to find duplicates: {e}")
+
+    @staticmethod
+    def get_version() -> int:
+        """Retrieve the library version from repository."""
+        try:
+            return BookRepository.get_version()
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch library version: {e}")
+
+    @staticmethod
+    def get_change_seq() -> int:
+        """Retrieve the sequence number of the latest change from repository."""
+        try:
+            return BookRepository.get_change_seq()
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch change sequence: {e}")
+
+    @staticmethod
+    def get_changes(since, limit) -> Optional[dict]:
+        """Retrieve the changes after a sequence number, None if a resync is needed."""
+        try:
+            return BookRepository.find_changes(since, limit)
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch changes: {e}")
+
     @staticmethod
     def delete(book_id) -> None:
         """Remove a book from repository by ID."""
@@ -475,6 +959,11 @@ class Book:
         except Exception as e:
             raise RuntimeError(f"Failed to delete book {book_id}: {e}")
 
+    @staticmethod
+    def run_batch(operations, atomic=True) -> list[tuple]:
+        """Apply write operations in a single transaction, see `BookRepository.run_batch`."""
+        return BookRepository.run_batch(operations, atomic)
+
     @staticmethod
     def update_status(book_id, status) -> None:
         """Update a book's status in repository."""
@@ -482,3 +971,6 @@ class Book:
             BookRepository.update_reading_status(book_id, status)
         except Exception as e:
             raise RuntimeError(f"Failed to update status of book {book_id}: {e}")
+
+
+BOOK_FIELD_NAMES = tuple(f.name for f in fields(Book))
@@ -0,0 +1,259 @@
+from dataclasses import dataclass, fields
+from typing import Optional, Self
+
+from .records import BOOK_COLUMNS
+
+STATUSES = ("not_read", "reading", "read")
+
+# Year bounds of a range filter given with a single bound.
+MIN_YEAR = 0
+MAX_YEAR = 9999
+
+
+@dataclass(frozen=True)
+class ListingSort:
+    """A listing order, resumable from the key of the last book of a page.
+
+    `columns` are SQL expressions ending with `books.id`, `key_fields` the book
+    record fields they are computed from and `key_types` the types of the key
+    values.
+    """
+
+    name: str
+    columns: tuple[str, ...]
+    key_fields: tuple[str, ...]
+    key_types: tuple[type, ...]
+    descending: bool = False
+
+    def order_by(self) -> str:
+        direction = " DESC" if self.descending else ""
+        return ", ".join(f"{column}{direction}" for column in self.columns)
+
+    def after(self) -> str:
+        """Return the condition selecting the books following a key."""
+        placeholders = ", ".join("?" * len(self.columns))
+        operator = "<" if self.descending else ">"
+        return f"({', '.join(self.columns)}) {operator} ({placeholders})"
+
+    def key(self, book) -> tuple:
+        """Return the key of a book record in this order."""
+        # Only the year can be missing, it sorts as -1.
+        values = [getattr(book, name) for name in self.key_fields]
+        return tuple(-1 if value is None else value for value in values)
+
+    def parse_key(self, values) -> tuple:
+        """Validate a key decoded from a cursor."""
+        if len(values) != len(self.key_types):
+            raise ValueError("cursor does not match the sort order")
+        for value, key_type in zip(values, self.key_types):
+            if not isinstance(value, key_type) or isinstance(value, bool):
+                raise ValueError("cursor does not match the sort order")
+        return tuple(values)
+
+
+_SORT_COLUMNS = {
+    "author": (
+        ("authors.author_last", "authors.author_first", "IFNULL(books.year, -1)", "books.id"),
+        ("author_last", "author_first", "year", "id"),
+        (str, str, int, int),
+    ),
+    "title": (("books.title COLLATE NOCASE", "books.id"), ("title", "id"), (str, int)),
+    "year": (("IFNULL(books.year, -1)", "books.id"), ("year", "id"), (int, int)),
+    "added": (("books.id",), ("id",), (int,)),
+}
+
+# Listing orders by name, a leading "-" reverses the order.
+SORTS = {
+    prefix + name: ListingSort(prefix + name, *definition, descending=bool(prefix))
+    for name, definition in _SORT_COLUMNS.items()
+    for prefix in ("", "-")
+}
+DEFAULT_SORT = SORTS["author"]
+
+
+@dataclass(frozen=True)
+class BookFilter:
+    """Facet filters of the book listing, values of a dimension are ORed.
+
+    An empty string stands for a missing genre, language, written form or
+    publisher.
+    """
+
+    status: tuple[str, ...] = ()
+    genre: tuple[str, ...] = ()
+    language: tuple[str, ...] = ()
+    written_form: tuple[str, ...] = ()
+    publisher: tuple[str, ...] = ()
+    author: tuple[int, ...] = ()
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+
+    @classmethod
+    def from_args(cls, args) -> Self:
+        """Build a filter from query string arguments, raise ValueError if invalid."""
+        status = tuple(args.getlist("status"))
+        for value in status:
+            if value not in STATUSES:
+                raise ValueError(f"Invalid status: {value}")
+        try:
+            author = tuple(int(value) for value in args.getlist("author"))
+            year_min = args.get("year_min", type=int, default=None)
+            year_max = args.get("year_max", type=int, default=None)
+            if ("year_min" in args and year_min is None) or (
+                "year_max" in args and year_max is None
+            ):
+                raise ValueError
+        except ValueError:
+            raise ValueError("Authors and years must be integers")
+
+        return cls(
+            status=status,
+            genre=tuple(args.getlist("genre")),
+            language=tuple(args.getlist("language")),
+            written_form=tuple(args.getlist("written_form")),
+            publisher=tuple(args.getlist("publisher")),
+            author=author,
+            year_min=year_min,
+            year_max=year_max,
+        )
+
+    def __bool__(self) -> bool:
+        return any(getattr(self, f.name) not in ((), None) for f in fields(self))
+
+    def where(self, exclude=None) -> tuple[str, list]:
+        """Return the SQL condition and parameters of the filter.
+
+        The condition applies to `books`, `exclude` names a facet dimension to
+        leave out, to count the other values of that dimension.
+        """
+        conditions = []
+        params = []
+
+        if self.status and exclude != "status":
+            # Every book has a status row, see migration 0006.
+            conditions.append(
+                "books.id IN (SELECT book_id FROM read_status WHERE status IN (%s))"
+                % ", ".join("?" * len(self.status))
+            )
+            params += self.status
+
+        for dimension in ("genre", "language", "written_form", "publisher"):
+            values = getattr(self, dimension)
+            if not values or exclude == dimension:
+                continue
+            present = [value for value in values if value != ""]
+            parts = []
+            if present:
+                parts.append(f"books.{dimension} IN ({', '.join('?' * len(present))})")
+                params += present
+            if len(present) < len(values):
+                parts.append(f"books.{dimension} IS NULL")
+            conditions.append(f"({' OR '.join(parts)})")
+
+        if self.author and exclude != "author":
+            conditions.append(f"books.author_id IN ({', '.join('?' * len(self.author))})")
+            params += self.author
+
+        if (self.year_min is not None or self.year_max is not None) and exclude != "decade":
+            # Matches the expression index, a missing year is -1 and never in range.
+            conditions.append("IFNULL(books.year, -1) BETWEEN ? AND ?")
+            params += [
+                self.year_min if self.year_min is not None else MIN_YEAR,
+                self.year_max if self.year_max is not None else MAX_YEAR,
+            ]
+
+        return " AND ".join(conditions) or "1", params
+
+    def dimensions(self) -> set[str]:
+        """Return the facet dimensions this filter restricts."""
+        names = {
+            name
+            for name in ("status", "genre", "language", "written_form", "publisher", "author")
+            if getattr(self, name)
+        }
+        if self.year_min is not None or self.year_max is not None:
+            names.add("decade")
+        return names
+
+
+# Facet dimensions and the SQL expression grouping books by their value.
+FACETS = {
+    "status": "IFNULL(read_status.status, 'not_read')",
+    "genre": "books.genre",
+    "language": "books.language",
+    "written_form": "books.written_form",
+    "publisher": "books.publisher",
+    "author": "books.author_id",
+    "decade": "books.year / 10 * 10",
+}
+
+
+def page_query(book_filter, sort, after, limit) -> tuple[str, list]:
+    """Return the SQL and parameters of a listing page, following the `after` key."""
+    where, params = book_filter.where()
+    if after is not None:
+        where = f"{where} AND {sort.after()}"
+        params += after
+    sql = f"""
+        SELECT {BOOK_COLUMNS}
+        FROM books
+        JOIN authors ON books.author_id = authors.id
+        LEFT JOIN read_status ON books.id = read_status.book_id
+        WHERE {where}
+        ORDER BY {sort.order_by()}
+        LIMIT ?
+    """
+    return sql, [*params, limit]
+
+
+def facet_query(dimension, book_filter, limit) -> tuple[str, list]:
+    """Return the SQL and parameters counting the books per value of a dimension.
+
+    Rows are `(value, count)`, the most frequent value first, or the earliest
+    for decades. They are `(author_id, label, count)` for the author.
+    """
+    where, params = book_filter.where(exclude=dimension)
+    if dimension == "author":
+        sql = f"""
+            SELECT authors.id, authors.author_first || ' ' || authors.author_last, counts.n
+            FROM (
+                SELECT books.author_id, COUNT(*) AS n
+                FROM books
+                WHERE {where}
+                GROUP BY books.author_id
+                ORDER BY n DESC, books.author_id
+                LIMIT ?
+            ) AS counts
+            JOIN authors ON counts.author_id = authors.id
+            ORDER BY counts.n DESC, authors.author_last, authors.author_first
+        """
+        return sql, [*params, limit]
+
+    if dimension == "decade":
+        # Years are counted from the year index first, a missing year is -1.
+        sql = f"""
+            SELECT CASE WHEN year < 0 THEN NULL ELSE year / 10 * 10 END, SUM(n)
+            FROM (
+                SELECT IFNULL(books.year, -1) AS year, COUNT(*) AS n
+                FROM books
+                WHERE {where}
+                GROUP BY 1
+            )
+            GROUP BY 1
+            ORDER BY 1
+            LIMIT ?
+        """
+        return sql, [*params, limit]
+
+    join = ""
+    if dimension == "status":
+        join = "LEFT JOIN read_status ON books.id = read_status.book_id"
+    sql = f"""
+        SELECT {FACETS[dimension]}, COUNT(*)
+        FROM books {join}
+        WHERE {where}
+        GROUP BY 1
+        ORDER BY 2 DESC, 1
+        LIMIT ?
+    """
+    return sql, [*params, limit]
@@ -0,0 +1,275 @@
+import threading
+from bisect import bisect_right, insort
+
+from .authors import nocase
+from .db import pool
+from .queries import DEFAULT_SORT
+
+# Change log entries read per query while catching up.
+CATCH_UP_BATCH_SIZE = 1000
+
+
+def listing_key(book) -> tuple:
+    """Return the listing sort key of a book, folded like SQLite's NOCASE collation."""
+    year = book.year if book.year is not None else -1
+    return nocase(book.author_last), nocase(book.author_first), year, book.id
+
+
+class ReadModel:
+    """In-process copy of the library serving the listing and single book reads.
+
+    Books are kept by ID and in a sorted index in listing order. The model is
+    tagged with the library version and change log sequence it reflects: each
+    read checks the version against the database, and catches up from the
+    change log when another process wrote. Writes of this process are applied
+    in place as their transaction commits, see `stage`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """Drop the loaded books, the next read loads them again."""
+        with self._lock:
+            self._books = {}
+            self._keys = []
+            self.version = None
+            self.seq = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.seq is not None
+
+    # Reads
+
+    def find_all(self) -> list:
+        """Retrieve all books in listing order."""
+        with self._lock:
+            self.sync()
+            books = self._books
+            return [books[key[-1]] for key in self._keys]
+
+    def find_page(self, limit, after=None) -> tuple:
+        """Retrieve up to `limit` books following the `after` sort key.
+
+        Behave like `BookRepository.find_page`, the key returned is unfolded.
+        """
+        with self._lock:
+            self.sync()
+            start = 0
+            if after is not None:
+                author_last, author_first, year, book_id = after
+                start = bisect_right(
+                    self._keys, (nocase(author_last), nocase(author_first), year, book_id)
+                )
+            keys = self._keys[start : start + limit + 1]
+            books = [self._books[key[-1]] for key in keys]
+
+        if len(books) <= limit:
+            return books, None
+        books = books[:limit]
+        return books, DEFAULT_SORT.key(books[-1])
+
+    def find_by_id(self, book_id):
+        """Retrieve a single book by its ID, or None."""
+        with self._lock:
+            self.sync()
+            return self._books.get(int(book_id))
+
+    # Synchronization
+
+    def sync(self) -> None:
+        """Load the books, or catch up with the writes of other processes."""
+        from .models import BookRepository
+
+        with self._lock:
+            version = BookRepository.get_version()
+            if version == self.version:
+                return
+            if not self.loaded or not self._catch_up():
+                self._load()
+            # The version is read first, the books now reflect at least it.
+            self.version = version
+
+    def _load(self) -> None:
+        from .models import BookRepository
+
+        # The sequence is read first, no later change can be missed.
+        seq = BookRepository.get_change_seq()
+        self._books = {book.id: book for book in BookRepository.iter_all()}
+        self._keys = sorted(listing_key(book) for book in self._books.values())
+        self.seq = seq
+
+    def _catch_up(self) -> bool:
+        """Apply the logged changes, return False if a full load is cheaper or required."""
+        from .models import BookRepository
+
+        if BookRepository.get_change_seq() - self.seq > len(self._books):
+            return False
+        while True:
+            changes = BookRepository.find_changes(self.seq, CATCH_UP_BATCH_SIZE)
+            if changes is None:
+                return False
+            for book in changes["books"]:
+                self._put(book.id, book)
+            for book_id in changes["deleted"]:
+                self._put(book_id, None)
+            self.seq = changes["seq"]
+            if not changes["more"]:
+                return True
+
+    def _put(self, book_id, book) -> None:
+        """Replace a book in place, None removes it."""
+        previous = self._books.pop(book_id, None)
+        if previous is not None:
+            key = listing_key(previous)
+            del self._keys[bisect_right(self._keys, key) - 1]
+        if book is not None:
+            self._books[book_id] = book
+            insort(self._keys, listing_key(book))
+
+    # Write-through
+
+    def stage(self, conn, book_id) -> None:
+        """Record the state of a book written in the current transaction.
+
+        Called by the write paths of `BookRepository` once the book is written,
+        inside their transaction. Staged books are applied when the transaction
+        commits and dropped if it rolls back. When no other process wrote since
+        the model was last synchronized, the model also moves to the version
+        of the commit and needs no catch-up on the next read.
+        """
+        if not self.enabled or not self.loaded:
+            return
+        from .models import BookRepository
+
+        local = self._local
+        if getattr(local, "staged", None) is None:
+            local.staged = {}
+            local.base_seq = self.seq
+        local.staged[int(book_id)] = BookRepository.find_by_id(book_id)
+
+        cursor = conn.cursor()
+        placeholders = ", ".join("?" * len(local.staged))
+        cursor.execute(
+            f"""
+            SELECT
+                (SELECT value FROM meta WHERE key = 'library_version'),
+                (SELECT IFNULL(MAX(seq), 0) FROM books_changes),
+                EXISTS (
+                    SELECT 1 FROM books_changes
+                    WHERE seq > ? AND book_id NOT IN ({placeholders})
+                )
+        """,
+            (local.base_seq, *local.staged),
+        )
+        version, seq, foreign = cursor.fetchone()
+        local.target = None if foreign else (version, seq)
+
+    def discard(self, conn=None) -> None:
+        """Drop the books staged in the current transaction."""
+        self._local.staged = None
+
+    def apply(self, conn=None) -> None:
+        """Apply the books staged in the transaction that just committed."""
+        local = self._local
+        staged, local.staged = getattr(local, "staged", None), None
+        if not staged:
+            return
+        with self._lock:
+            if self.seq != local.base_seq:
+                # The model moved meanwhile, the change log has the right order.
+                self.version = None
+                return
+            for book_id, book in staged.items():
+                self._put(book_id, book)
+            if local.target is not None:
+                self.version, self.seq = local.target
+
+    # Consistency
+
+    def check(self) -> list[dict]:
+        """Compare the model with the database and return the differences."""
+        from .models import BookRepository
+
+        with self._lock:
+            self.sync()
+            differences = []
+            books = list(BookRepository.iter_all())
+            stored = {book.id: book for book in books}
+
+            for book_id in self._books.keys() - stored.keys():
+                differences.append({"id": book_id, "problem": "not in the database"})
+            for book_id, book in stored.items():
+                if book_id not in self._books:
+                    differences.append({"id": book_id, "problem": "missing"})
+                elif self._books[book_id] != book:
+                    differences.append({"id": book_id, "problem": "outdated"})
+
+            if not differences:
+                model_order = [key[-1] for key in self._keys]
+                for position, (book, book_id) in enumerate(zip(books, model_order)):
+                    if book.id != book_id:
+                        differences.append(
+                            {"id": book_id, "problem": f"out of order at position {position}"}
+                        )
+                        break
+            return differences
+
+
+class LibraryReadModels:
+    """The read model of each library, kept and dropped with its pool.
+
+    Reads and write-through calls go to the model of the current library.
+    """
+
+    def __init__(self):
+        self.enabled = False
+
+    def current(self) -> ReadModel:
+        """Return the read model of the current library."""
+        state = pool.state
+        if "read_model" not in state:
+            model = ReadModel()
+            model.enabled = self.enabled
+            state.setdefault("read_model", model)
+        return state["read_model"]
+
+    def reset(self):
+        self.current().reset()
+
+    def find_all(self) -> list:
+        return self.current().find_all()
+
+    def find_page(self, limit, after=None) -> tuple:
+        return self.current().find_page(limit, after)
+
+    def find_by_id(self, book_id):
+        return self.current().find_by_id(book_id)
+
+    def stage(self, conn, book_id) -> None:
+        if self.enabled:
+            self.current().stage(conn, book_id)
+
+    def discard(self, conn=None) -> None:
+        self.current().discard(conn)
+
+    def apply(self, conn=None) -> None:
+        self.current().apply(conn)
+
+    def check(self) -> list[dict]:
+        return self.current().check()
+
+
+read_model = LibraryReadModels()
+
+
+def init_app(app):
+    """Enable the read model from the application config."""
+    read_model.enabled = app.config["READ_MODEL_ENABLED"]
+    if read_model.enabled:
+        pool.commit_hooks.append(read_model.apply)
+        pool.rollback_hooks.append(read_model.discard)
@@ -0,0 +1,174 @@
+import json
+from collections import namedtuple
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+# Columns of a book row, in the order selected by `BOOK_COLUMNS`.
+BOOK_FIELDS = (
+    "id",
+    "title",
+    "author_id",
+    "series",
+    "volume",
+    "year",
+    "language",
+    "genre",
+    "written_form",
+    "publisher",
+    "collection",
+    "isbn",
+    "author_first",
+    "author_last",
+    "status",
+)
+
+# Select list of a book row, to be used with `books`, `authors` and a LEFT JOIN
+# on `read_status`.
+BOOK_COLUMNS = """
+    books.id,
+    books.title,
+    books.author_id,
+    books.series,
+    books.volume,
+    books.year,
+    books.language,
+    books.genre,
+    books.written_form,
+    books.publisher,
+    books.collection,
+    books.isbn,
+    authors.author_first,
+    authors.author_last,
+    read_status.status
+"""
+
+_JSON_TEMPLATE = "{" + ",".join(f'"{name}":%s' for name in BOOK_FIELDS) + "}"
+
+
+class BookRecord(namedtuple("BookRecord", BOOK_FIELDS)):
+    """A book row read from the repository.
+
+    Records are plain tuples with named fields: they hold no per-row dict and
+    serialize to JSON without building one.
+    """
+
+    __slots__ = ()
+
+    def to_json(self, ensure_ascii=True) -> str:
+        """Serialize the record as a JSON object."""
+        return records_json([self], ensure_ascii)[0]
+
+
+_new_record = tuple.__new__
+
+
+def book_row(cursor, row) -> BookRecord:
+    """Row factory building a `BookRecord` from a `BOOK_COLUMNS` row."""
+    return _new_record(BookRecord, row)
+
+
+def records_json(records, ensure_ascii=True) -> list[str]:
+    """Serialize book records as JSON objects, one string per record.
+
+    Values are encoded a column at a time, SQLite only returning integers,
+    floats, strings and None for book columns.
+    """
+    encode_string = encode_basestring_ascii if ensure_ascii else encode_basestring
+    columns = [
+        [
+            encode_string(value) if value.__class__ is str
+            else "null" if value is None
+            else repr(value)
+            for value in column
+        ]
+        for column in zip(*records)
+    ]
+    return [_JSON_TEMPLATE % row for row in zip(*columns)]
+
+
+# Columns of the compact listing whose values are replaced by their index in a
+# dictionary of the distinct values of the column.
+DICTIONARY_FIELDS = (
+    "series",
+    "language",
+    "genre",
+    "written_form",
+    "publisher",
+    "collection",
+    "status",
+)
+
+
+def records_columns(records) -> dict:
+    """Encode book records as columns, the compact listing format.
+
+    Return the number of records, their `columns` but for the author names and
+    those only holding null, the `dictionaries` of the `DICTIONARY_FIELDS`
+    columns, which hold indexes in them, and the names of the `authors`
+    referenced by the `author_id` column, as columns too.
+    """
+    columns = dict(zip(BOOK_FIELDS, map(list, zip(*records))))
+    names = zip(columns.pop("author_first", ()), columns.pop("author_last", ()))
+    authors = dict(zip(columns.get("author_id", ()), names))
+
+    for name, column in list(columns.items()):
+        if column.count(None) == len(column):
+            del columns[name]
+
+    dictionaries = {}
+    for name in DICTIONARY_FIELDS:
+        if name in columns:
+            index = {}
+            columns[name] = [index.setdefault(value, len(index)) for value in columns[name]]
+            dictionaries[name] = list(index)
+
+    first_names, last_names = zip(*authors.values()) if authors else ((), ())
+    return {
+        "count": len(records),
+        "columns": columns,
+        "dictionaries": dictionaries,
+        "authors": {
+            "id": list(authors),
+            "author_first": list(first_names),
+            "author_last": list(last_names),
+        },
+    }
+
+
+def _holds_records(obj) -> bool:
+    return any(
+        isinstance(value, BookRecord)
+        or (isinstance(value, list) and value and isinstance(value[0], BookRecord))
+        for value in obj.values()
+    )
+
+
+def dumps(obj, default=json.dumps) -> str:
+    """Serialize `obj` to JSON, writing lists of book records directly.
+
+    Dicts, and lists of dicts whose first item holds records, are walked to find
+    the lists of records, any other value is handed to `default`.
+    """
+    if isinstance(obj, dict):
+        return "{%s}" % ",".join(
+            [
+                f"{encode_basestring_ascii(str(key))}:{dumps(value, default)}"
+                for key, value in obj.items()
+            ]
+        )
+    if isinstance(obj, list) and obj and isinstance(obj[0], BookRecord):
+        return "[%s]" % ",".join(records_json(obj))
+    if isinstance(obj, list) and obj and isinstance(obj[0], dict) and _holds_records(obj[0]):
+        return "[%s]" % ",".join([dumps(value, default) for value in obj])
+    if isinstance(obj, BookRecord):
+        return obj.to_json()
+    return default(obj)
+
+
+def htmlsafe(text) -> str:
+    """Escape JSON text for embedding in HTML, like Jinja's `tojson` filter."""
+    return (
+        text.replace("<", "\\u003c")
+        .replace(">", "\\u003e")
+        .replace("&", "\\u0026")
+        .replace("'", "\\u0027")
+    )
@@ -1,9 +1,51 @@
+from functools import partial, wraps
+from hashlib import sha1
 from http import HTTPStatus
+from io import TextIOWrapper
 
-from flask import Response, current_app, jsonify
-from flask import render_template, request
+from flask import Response, current_app
+from flask import g, render_template, request
+from werkzeug.datastructures import MultiDict
 
-from .models import Book
+from .db import LIBRARY_NAME, current_library, pool
+from .exporter import export_csv, export_ndjson, gzip_stream
+from .importer import BulkImporter
+from .isbn import isbn_lookup
+from .metrics import render as render_metrics
+from .metrics import timed
+from .models import Book, BookRepository
+from .queries import DEFAULT_SORT, SORTS, BookFilter
+from .records import dumps, htmlsafe, records_columns
+from .stats import StatsRepository
+
+# Media type asking for the compact book listing.
+COMPACT_MIMETYPE = "application/vnd.booktracker.compact+json"
+
+
+def etag_from_library_version(view):
+    """Tag responses with the library version and answer If-None-Match with 304.
+
+    The tag also covers the library, the request path and query string and the
+    Accept header, so that each page or book in each format has its own. A
+    matching tag is answered before the view queries books.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        accept = request.headers.get("Accept", "")
+        variant = sha1(f"{pool.library}:{request.full_path}:{accept}".encode()).hexdigest()[:16]
+        etag = f"{Book.get_version()}-{variant}"
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=HTTPStatus.NOT_MODIFIED)
+        else:
+            response = current_app.make_response(view(*args, **kwargs))
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        response.vary.add("Accept")
+        return response
+
+    return wrapper
 
 
 # View Routes
@@ -11,11 +53,22 @@ from .models import Book
 
 @current_app.route("/", methods=["GET"])
 @current_app.route("/index", methods=["GET"])
+@etag_from_library_version
 def index() -> str:
     """Render the main library page."""
     try:
-        books = Book.get_all()
-        return render_template("library.html", books=books)
+        # Read the change sequence first so that no later change can be missed.
+        changes_seq = Book.get_change_seq()
+        books, next_cursor = Book.get_page(current_app.config["BOOKS_PAGE_SIZE"])
+        facets = Book.get_facets(BookFilter(), current_app.config["FACET_LIMIT"])
+        with timed("template"):
+            return render_template(
+                "library.html",
+                books_json=htmlsafe(dumps(books)),
+                facets_json=htmlsafe(dumps(facets)),
+                next_cursor=next_cursor,
+                changes_seq=changes_seq,
+            )
     except Exception as e:
         raise RuntimeError(f"Failed to fetch books: {e}")
 
@@ -23,7 +76,12 @@ def index() -> str:
 @current_app.route("/stats", methods=["GET"])
 def stats() -> str:
     """Render the statistics page."""
-    return render_template("stats.html")
+    try:
+        summary = StatsRepository.summary()
+        with timed("template"):
+            return render_template("stats.html", stats=summary)
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch statistics: {e}")
 
 
 # API Routes (RESTful API)
@@ -59,14 +117,94 @@ def make_response(status, data=None, message=None, code=None):
     else:
         raise ValueError("Invalid status. Expected 'success', 'fail', or 'error'.")
 
-    return jsonify(response)
+    with timed("json"):
+        body = dumps(response, default=partial(current_app.json.dumps, separators=(",", ":")))
+    return current_app.response_class(f"{body}\n", mimetype="application/json")
+
+
+@current_app.before_request
+def select_library():
+    """Serve the library named by the `X-Library` header or the `library` cookie."""
+    library = request.headers.get("X-Library") or request.cookies.get("library")
+    if library is None:
+        return None
+    if not LIBRARY_NAME.fullmatch(library):
+        return make_response(
+            "fail",
+            data={"error": f"Invalid library: {library}"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+    g.library_token = current_library.set(library)
+    return None
+
+
+@current_app.teardown_request
+def release_library(exception=None):
+    token = g.pop("library_token", None)
+    if token is not None:
+        current_library.reset(token)
+
+
+def in_library(library, chunks):
+    """Yield from `chunks` with `library` selected.
+
+    A streamed body is read once the request is torn down, when the library of
+    the request is no longer selected.
+    """
+    chunks = iter(chunks)
+    while True:
+        token = current_library.set(library)
+        try:
+            chunk = next(chunks, None)
+        finally:
+            current_library.reset(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+@current_app.route("/metrics", methods=["GET"])
+def metrics() -> Response:
+    """Serve the latency histograms in the Prometheus text format."""
+    if not current_app.config["METRICS_ENABLED"]:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@current_app.route("/api/stats", methods=["GET"])
+def read_stats() -> Response:
+    """Get the library statistics."""
+    try:
+        return make_response(
+            "success",
+            data={"stats": StatsRepository.summary()},
+        )
+    except Exception as e:
+        return make_response(
+            "error",
+            message="Failed to retrieve statistics",
+            data={"error": str(e)},
+            code=HTTPStatus.INTERNAL_SERVER_ERROR,
+        )
 
 
 @current_app.route("/api/books", methods=["POST"])
 def create_book() -> Response:
-    """Create a new book."""
+    """Create a new book.
+
+    A book that looks like one of the library is refused with its
+    near-duplicates, unless `allow_duplicate` is set.
+    """
     try:
         book = Book.from_form(request.form)
+        if not request.form.get("allow_duplicate"):
+            duplicates = book.find_duplicates(current_app.config["DUPLICATE_THRESHOLD"])
+            if duplicates:
+                return make_response(
+                    "fail",
+                    data={"error": "Possible duplicate book", "duplicates": duplicates},
+                    code=HTTPStatus.CONFLICT,
+                )
         book_id = book.create()
         data = book.to_dict() | {"id": book_id}
         return make_response(
@@ -82,11 +220,200 @@ def create_book() -> Response:
         )
 
 
+@current_app.route("/api/books/import", methods=["POST"])
+def import_books() -> Response:
+    """Bulk import books from an uploaded CSV export."""
+    upload = request.files.get("file")
+    if upload is None:
+        return make_response(
+            "fail",
+            data={"error": "A CSV file is required"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+
+    try:
+        importer = BulkImporter(
+            batch_size=current_app.config["IMPORT_BATCH_SIZE"],
+            chunk_size=current_app.config["IMPORT_CHUNK_SIZE"],
+        )
+        report = importer.run(TextIOWrapper(upload.stream, encoding="utf-8", newline=""))
+        return make_response(
+            "success",
+            data={"message": str(report), "report": report.to_dict()},
+        )
+    except Exception as e:
+        return make_response(
+            "error",
+            message="Failed to import books",
+            data={"error": str(e)},
+            code=HTTPStatus.INTERNAL_SERVER_ERROR,
+        )
+
+
+def run_batch(key, prepare) -> Response:
+    """Validate the items under `key` with `prepare`, then apply them in one transaction.
+
+    `prepare` turns an item into a write operation and its result formatter, or
+    raises if the item is invalid. The request's `mode` is either `atomic`
+    (all-or-nothing, the default) or `best_effort`.
+    """
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = {}
+    if not isinstance(payload, dict):
+        return make_response(
+            "fail",
+            data={"error": "The request body must be a JSON object"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+    items = payload.get(key)
+    mode = payload.get("mode", "atomic")
+    if mode not in ("atomic", "best_effort"):
+        return make_response(
+            "fail",
+            data={"error": f"Unknown batch mode: {mode}"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+    if not isinstance(items, list) or not items:
+        return make_response(
+            "fail",
+            data={"error": "A non-empty list of items is required"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+    if len(items) > current_app.config["BATCH_MAX_SIZE"]:
+        return make_response(
+            "fail",
+            data={"error": f"At most {current_app.config['BATCH_MAX_SIZE']} items per batch"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+
+    results = [None] * len(items)
+    prepared = []
+    for index, item in enumerate(items):
+        try:
+            prepared.append((index, *prepare(item)))
+        except Exception as e:
+            results[index] = {"index": index, "status": "fail", "error": str(e)}
+
+    if mode == "atomic" and len(prepared) < len(items):
+        applied = []
+    else:
+        applied = Book.run_batch(
+            [operation for _, operation, _ in prepared], atomic=mode == "atomic"
+        )
+
+    for (index, _, format_result), (value, error) in zip(prepared, applied):
+        if error is None:
+            results[index] = {"index": index, "status": "success"} | format_result(value)
+        else:
+            results[index] = {"index": index, "status": "fail", "error": str(error)}
+
+    succeeded = all(result and result["status"] == "success" for result in results)
+    for index, result in enumerate(results):
+        if result is None or (mode == "atomic" and not succeeded and result["status"] == "success"):
+            results[index] = {"index": index, "status": "rolled_back"}
+
+    return make_response(
+        "success",
+        data={"mode": mode, "committed": mode != "atomic" or succeeded, "results": results},
+    )
+
+
+@current_app.route("/api/books/batch", methods=["POST"])
+def write_books() -> Response:
+    """Create books, or update those given with an `id`, in one transaction."""
+
+    def prepare(item):
+        if not isinstance(item, dict):
+            raise ValueError("Each item must be an object")
+        form_data = MultiDict(
+            {key: str(value) for key, value in item.items() if value is not None}
+        )
+        book = Book.from_form(form_data)
+        book_id = item.get("id")
+        if book_id is None:
+            return book.create, lambda new_id: {"book": book.to_dict() | {"id": new_id}}
+        return partial(book.update, book_id), lambda _: {"book": book.to_dict() | {"id": book_id}}
+
+    return run_batch("books", prepare)
+
+
+@current_app.route("/api/books/status/batch", methods=["PATCH"])
+def update_book_statuses() -> Response:
+    """Update the status of many books in one transaction."""
+
+    def prepare(item):
+        if not isinstance(item, dict) or "id" not in item:
+            raise ValueError("Each item must be an object with an 'id'")
+        if item.get("status") not in ("not_read", "reading", "read"):
+            raise ValueError(f"Invalid status: {item.get('status')}")
+        return (
+            partial(Book.update_status, item["id"], item["status"]),
+            lambda _: {"id": item["id"], "book_status": item["status"]},
+        )
+
+    return run_batch("statuses", prepare)
+
+
+def listing_format() -> str:
+    """Return the format of the book listing asked by `format` or the Accept header."""
+    name = request.args.get("format")
+    if name is None:
+        return "compact" if request.accept_mimetypes.best == COMPACT_MIMETYPE else "json"
+    if name not in ("json", "compact"):
+        raise ValueError(f"Invalid format: {name}")
+    return name
+
+
 @current_app.route("/api/books", methods=["GET"])
+@etag_from_library_version
 def read_books() -> Response:
-    """Get all books."""
+    """Get a filtered and sorted page of books, resuming after the `after` cursor.
+
+    The first page also carries the facet counts of the filter. In the compact
+    format, books are encoded as columns, see `records_columns`.
+    """
+    limit = request.args.get(
+        "limit", current_app.config["BOOKS_PAGE_SIZE"], type=int
+    )
+    limit = max(1, min(limit, current_app.config["BOOKS_MAX_PAGE_SIZE"]))
+    cursor = request.args.get("after")
+    try:
+        book_filter = BookFilter.from_args(request.args)
+        sort_name = request.args.get("sort", DEFAULT_SORT.name)
+        if sort_name not in SORTS:
+            raise ValueError(f"Invalid sort: {sort_name}")
+        compact = listing_format() == "compact"
+        books, next_cursor = Book.get_page(limit, cursor, book_filter, SORTS[sort_name])
+        data = {"books": records_columns(books) if compact else books, "next": next_cursor}
+        if not cursor:
+            data["facets"] = Book.get_facets(
+                book_filter, current_app.config["FACET_LIMIT"]
+            )
+        return make_response("success", data=data)
+    except ValueError as e:
+        return make_response(
+            "fail",
+            data={"error": str(e)},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+    except Exception as e:
+        return make_response(
+            "error",
+            message="Failed to retrieve books",
+            data={"error": str(e)},
+            code=HTTPStatus.INTERNAL_SERVER_ERROR,
+        )
+
+
+@current_app.route("/api/books/search", methods=["GET"])
+def search_books() -> Response:
+    """Full-text search over titles, authors, series, publishers and collections."""
+    text = request.args.get("q", "")
+    limit = request.args.get("limit", current_app.config["SEARCH_LIMIT"], type=int)
+    limit = max(1, min(limit, current_app.config["BOOKS_MAX_PAGE_SIZE"]))
     try:
-        books = Book.get_all()
+        books = Book.search(text, limit)
         return make_response(
             "success",
             data={"books": books},
@@ -94,13 +421,107 @@ def read_books() -> Response:
     except Exception as e:
         return make_response(
             "error",
-            message="Failed to retrieve books",
+            message="Failed to search books",
+            data={"error": str(e)},
+            code=HTTPStatus.INTERNAL_SERVER_ERROR,
+        )
+
+
+@current_app.route("/api/books/duplicates", methods=["GET"])
+@etag_from_library_version
+def read_duplicates() -> Response:
+    """Get the groups of near-duplicate books, the closest first.
+
+    `threshold` overrides the configured similarity, from 0 to 1.
+    """
+    threshold = request.args.get(
+        "threshold", current_app.config["DUPLICATE_THRESHOLD"], type=float
+    )
+    if not 0 < threshold <= 1:
+        return make_response(
+            "fail",
+            data={"error": "The threshold must be between 0 and 1"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+    try:
+        groups = Book.get_duplicates(threshold, current_app.config["DUPLICATE_BUCKET_LIMIT"])
+        return make_response(
+            "success",
+            data={"threshold": threshold, "groups": groups},
+        )
+    except Exception as e:
+        return make_response(
+            "error",
+            message="Failed to find duplicates",
+            data={"error": str(e)},
+            code=HTTPStatus.INTERNAL_SERVER_ERROR,
+        )
+
+
+@current_app.route("/api/books/changes", methods=["GET"])
+def read_book_changes() -> Response:
+    """Get the books changed or deleted since the `since` sequence number."""
+    since = request.args.get("since", type=int)
+    if since is None:
+        return make_response(
+            "fail",
+            data={"error": "A 'since' sequence number is required"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+
+    limit = request.args.get("limit", current_app.config["BOOKS_MAX_PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, current_app.config["BOOKS_MAX_PAGE_SIZE"]))
+    try:
+        changes = Book.get_changes(since, limit)
+        if changes is None:
+            return make_response(
+                "success",
+                data={"resync": True, "seq": Book.get_change_seq()},
+            )
+        return make_response(
+            "success",
+            data={"resync": False} | changes,
+        )
+    except Exception as e:
+        return make_response(
+            "error",
+            message="Failed to retrieve changes",
             data={"error": str(e)},
             code=HTTPStatus.INTERNAL_SERVER_ERROR,
         )
 
 
+@current_app.route("/api/books/export", methods=["GET"])
+def export_books() -> Response:
+    """Stream the whole library as NDJSON or as a CSV the importer can read back."""
+    exporters = {
+        "ndjson": (export_ndjson, "application/x-ndjson"),
+        "csv": (export_csv, "text/csv"),
+    }
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in exporters:
+        return make_response(
+            "fail",
+            data={"error": f"Unknown export format: {export_format}"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+
+    exporter, mimetype = exporters[export_format]
+    body = in_library(pool.library, exporter(BookRepository.iter_all()))
+    response = Response(mimetype=mimetype)
+    if "gzip" in request.accept_encodings:
+        body = gzip_stream(body)
+        response.content_encoding = "gzip"
+    response.response = body
+    response.vary.add("Accept-Encoding")
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename=library.{export_format}"
+    )
+    return response
+
+
 @current_app.route("/api/books/<book_id>", methods=["GET"])
+@etag_from_library_version
 def read_book(book_id) -> Response:
     """Get a book by ID."""
     try:
@@ -119,6 +540,56 @@ def read_book(book_id) -> Response:
         )
 
 
+@current_app.route("/api/books/isbn/cache", methods=["GET"])
+def read_isbn_cache_stats() -> Response:
+    """Get the hit and miss counters of the ISBN cache."""
+    return make_response(
+        "success",
+        data={"cache": isbn_lookup.cache.stats()},
+    )
+
+
+@current_app.route("/api/books/isbn/batch", methods=["POST"])
+def get_books_by_isbn() -> Response:
+    """Fetch book details for a list of ISBNs, looked up concurrently."""
+    payload = request.get_json(silent=True)
+    if payload is not None and not isinstance(payload, dict):
+        return make_response(
+            "fail",
+            data={"error": "The request body must be a JSON object"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+    isbns = payload.get("isbns") if payload else request.form.getlist("isbn")
+
+    if (
+        not isbns
+        or not isinstance(isbns, list)
+        or not all(isinstance(isbn, str) for isbn in isbns)
+    ):
+        return make_response(
+            "fail",
+            data={"error": "A list of ISBNs is required"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+    if len(isbns) > current_app.config["ISBN_BATCH_MAX_SIZE"]:
+        return make_response(
+            "fail",
+            data={"error": f"At most {current_app.config['ISBN_BATCH_MAX_SIZE']} ISBNs per batch"},
+            code=HTTPStatus.BAD_REQUEST,
+        )
+
+    results = []
+    for isbn, (book, error) in zip(isbns, Book.from_isbns(isbns)):
+        if error is None:
+            results.append({"isbn": isbn, "book": book.to_dict()})
+        else:
+            results.append({"isbn": isbn, "error": str(error)})
+    return make_response(
+        "success",
+        data={"results": results},
+    )
+
+
 @current_app.route("/api/books/isbn/<isbn>", methods=["GET"])
 def get_book_by_isbn(isbn) -> Response:
     """Fetch book details using an ISBN."""
@@ -1,5 +1,7 @@
 const API_ENDPOINTS = {
     CREATE_BOOK: '/api/books',
+    READ_BOOKS: (query) => `/api/books?${query}`,
+    READ_CHANGES: (since) => `/api/books/changes?since=${since}`,
     READ_BOOK: (bookId) => `/api/books/${bookId}`,
     READ_BOOK_ISBN: (isbn) => `/api/books/isbn/${isbn}`,
     UPDATE_BOOK: (bookId) => `/api/books/${bookId}`,
@@ -7,7 +9,18 @@ const API_ENDPOINTS = {
     DELETE_BOOK: (bookId) => `/api/books/${bookId}`,
 };
 
+// Fields of a book in the JSON listing, in order.
+const BOOK_FIELDS = [
+    'id', 'title', 'author_id', 'series', 'volume', 'year', 'language', 'genre',
+    'written_form', 'publisher', 'collection', 'isbn', 'author_first', 'author_last', 'status',
+];
+
 class DOMElements {
+    // bookTable
+    static bookTable = document.querySelector('.book-table');
+    static booksSentinel = document.getElementById('booksSentinel');
+    // filterForm
+    static filterForm = document.getElementById('filterForm');
     // viewBookModal
     static viewBookModal = document.getElementById('viewBookModal');
     static editBookButton = document.getElementById('editBookButton');
@@ -43,7 +56,44 @@ class LibraryLoader {
     }
 }
 
+class CompactFormat {
+    // Decode the books of a compact listing page into those of the JSON listing.
+    static decode(page) {
+        const { count, columns, dictionaries, authors } = page;
+        const authorRows = new Map(authors.id.map((id, row) => [id, row]));
+        const decoders = BOOK_FIELDS.map(field => [field, columns[field], dictionaries[field]]);
+        const books = new Array(count);
+        for (let row = 0; row < count; row++) {
+            const book = {};
+            for (const [field, column, dictionary] of decoders) {
+                const value = column === undefined ? null : column[row];
+                book[field] = dictionary === undefined ? value : dictionary[value];
+            }
+            const authorRow = authorRows.get(book.author_id);
+            if (authorRow !== undefined) {
+                book.author_first = authors.author_first[authorRow];
+                book.author_last = authors.author_last[authorRow];
+            }
+            books[row] = book;
+        }
+        return books;
+    }
+}
+
 class APIService {
+    static async fetchBooksPage(filters, cursor = null, limit = null) {
+        const query = new URLSearchParams(filters);
+        if (cursor) query.set('after', cursor);
+        if (limit) query.set('limit', limit);
+        query.set('format', 'compact');
+        const response = await fetch(API_ENDPOINTS.READ_BOOKS(query), {
+            method: 'GET'
+        });
+        const data = await this.handleResponse(response);
+        data.books = CompactFormat.decode(data.books);
+        return data;
+    }
+
     static async fetchBookByID(bookId) {
         const response = await fetch(API_ENDPOINTS.READ_BOOK(bookId), {
             method: 'GET'
@@ -51,6 +101,13 @@ class APIService {
         return this.handleResponse(response);
     }
 
+    static async fetchChanges(since) {
+        const response = await fetch(API_ENDPOINTS.READ_CHANGES(since), {
+            method: 'GET'
+        });
+        return this.handleResponse(response);
+    }
+
     static async submitEditBookForm(formData, mode, bookId) {
         const url = mode === 'add' ? API_ENDPOINTS.CREATE_BOOK : API_ENDPOINTS.UPDATE_BOOK(bookId);
         const method = mode === 'add' ? 'POST' : 'PUT';
@@ -90,7 +147,9 @@ class APIService {
     static async handleResponse(response) {
         const responseData = await response.json();
         if (responseData.status === 'fail' || responseData.status === 'error') {
-            throw new Error(responseData.data.error || responseData.message);
+            const error = new Error(responseData.data.error || responseData.message);
+            error.data = responseData.data;
+            throw error;
         }
         return responseData.data;
     }
@@ -170,40 +229,31 @@ class UIUtils {
         return row;
     }
 
-    static sortCriterion(a, b) {
-        const keys = ["authorLast", "authorFirst", "year", "series", "volume", "title"];
-        for (const key of keys) {
-            const comparison = (a.dataset[key] || '').localeCompare(b.dataset[key] || '');
-            if (comparison !== 0) {
-                return comparison;
-            }
+    static async updateTableWithBook(book, mode = 'add') {
+        if (mode === 'add' || mode === 'edit') {
+            // The server sorts and filters, reload the rows shown so far.
+            await BookListLoader.reload();
+        } else if (mode === 'delete') {
+            const existingRow = document.querySelector(`tr[data-book-id="${book.id}"]`);
+            if (existingRow) existingRow.remove();
         }
-        return 0;
     }
 
-    static updateTableWithBook(book, mode = 'add') {
-        const tbody = document.querySelector('.book-table tbody');
-        const existingRow = document.querySelector(`tr[data-book-id="${book.id}"]`);
-
-        if (mode === 'add' || mode === 'edit') {
-            const rows = Array.from(tbody.querySelectorAll('tr'));
-
-            if (mode === 'edit' && existingRow) {
-                const existingStatusButton = existingRow.querySelector('#bookStatusButton');
-                book.status = existingStatusButton.dataset.currentStatus;
-                rows.splice(rows.indexOf(existingRow), 1);
-            }
-
-            const newRow = UIUtils.createBookRow(book, book.status);
-            rows.push(newRow);
-
-            rows.sort(this.sortCriterion);
-
-            tbody.innerHTML = '';
-            rows.forEach(row => tbody.appendChild(row));
-        } else if (mode === 'delete' && existingRow) {
-            existingRow.remove();
-        }
+    static updateFilterOptions(facets) {
+        const labels = {'not_read': 'Non lu', 'reading': 'En cours', 'read': 'Lu'};
+        DOMElements.filterForm.querySelectorAll('select[data-facet]').forEach(select => {
+            const selected = select.value;
+            select.querySelectorAll('option:not([value=""])').forEach(option => option.remove());
+            (facets[select.dataset.facet] || []).forEach(facet => {
+                const value = facet.value === null ? '' : String(facet.value);
+                if (value === '') return;
+                const option = document.createElement('option');
+                option.value = value;
+                option.textContent = `${facet.label || labels[value] || value} (${facet.count})`;
+                select.appendChild(option);
+            });
+            select.value = selected;
+        });
     }
 }
 
@@ -336,6 +386,106 @@ class ScannerService {
     }
 }
 
+class BookListLoader {
+    static isLoading = false;
+    static observer = null;
+    static filters = new URLSearchParams();
+
+    static appendBooks(books) {
+        const tbody = DOMElements.bookTable.querySelector('tbody');
+        books
+            .filter(book => !tbody.querySelector(`tr[data-book-id="${book.id}"]`))
+            .forEach(book => tbody.appendChild(UIUtils.createBookRow(book, book.status)));
+    }
+
+    static observe() {
+        if (this.observer) this.observer.disconnect();
+        if (!DOMElements.bookTable.dataset.nextCursor) return;
+
+        this.observer = new IntersectionObserver(async (entries) => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                await this.loadNextPage();
+            }
+        }, {rootMargin: '400px'});
+        this.observer.observe(DOMElements.booksSentinel);
+    }
+
+    static async loadNextPage() {
+        const cursor = DOMElements.bookTable.dataset.nextCursor;
+        if (this.isLoading || !cursor) return;
+
+        this.isLoading = true;
+        try {
+            const data = await APIService.fetchBooksPage(this.filters, cursor);
+            this.appendBooks(data["books"]);
+            DOMElements.bookTable.dataset.nextCursor = data["next"] || '';
+            if (!data["next"]) {
+                this.observer.disconnect();
+            }
+        } catch (error) {
+            console.error('Error fetching books:', error);
+        } finally {
+            this.isLoading = false;
+        }
+    }
+
+    static async reload(filters = this.filters) {
+        // Reload as many books as shown, the next ones are loaded on scroll again.
+        const tbody = DOMElements.bookTable.querySelector('tbody');
+        const shown = filters === this.filters ? tbody.querySelectorAll('tr').length : 0;
+        this.filters = filters;
+        try {
+            const data = await APIService.fetchBooksPage(filters, null, shown || null);
+            tbody.innerHTML = '';
+            this.appendBooks(data["books"]);
+            UIUtils.updateFilterOptions(data["facets"]);
+            DOMElements.bookTable.dataset.nextCursor = data["next"] || '';
+            this.observe();
+        } catch (error) {
+            console.error('Error fetching books:', error);
+        }
+    }
+
+    static formFilters() {
+        const filters = new URLSearchParams();
+        for (const [name, value] of new FormData(DOMElements.filterForm)) {
+            if (value !== '') filters.append(name, value);
+        }
+        return filters;
+    }
+}
+
+class ChangeSync {
+    static isSyncing = false;
+
+    static async sync() {
+        if (this.isSyncing) return;
+
+        this.isSyncing = true;
+        try {
+            let data;
+            let changed = false;
+            do {
+                data = await APIService.fetchChanges(DOMElements.bookTable.dataset.changesSeq);
+                if (data["resync"]) {
+                    window.location.reload();
+                    return;
+                }
+                data["deleted"].forEach(bookId => UIUtils.updateTableWithBook({id: bookId}, 'delete'));
+                changed = changed || data["books"].length > 0;
+                DOMElements.bookTable.dataset.changesSeq = data["seq"];
+            } while (data["more"]);
+            if (changed) {
+                await BookListLoader.reload();
+            }
+        } catch (error) {
+            console.error('Error syncing changes:', error);
+        } finally {
+            this.isSyncing = false;
+        }
+    }
+}
+
 class EventHandlers {
     // TODO: Improve error handling
 
@@ -357,10 +507,18 @@ class EventHandlers {
         const mode = document.getElementById('formModeInput').value;
         const bookId = DOMElements.bookForm.dataset.bookId;
         try {
-            const data = await APIService.submitEditBookForm(formData, mode, bookId);
+            let data;
+            try {
+                data = await APIService.submitEditBookForm(formData, mode, bookId);
+            } catch (error) {
+                const duplicates = error.data && error.data.duplicates;
+                if (!duplicates || !EventHandlers.confirmDuplicate(duplicates)) throw error;
+                formData.set('allow_duplicate', '1');
+                data = await APIService.submitEditBookForm(formData, mode, bookId);
+            }
             if (data.message) {
                 UIUtils.closeModal(DOMElements.addEditBookModal);
-                UIUtils.updateTableWithBook(data["book"], mode);
+                await UIUtils.updateTableWithBook(data["book"], mode);
             } else {
                 console.warn(`Error in ${mode} mode:`, data.error);
             }
@@ -369,6 +527,14 @@ class EventHandlers {
         }
     }
 
+    static confirmDuplicate(duplicates) {
+        const books = duplicates
+            .slice(0, 5)
+            .map(book => `- ${book.title} (${[book.author_first, book.author_last].filter(Boolean).join(' ')})`)
+            .join('\n');
+        return confirm(`Ce livre ressemble à un livre de la bibliothèque :\n${books}\n\nL'ajouter quand même ?`);
+    }
+
     static async handleSubmitIsbnForm(event) {
         event.preventDefault();
         const isbnInput = document.getElementById('isbnForm-isbn');
@@ -553,13 +719,24 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    // Initialize book table
-    const tbody = document.querySelector('.book-table tbody');
+    // Initialize book table with the first page, the next ones are loaded on scroll
     const books = JSON.parse(document.getElementById('books-data').textContent);
-
-    const rows = books.map(book => UIUtils.createBookRow(book, book.status));
-    rows.sort(UIUtils.sortCriterion);
-    rows.forEach(row => tbody.appendChild(row));
+    BookListLoader.appendBooks(books);
+    BookListLoader.observe();
+    UIUtils.updateFilterOptions(JSON.parse(document.getElementById('facets-data').textContent));
+
+    // Filters and sort are applied by the server
+    DOMElements.filterForm.addEventListener('change', async () => {
+        await BookListLoader.reload(BookListLoader.formFilters());
+    });
+    DOMElements.filterForm.addEventListener('submit', (event) => event.preventDefault());
+
+    // Catch up with changes made from other tabs or devices
+    document.addEventListener('visibilitychange', async () => {
+        if (document.visibilityState === 'visible') {
+            await ChangeSync.sync();
+        }
+    });
 
     //
     function toggleVolumeRequirement() {
@@ -0,0 +1,158 @@
+from .db import pool
+
+# Live counts per dimension, in the same shape as the `stats` table.
+LIVE_COUNTS = """
+    SELECT 'total', '', COUNT(*) FROM books
+    UNION ALL
+    SELECT 'author', author_id, COUNT(*) FROM books GROUP BY author_id
+    UNION ALL
+    SELECT 'genre', IFNULL(genre, ''), COUNT(*) FROM books GROUP BY 2
+    UNION ALL
+    SELECT 'language', IFNULL(language, ''), COUNT(*) FROM books GROUP BY 2
+    UNION ALL
+    SELECT 'publisher', IFNULL(publisher, ''), COUNT(*) FROM books GROUP BY 2
+    UNION ALL
+    SELECT 'decade', IFNULL(year / 10 * 10, ''), COUNT(*) FROM books GROUP BY 2
+    UNION ALL
+    SELECT 'status', status, COUNT(*) FROM read_status GROUP BY status
+"""
+
+
+# Facet dimensions the `stats` table counts.
+STATS_FACETS = ("status", "genre", "language", "publisher", "decade", "author")
+
+
+class StatsRepository:
+    """Repository for the library statistics maintained by triggers."""
+
+    @staticmethod
+    def get_connection():
+        """Borrow a connection from the pool, committing when the block exits."""
+        return pool.connection()
+
+    @classmethod
+    def summary(cls):
+        """Return the statistics, read from the summary table only."""
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                SELECT dimension, value, count FROM stats
+                WHERE dimension != 'author' AND count > 0
+                ORDER BY dimension, IIF(dimension = 'decade', value, NULL), count DESC, value
+            """
+            )
+            summary = {
+                "total": 0,
+                "status": {},
+                "genre": {},
+                "language": {},
+                "publisher": {},
+                "decade": {},
+            }
+            for dimension, value, count in cursor.fetchall():
+                if dimension == "total":
+                    summary["total"] = count
+                else:
+                    summary[dimension][value] = count
+
+            cursor.execute(
+                """
+                SELECT authors.author_last, authors.author_first, stats.count
+                FROM stats
+                JOIN authors ON authors.id = stats.value
+                WHERE stats.dimension = 'author' AND stats.count > 0
+                ORDER BY stats.count DESC, authors.author_last, authors.author_first
+            """
+            )
+            summary["author"] = [
+                {"author_last": last, "author_first": first, "count": count}
+                for last, first, count in cursor.fetchall()
+            ]
+
+        return summary
+
+    @classmethod
+    def facet(cls, dimension, limit):
+        """Return the `(value, count)` of a dimension over the whole library.
+
+        Values are typed like the book columns, None for a missing one. Author
+        rows are `(author_id, label, count)`. Rows are ordered like
+        `queries.facet_query`.
+        """
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            if dimension == "author":
+                cursor.execute(
+                    """
+                    SELECT authors.id, authors.author_first || ' ' || authors.author_last,
+                           stats.count
+                    FROM stats
+                    JOIN authors ON authors.id = stats.value
+                    WHERE stats.dimension = 'author' AND stats.count > 0
+                    ORDER BY stats.count DESC, authors.author_last, authors.author_first
+                    LIMIT ?
+                """,
+                    (limit,),
+                )
+                return cursor.fetchall()
+
+            cursor.execute(
+                """
+                SELECT value, count FROM stats
+                WHERE dimension = ? AND count > 0
+                ORDER BY
+                    IIF(dimension = 'decade', IIF(value = '', -1, CAST(value AS INTEGER)), NULL),
+                    count DESC,
+                    value
+                LIMIT ?
+            """,
+                (dimension, limit),
+            )
+            convert = int if dimension == "decade" else str
+            return [
+                (convert(value) if value != "" else None, count)
+                for value, count in cursor.fetchall()
+            ]
+
+    @classmethod
+    def check(cls):
+        """Compare the summary table with live counts and return the differences."""
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(LIVE_COUNTS)
+            live = {(dim, str(value)): count for dim, value, count in cursor.fetchall()}
+            cursor.execute("SELECT dimension, value, count FROM stats WHERE count != 0")
+            stored = {(dim, value): count for dim, value, count in cursor.fetchall()}
+
+        differences = []
+        for dimension, value in sorted(live.keys() | stored.keys()):
+            expected = live.get((dimension, value), 0)
+            actual = stored.get((dimension, value), 0)
+            if expected != actual:
+                differences.append(
+                    {"dimension": dimension, "value": value, "stored": actual, "live": expected}
+                )
+        return differences
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute the summary table from scratch."""
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("DELETE FROM stats")
+            cursor.execute(f"INSERT INTO stats (dimension, value, count) {LIVE_COUNTS}")
+            cursor.execute("UPDATE meta SET value = 0 WHERE key = 'stats_stale'")
+
+    @classmethod
+    def is_stale(cls):
+        """Tell whether the summary table predates the library and needs a rebuild."""
+        with cls.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT value FROM meta WHERE key = 'stats_stale'")
+            return bool(cursor.fetchone()[0])
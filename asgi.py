@@ -0,0 +1,4 @@
+from app import create_app
+from app.asgi import AsgiApp
+
+app = AsgiApp(create_app())
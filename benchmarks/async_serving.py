@@ -0,0 +1,132 @@
+"""Compare CRUD latency under slow ISBN lookups, served over WSGI and ASGI.
+
+Run from the repository root, for instance:
+
+    python -m benchmarks.async_serving --lookup-latency 2 --duration 10
+
+A stub Google Books API answers after `--lookup-latency` seconds. Each server
+runs in its own process with `--workers` threads: a WSGI server handing each
+connection to a thread, like a threaded gunicorn worker, and `asgi.py` under
+uvicorn. CRUD clients read books and toggle their status, first alone then
+while lookup clients look up unknown ISBNs, and the latency percentiles of the
+CRUD requests are printed for each phase.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from .harness import SERVERS, percentiles, request, start_books_stub, start_server
+from .run import build_library
+
+
+def run_phase(port, ids, duration, crud_clients, lookup_clients, seed):
+    """Run CRUD and lookup clients for `duration` seconds, return the CRUD timings in ms."""
+    stop = time.monotonic() + duration
+    isbns = itertools.count(9790000000000 + seed * 10_000_000)
+    timings, lookups, errors = [], [], []
+
+    def crud_client(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < stop:
+            book_id = rng.choice(ids)
+            if rng.random() < 0.5:
+                method, path, body = "GET", f"/api/books/{book_id}", None
+            else:
+                status = rng.choice(["not_read", "reading", "read"])
+                method, path, body = "PATCH", f"/api/books/{book_id}/status", f"status={status}"
+            start = time.perf_counter()
+            code, _ = request(port, method, path, body)
+            timings.append((time.perf_counter() - start) * 1000)
+            if code >= 500:
+                errors.append(code)
+
+    def lookup_client():
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            code, _ = request(port, "GET", f"/api/books/isbn/{next(isbns)}")
+            lookups.append((time.perf_counter() - start) * 1000)
+            if code != 200:
+                errors.append(code)
+
+    threads = [threading.Thread(target=crud_client, args=(i,)) for i in range(crud_clients)]
+    threads += [threading.Thread(target=lookup_client) for _ in range(lookup_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, lookups, errors
+
+
+def run(args):
+    from app.models import BookRepository
+
+    books_url, stub = start_books_stub(args.lookup_latency)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "bench.db")
+        build_library(database, args.size, args.seed)
+        from app.db import pool
+
+        pool.configure(database)
+        ids = [book.id for book in BookRepository.iter_all()]
+        pool.close()
+
+        for kind in args.servers:
+            process, port = start_server(
+                kind,
+                database,
+                books_url,
+                args.workers,
+                {"GOOGLE_BOOKS_RATE_LIMIT": "null", "GOOGLE_BOOKS_RETRIES": "0"},
+            )
+            try:
+                phases = {"idle": 0, "slow lookups": args.lookup_clients}
+                for phase, lookup_clients in phases.items():
+                    timings, lookups, errors = run_phase(
+                        port, ids, args.duration, args.crud_clients, lookup_clients, args.seed
+                    )
+                    result = {"server": kind, "phase": phase, "lookups": len(lookups)}
+                    result |= percentiles(timings) | {"errors": len(errors)}
+                    results.append(result)
+                    print(
+                        f"{kind:<5} {phase:<13} {result['runs']:>6} CRUD requests  "
+                        f"median {result['median_ms']:>8.1f} ms  p99 {result['p99_ms']:>8.1f} ms  "
+                        f"max {result['max_ms']:>8.1f} ms  {len(lookups):>4} lookups  "
+                        f"{len(errors)} errors",
+                        file=sys.stderr,
+                    )
+            finally:
+                process.terminate()
+                process.wait()
+    stub.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10_000, help="Books in the library.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--servers", nargs="+", choices=SERVERS, default=list(SERVERS))
+    parser.add_argument("--workers", type=int, default=8, help="Threads of each server.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per phase.")
+    parser.add_argument("--crud-clients", type=int, default=4)
+    parser.add_argument("--lookup-clients", type=int, default=16)
+    parser.add_argument("--lookup-latency", type=float, default=2.0, help="Seconds.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Time snapshots of a library and their effect on the latency of the app serving it.
+
+Run from the repository root, for instance:
+
+    python -m benchmarks.backup --size 100000 --duration 20
+    python -m benchmarks.backup --pages-per-step 64 1024 --step-pause 0 0.01
+
+The app is started from `create_app()` against a synthetic library, and
+`--concurrency` clients replay a mix of views, edits and status toggles. The
+mix runs once without backups, then for each backup setting while snapshots of
+the library are taken one after the other, online with the backup API or
+compacted with `VACUUM INTO`. The duration of the snapshots and the latency
+percentiles of the reads and writes are printed for each phase.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from .harness import SERVERS, percentiles, start_books_stub, start_server
+from .load import Workload, replay
+from .run import build_library, summarize
+
+# Listings are left out, their own latency would hide that of the snapshots.
+MIX = {"view": 60, "edit": 10, "status": 30}
+
+WRITES = ("edit", "status")
+
+
+def take_snapshots(mode, stop):
+    """Take snapshots of the configured library until `stop` is set, return their reports."""
+    from app.backup import backups
+
+    reports = []
+    while not stop.is_set():
+        reports.append(backups.snapshot(mode=mode))
+    return reports
+
+
+def run_phase(port, workload, args, backup=None):
+    """Replay the mix, taking snapshots with `backup` settings meanwhile if given."""
+    from app.backup import backups
+
+    stop = threading.Event()
+    reports = []
+    if backup is not None:
+        mode, pages_per_step, step_pause = backup
+        backups.pages_per_step = pages_per_step
+        backups.step_pause = step_pause
+        thread = threading.Thread(target=lambda: reports.extend(take_snapshots(mode, stop)))
+        thread.start()
+    try:
+        results = replay(port, workload, MIX, args.concurrency, args.duration, args.seed)
+    finally:
+        stop.set()
+        if backup is not None:
+            thread.join()
+
+    reads = [t for kind, (timings, _) in results.items() if kind not in WRITES for t in timings]
+    writes = [t for kind, (timings, _) in results.items() if kind in WRITES for t in timings]
+    errors = sum(len(errors) for _, errors in results.values())
+    return reads, writes, errors, reports
+
+
+def run(args):
+    from app.backup import backups
+    from app.db import pool
+    from app.models import BookRepository
+
+    books_url, stub = start_books_stub(0)
+    phases = [("none", None)]
+    for pages_per_step in args.pages_per_step:
+        for step_pause in args.step_pause:
+            phases.append(
+                (
+                    f"online {pages_per_step} pages, {step_pause * 1000:g} ms",
+                    ("online", pages_per_step, step_pause),
+                )
+            )
+    if args.vacuum:
+        phases.append(("vacuum", ("vacuum", None, 0)))
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "bench.db")
+        build_library(database, args.size, args.seed)
+        pool.configure(database)
+        backups.configure(os.path.join(directory, "backups"), retention=2)
+        workload = Workload(list(BookRepository.iter_all()), 1, args.seed)
+
+        process, port = start_server(args.server, database, books_url, args.workers)
+        try:
+            replay(port, workload, MIX, args.concurrency, args.warmup, args.seed + 1)
+            for name, backup in phases:
+                reads, writes, errors, reports = run_phase(port, workload, args, backup)
+                result = {
+                    "backup": name,
+                    "snapshots": len(reports),
+                    "snapshot": summarize([r["seconds"] * 1000 for r in reports])
+                    if reports
+                    else None,
+                    "restarts": sum(r["restarts"] for r in reports),
+                    "reads": percentiles(reads),
+                    "writes": percentiles(writes),
+                    "errors": errors,
+                }
+                results.append(result)
+                duration = ""
+                if reports:
+                    duration = (
+                        f"{len(reports)} snapshots, "
+                        f"median {result['snapshot']['median_ms'] / 1000:.2f}s, "
+                        f"{result['restarts']} restarts"
+                    )
+                print(
+                    f"{name:<26} reads p50 {result['reads']['median_ms']:>7.1f} "
+                    f"p99 {result['reads']['p99_ms']:>7.1f}  "
+                    f"writes p50 {result['writes']['median_ms']:>7.1f} "
+                    f"p99 {result['writes']['p99_ms']:>7.1f} ms  "
+                    f"{errors} errors  {duration}",
+                    file=sys.stderr,
+                )
+        finally:
+            process.terminate()
+            process.wait()
+            pool.close()
+    stub.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000, help="Books in the library.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server", choices=SERVERS, default="wsgi")
+    parser.add_argument("--workers", type=int, default=8, help="Threads of the server.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per phase.")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds before measuring.")
+    parser.add_argument("--pages-per-step", type=int, nargs="+", default=[256])
+    parser.add_argument("--step-pause", type=float, nargs="+", default=[0.005], help="Seconds.")
+    parser.add_argument(
+        "--no-vacuum", dest="vacuum", action="store_false", help="Skip the VACUUM INTO phase."
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Servers and clients shared by the load tests.
+
+`start_books_stub` runs a Google Books stand-in in a thread, `start_server`
+runs the app from `create_app()` in a subprocess, over WSGI or ASGI, pointed
+at it with `BOOKTRACKER_GOOGLE_BOOKS_BASE_URL`.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .run import summarize
+
+SERVERS = ("wsgi", "asgi")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_books_stub(latency, error_rate=0.0, seed=0):
+    """Serve a Google Books stand-in in a thread, return its base URL and server.
+
+    Each lookup is answered after `latency` seconds, with a 503 for a share
+    `error_rate` of them, and otherwise with a volume made up for the ISBN.
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            with lock:
+                failed = rng.random() < error_rate
+            if failed:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            isbn = parse_qs(urlsplit(self.path).query).get("q", [""])[0].removeprefix("isbn:")
+            volume = {
+                "volumeInfo": {
+                    "title": f"Lookup {isbn}",
+                    "authors": ["Stub Author"],
+                    "publishedDate": "2001",
+                    "language": "fr",
+                    "industryIdentifiers": [{"type": "ISBN_13", "identifier": isbn}],
+                }
+            }
+            body = json.dumps({"items": [volume]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/books/v1", server
+
+
+def serve(kind, port, workers):
+    """Run the app with `workers` threads until killed, in this process."""
+    from app import create_app
+
+    app = create_app()
+    if kind == "asgi":
+        import uvicorn
+
+        from app.asgi import AsgiApp
+
+        uvicorn.run(AsgiApp(app), host="127.0.0.1", port=port, log_level="warning")
+        return
+
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    class PooledWSGIServer(BaseWSGIServer):
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+        def process_request(self, request, client_address):
+            self.executor.submit(self.handle_in_thread, request, client_address)
+
+        def handle_in_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledWSGIServer("127.0.0.1", port, app, handler=QuietHandler).serve_forever()
+
+
+def start_server(kind, database, books_url, workers, settings=None):
+    """Start the app in a subprocess and return it with its port.
+
+    The app uses `database` and the Books API at `books_url`, `settings` are
+    further `BOOKTRACKER_*` variables. A WSGI server hands each connection to
+    one of `workers` threads, like a threaded gunicorn worker, the ASGI server
+    is `asgi.py` under uvicorn.
+    """
+    port = free_port()
+    env = os.environ | {
+        "BOOKTRACKER_DATABASE_PATH": database,
+        "BOOKTRACKER_GOOGLE_BOOKS_BASE_URL": books_url,
+        "BOOKTRACKER_ASYNC_WORKERS": str(workers),
+    }
+    env |= {f"BOOKTRACKER_{name}": value for name, value in (settings or {}).items()}
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.harness",
+            "--serve", kind,
+            "--port", str(port),
+            "--workers", str(workers),
+        ],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            request(port, "GET", "/api/stats")
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"The {kind} server did not start")
+
+
+def request(port, method, path, body=None, timeout=60):
+    """Send a request on a new connection and return its status and body."""
+    conn = HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        headers = {"Content-Type": "application/x-www-form-urlencoded"} if body else {}
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def percentiles(timings):
+    """Return statistics of timings in ms, with the 90th and 99th percentiles and the maximum."""
+    timings = sorted(timings)
+    return summarize(timings) | {
+        "p90_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.90))], 3),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--serve", choices=SERVERS, required=True)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    serve(args.serve, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
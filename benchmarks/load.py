@@ -0,0 +1,220 @@
+"""Drive a weighted mix of requests against the app and report latency per route.
+
+Run from the repository root, for instance:
+
+    python -m benchmarks.load --size 100000 --concurrency 32 --duration 60
+    python -m benchmarks.load --server asgi --mix list=20 view=40 isbn=40 \\
+        --lookup-latency 0.5 --lookup-error-rate 0.1
+
+The app is started from `create_app()` against a synthetic library, with its
+ISBN lookups sent to a local Google Books stand-in answering after
+`--lookup-latency` seconds and failing a share `--lookup-error-rate` of them.
+`--concurrency` clients then send requests drawn from the mix, each waiting for
+its answer before sending the next, and the throughput and latency percentiles
+of each route are printed. Other settings of the app are taken from the
+`BOOKTRACKER_*` environment variables.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from .harness import SERVERS, percentiles, request, start_books_stub, start_server
+from .run import build_library
+
+# Weights of the request kinds, `--mix` overrides them.
+MIX = {"list": 30, "view": 35, "edit": 5, "status": 20, "isbn": 10}
+
+ROUTES = {
+    "list": "GET /api/books",
+    "view": "GET /api/books/<id>",
+    "edit": "PUT /api/books/<id>",
+    "status": "PATCH /api/books/<id>/status",
+    "isbn": "GET /api/books/isbn/<isbn>",
+}
+
+FORM_FIELDS = (
+    "title",
+    "author_last",
+    "author_first",
+    "series",
+    "volume",
+    "year",
+    "language",
+    "genre",
+    "written_form",
+    "publisher",
+    "collection",
+    "isbn",
+)
+
+
+class Workload:
+    """Draws requests of each kind on the books of a library."""
+
+    def __init__(self, books, isbn_count, seed):
+        self.books = books
+        self.genres = sorted({book.genre for book in books if book.genre})
+        self.authors = sorted({book.author_id for book in books})
+        self.isbns = [str(9790000000000 + seed * 10_000_000 + i) for i in range(isbn_count)]
+
+    def list(self, rng):
+        query = rng.choice(
+            [
+                {},
+                {"format": "compact"},
+                {"status": "read"},
+                {"sort": "title"},
+                {"sort": "-year", "status": "reading"},
+                {"genre": rng.choice(self.genres)} if self.genres else {},
+                {"author": rng.choice(self.authors)},
+            ]
+        )
+        return "GET", f"/api/books?{urlencode(query)}", None
+
+    def view(self, rng):
+        return "GET", f"/api/books/{rng.choice(self.books).id}", None
+
+    def edit(self, rng):
+        book = rng.choice(self.books)
+        form = {name: getattr(book, name) for name in FORM_FIELDS}
+        body = urlencode({name: value for name, value in form.items() if value is not None})
+        return "PUT", f"/api/books/{book.id}", body
+
+    def status(self, rng):
+        status = rng.choice(["not_read", "reading", "read"])
+        return "PATCH", f"/api/books/{rng.choice(self.books).id}/status", f"status={status}"
+
+    def isbn(self, rng):
+        return "GET", f"/api/books/isbn/{rng.choice(self.isbns)}", None
+
+
+def succeeded(status, body) -> bool:
+    """Whether a response is a success, JSend failures are answered with a 200."""
+    return status < 400 and not body.startswith((b'{"status":"fail"', b'{"status":"error"'))
+
+
+def replay(port, workload, mix, concurrency, duration, seed):
+    """Send requests drawn from `mix` with `concurrency` clients for `duration` seconds.
+
+    Return the `(timings in ms, errors)` of each request kind.
+    """
+    kinds, weights = zip(*mix.items())
+    stop = time.monotonic() + duration
+    results = {kind: ([], []) for kind in kinds}
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < stop:
+            kind = rng.choices(kinds, weights)[0]
+            method, path, body = getattr(workload, kind)(rng)
+            start = time.perf_counter()
+            try:
+                status, response = request(port, method, path, body)
+            except OSError as e:
+                status, response = 599, str(e).encode()
+            timings, errors = results[kind]
+            timings.append((time.perf_counter() - start) * 1000)
+            if not succeeded(status, response):
+                errors.append(status)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run(args):
+    from app.db import pool
+    from app.models import BookRepository
+
+    books_url, stub = start_books_stub(args.lookup_latency, args.lookup_error_rate, args.seed)
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "load.db")
+        build_library(database, args.size, args.seed)
+        pool.configure(database)
+        workload = Workload(list(BookRepository.iter_all()), args.isbns, args.seed)
+        pool.close()
+
+        process, port = start_server(args.server, database, books_url, args.workers)
+        try:
+            if args.warmup:
+                replay(port, workload, args.mix, args.concurrency, args.warmup, args.seed + 1)
+            results = replay(port, workload, args.mix, args.concurrency, args.duration, args.seed)
+        finally:
+            process.terminate()
+            process.wait()
+    stub.shutdown()
+
+    total = sum(len(timings) for timings, _ in results.values())
+    print(
+        f"{args.server}, {args.workers} threads, {args.concurrency} clients: "
+        f"{total / args.duration:.1f} requests/s",
+        file=sys.stderr,
+    )
+    for kind, (timings, errors) in results.items():
+        if not timings:
+            continue
+        result = {"route": ROUTES[kind], "errors": len(errors)}
+        result |= percentiles(timings) | {"throughput": round(len(timings) / args.duration, 1)}
+        report.append(result)
+        print(
+            f"{result['route']:<30} {result['throughput']:>8.1f}/s  "
+            f"p50 {result['median_ms']:>8.1f}  p90 {result['p90_ms']:>8.1f}  "
+            f"p99 {result['p99_ms']:>8.1f}  max {result['max_ms']:>8.1f} ms  "
+            f"{len(errors)} errors",
+            file=sys.stderr,
+        )
+    return report
+
+
+def parse_mix(items) -> dict:
+    mix = dict(MIX)
+    for item in items:
+        kind, _, weight = item.partition("=")
+        if kind not in MIX:
+            raise argparse.ArgumentTypeError(f"Unknown request kind: {kind}")
+        mix[kind] = float(weight)
+    return {kind: weight for kind, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10_000, help="Books in the library.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server", choices=SERVERS, default="wsgi")
+    parser.add_argument("--workers", type=int, default=8, help="Threads of the server.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients.")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds measured.")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds before measuring.")
+    parser.add_argument(
+        "--mix",
+        nargs="*",
+        default=[],
+        metavar="KIND=WEIGHT",
+        help=f"Weights of the request kinds, by default {' '.join(f'{k}={w}' for k, w in MIX.items())}.",
+    )
+    parser.add_argument("--isbns", type=int, default=1000, help="Distinct ISBNs looked up.")
+    parser.add_argument("--lookup-latency", type=float, default=0.2, help="Seconds.")
+    parser.add_argument("--lookup-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+    args.mix = parse_mix(args.mix)
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
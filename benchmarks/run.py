@@ -0,0 +1,318 @@
+"""Time startup, the repository and the API on synthetic libraries of growing size.
+
+Run from the repository root, for instance:
+
+    python -m benchmarks.run --sizes 10000 100000 --output bench.json
+    python -m benchmarks.run --sizes 10000 --compare bench.json
+
+Each size runs in its own process, against a fresh database in a temporary
+directory. Results are written as JSON so that runs from different commits can
+be compared.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .synthetic import generate_lines
+
+# Run in a fresh interpreter: import the app, create it and print the elapsed ms.
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from app import create_app
+create_app()
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def measure(function, repeat, warmup=1):
+    """Call `function` `repeat` times and return timing statistics in ms."""
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def summarize(timings):
+    """Return statistics of timings in ms."""
+    repeat = len(timings)
+    timings = sorted(timings)
+    return {
+        "runs": repeat,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+
+def build_library(path, size, seed):
+    """Create a database at `path` holding a synthetic library of `size` books."""
+    from app.db import pool
+    from app.importer import BulkImporter
+    from app.migrations import migrate
+
+    pool.configure(path)
+    with pool.connection() as conn:
+        migrate(conn)
+    report = BulkImporter(batch_size=1000).run(generate_lines(size, seed))
+    pool.close()
+    return report
+
+
+def start_app(path):
+    """Return the ms taken to import and create the app in a new interpreter."""
+    process = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        env=os.environ | {"BOOKTRACKER_DATABASE_PATH": path},
+        stdout=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    return float(process.stdout.splitlines()[-1])
+
+
+def bench_startup(path, size, repeat):
+    """Time cold starts against the library at `path` and against a new database."""
+    runs = max(3, repeat // 10)
+    start_app(path)  # warm up the OS file cache
+    yield {"size": size, "kind": "startup", "name": "cold_start"} | summarize(
+        [start_app(path) for _ in range(runs)]
+    )
+
+    timings = []
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(runs):
+            timings.append(start_app(os.path.join(directory, f"new-{i}.db")))
+    yield {"size": size, "kind": "startup", "name": "cold_start_new_database"} | summarize(
+        timings
+    )
+
+
+def bench_repository(size, repeat, rng):
+    from app.models import Book, BookRepository
+    from app.queries import SORTS, BookFilter
+
+    ids = [book.id for book in BookRepository.iter_all()]
+    book = Book(
+        title="Benchmark",
+        author_last="Bench",
+        author_first="Mark",
+        year=2000,
+        language="Français",
+    )
+    created = []
+    heavy = max(1, repeat // 10)
+
+    cases = {
+        "find_all": (BookRepository.find_all, heavy),
+        "find_page": (lambda: BookRepository.find_page(100), repeat),
+        "find_page_deep": (
+            lambda: BookRepository.find_page(100, ("M", "", -1, 0)),
+            repeat,
+        ),
+        "find_page_filtered": (
+            lambda: BookRepository.find_page(
+                100, None, BookFilter(status=("read",), year_min=1950), SORTS["-year"]
+            ),
+            repeat,
+        ),
+        "find_facets": (lambda: BookRepository.find_facets(BookFilter(), 100), repeat),
+        "find_facets_filtered": (
+            lambda: BookRepository.find_facets(BookFilter(status=("read",)), 100),
+            heavy,
+        ),
+        "find_by_id": (lambda: BookRepository.find_by_id(rng.choice(ids)), repeat),
+        "search": (lambda: BookRepository.search('"nuit"* "mer"*', 50), repeat),
+        "create": (lambda: created.append(BookRepository.create(book)), repeat),
+        "update": (lambda: BookRepository.update(rng.choice(created), book), repeat),
+        "update_reading_status": (
+            lambda: BookRepository.update_reading_status(rng.choice(ids), "read"),
+            repeat,
+        ),
+        "delete": (lambda: BookRepository.delete(created.pop()), repeat),
+    }
+    for name, (function, runs) in cases.items():
+        yield {"size": size, "kind": "repository", "name": name} | measure(function, runs)
+
+
+def bench_routes(client, size, repeat, rng):
+    from app.models import BookRepository
+
+    ids = [book.id for book in BookRepository.iter_all()]
+    form = {"title": "Benchmark", "author_last": "Bench", "author_first": "Mark"}
+    created = []
+
+    def create():
+        # Numbered titles are not duplicates of each other, the check still runs.
+        response = client.post("/api/books", data=form | {"title": f"Benchmark {len(created)}"})
+        created.append(response.json["data"]["book"]["id"])
+
+    heavy = max(1, repeat // 10)
+    cases = {
+        "GET /": (lambda: client.get("/"), repeat),
+        "GET /api/books": (lambda: client.get("/api/books"), repeat),
+        "GET /api/books?limit=1000": (lambda: client.get("/api/books?limit=1000"), heavy),
+        "GET /api/books?status=read&sort=title": (
+            lambda: client.get("/api/books?status=read&sort=title"),
+            heavy,
+        ),
+        "GET /api/books/<id>": (lambda: client.get(f"/api/books/{rng.choice(ids)}"), repeat),
+        "GET /api/books/search": (lambda: client.get("/api/books/search?q=nuit"), repeat),
+        "GET /api/books/export": (lambda: client.get("/api/books/export").data, heavy),
+        "GET /api/stats": (lambda: client.get("/api/stats"), repeat),
+        "GET /api/books/duplicates": (lambda: client.get("/api/books/duplicates"), heavy),
+        "POST /api/books": (create, repeat),
+        "PUT /api/books/<id>": (
+            lambda: client.put(f"/api/books/{rng.choice(created)}", data=form),
+            repeat,
+        ),
+        "PATCH /api/books/<id>/status": (
+            lambda: client.patch(
+                f"/api/books/{rng.choice(ids)}/status", data={"status": "reading"}
+            ),
+            repeat,
+        ),
+        "DELETE /api/books/<id>": (
+            lambda: client.delete(f"/api/books/{created.pop()}"),
+            repeat,
+        ),
+    }
+    for name, (function, runs) in cases.items():
+        yield {"size": size, "kind": "route", "name": name} | measure(function, runs)
+
+
+def run(sizes, repeat, seed):
+    """Benchmark each size in a subprocess, the app can only be created once."""
+    results = []
+    for size in sizes:
+        process = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.run",
+                "--sizes", str(size),
+                "--repeat", str(repeat),
+                "--seed", str(seed),
+                "--single",
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        results.extend(json.loads(process.stdout))
+    return results
+
+
+def run_single(size, repeat, seed):
+    """Build a library of `size` books and benchmark it in this process."""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        start = time.perf_counter()
+        report = build_library(path, size, seed)
+        print(f"[{size}] built library: {report}", file=sys.stderr)
+        results.append(
+            {
+                "size": size,
+                "kind": "build",
+                "name": "bulk_import",
+                "runs": 1,
+                "median_ms": round((time.perf_counter() - start) * 1000, 3),
+                "rows_per_second": round(report.rate, 1),
+            }
+        )
+
+        benchmarks = list(bench_startup(path, size, repeat))
+
+        os.environ["BOOKTRACKER_DATABASE_PATH"] = path
+        from app import create_app
+        from app.db import pool
+
+        app = create_app()
+        rng = random.Random(seed)
+        with app.app_context():
+            benchmarks += bench_repository(size, repeat, rng)
+        benchmarks += bench_routes(app.test_client(), size, repeat, rng)
+        for result in benchmarks:
+            print(f"[{size}] {result['name']}: {result['median_ms']} ms", file=sys.stderr)
+        results += benchmarks
+        pool.close()
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+
+
+def compare(results, baseline_path):
+    """Print the median ratio of each result against a previous run."""
+    baseline = {
+        (r["size"], r["kind"], r["name"]): r
+        for r in json.loads(Path(baseline_path).read_text())["results"]
+    }
+    for result in results:
+        previous = baseline.get((result["size"], result["kind"], result["name"]))
+        if previous and previous["median_ms"]:
+            ratio = result["median_ms"] / previous["median_ms"]
+            flag = "  <-- slower" if ratio > 1.2 else ""
+            print(
+                f"{result['size']:>8} {result['name']:<32} "
+                f"{previous['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms "
+                f"(x{ratio:.2f}){flag}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per measurement.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Compare with the JSON results of a previous run.")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.sizes[0], args.repeat, args.seed)))
+        return
+
+    results = run(args.sizes, args.repeat, args.seed)
+    document = {"meta": metadata(), "results": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(document, indent=2))
+    else:
+        print(json.dumps(document, indent=2))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
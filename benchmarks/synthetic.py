@@ -0,0 +1,91 @@
+"""Generate realistic synthetic libraries in the CSV layout read by the importer."""
+
+import random
+from itertools import accumulate
+
+FIRST_NAMES = [
+    "Jean", "Marie", "Pierre", "Sophie", "Émile", "Hélène", "François", "Léa",
+    "Victor", "Amélie", "Jules", "Agathe", "John", "Mary", "James", "Elizabeth",
+    "Robert", "Margaret", "Ursula", "Frank", "Isaac", "Octavia", "Terry", "Neil",
+]
+LAST_NAMES = [
+    "Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand",
+    "Leroy", "Moreau", "Simon", "Laurent", "Lefèvre", "Michel", "García", "Bérard",
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Miller", "Davis", "Wilson",
+    "Le Guin", "Herbert", "Asimov", "Butler", "Pratchett", "Gaiman", "Christie",
+]
+TITLE_WORDS = [
+    "nuit", "mer", "étoile", "château", "ombre", "rêve", "cité", "forêt", "secret",
+    "voyage", "mémoire", "empire", "dernier", "silence", "feu", "hiver", "lumière",
+    "night", "sea", "star", "castle", "shadow", "dream", "city", "forest", "secret",
+    "journey", "memory", "empire", "last", "silence", "fire", "winter", "light",
+]
+GENRES = ["Roman", "Sf", "Fantasy", "Policier", "Essai", "Biographie", "Poésie", "Théâtre"]
+WRITTEN_FORMS = ["Roman", "Nouvelles", "Bande dessinée", "Manga", "Pièce"]
+LANGUAGES = ["Français", "Anglais", "Espagnol", "Allemand", "Italien"]
+LANGUAGE_WEIGHTS = [60, 30, 4, 3, 3]
+PUBLISHERS = [
+    ("Gallimard", ["Folio", "Folio SF", "Blanche"]),
+    ("Le Livre de Poche", ["Classiques", "Thriller"]),
+    ("Pocket", ["Imaginaire"]),
+    ("J'ai lu", []),
+    ("Seuil", ["Points"]),
+    ("Penguin", ["Modern Classics"]),
+    ("Tor", []),
+    ("Actes Sud", ["Babel"]),
+]
+
+
+def author_weights(count, skew=1.1):
+    """Cumulative Zipf weights, so a few authors write most of the books."""
+    return list(accumulate(1 / rank**skew for rank in range(1, count + 1)))
+
+
+def generate_rows(size, seed=0):
+    """Yield `size` export rows (lists of strings) describing a synthetic library."""
+    rng = random.Random(seed)
+
+    authors = [
+        (rng.choice(LAST_NAMES) + (f"-{i}" if i >= len(LAST_NAMES) else ""), rng.choice(FIRST_NAMES))
+        for i in range(max(1, size // 8))
+    ]
+    weights = author_weights(len(authors))
+    series_volumes = {}
+
+    for i in range(size):
+        author_last, author_first = rng.choices(authors, cum_weights=weights)[0]
+        words = rng.sample(TITLE_WORDS, rng.randint(1, 4))
+        title = " ".join(words).capitalize()
+
+        series = ""
+        if rng.random() < 0.3:
+            name = f"Cycle de {author_last} {rng.randint(1, 3)}"
+            volume = series_volumes[name] = series_volumes.get(name, 0) + 1
+            series = f"{name} #{volume}"
+
+        publisher, collections = rng.choice(PUBLISHERS)
+        if collections and rng.random() < 0.6:
+            publisher = f"{publisher} - {rng.choice(collections)}"
+
+        year = str(max(1800, 2025 - int(rng.expovariate(1 / 25))))
+        isbn = str(9780000000000 + i) if rng.random() < 0.5 else ""
+
+        yield [
+            title,
+            f"{author_last}, {author_first}",
+            series,
+            year,
+            rng.choice(WRITTEN_FORMS),
+            rng.choice(GENRES),
+            publisher,
+            rng.choices(LANGUAGES, LANGUAGE_WEIGHTS)[0],
+            rng.choices(["Oui", "En cours", "Non"], [50, 5, 45])[0],
+            isbn,
+        ]
+
+
+def generate_lines(size, seed=0):
+    """Yield a header and `size` `;`-delimited lines ready for the importer."""
+    yield "Titre;Auteur;Série;Année;Forme;Genre;Éditeur;Langue;Lu;ISBN\n"
+    for row in generate_rows(size, seed):
+        yield ";".join(row) + "\n"
@@ -0,0 +1,147 @@
+"""Compare the JSON and compact formats of the book listing.
+
+Run from the repository root, for instance:
+
+    python -m benchmarks.wire_format --size 10000 --limits 100 1000
+
+For pages of each size, print the payload size of both formats, raw and
+gzipped, the time the server takes to answer them, and the time to parse them
+with Python and, when node is installed, to parse and decode them with the
+decoder of `library.js`, checking that it gives back the books of the JSON
+format.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from .run import build_library, measure
+
+LIBRARY_JS = Path(__file__).parent.parent / "app" / "static" / "library.js"
+
+# Load library.js without a DOM and time the decoding of both formats.
+NODE_SCRIPT = """
+const fs = require('fs');
+const [source, jsonPath, compactPath, repeat] = process.argv.slice(1);
+globalThis.document = new Proxy({}, { get: () => () => null });
+const CompactFormat = new Function(`${fs.readFileSync(source, 'utf8')}\\nreturn CompactFormat;`)();
+const json = fs.readFileSync(jsonPath, 'utf8');
+const compact = fs.readFileSync(compactPath, 'utf8');
+
+function median(fn) {
+    for (let i = 0; i < 5; i++) fn();
+    const timings = [];
+    for (let i = 0; i < repeat; i++) {
+        const start = process.hrtime.bigint();
+        fn();
+        timings.push(Number(process.hrtime.bigint() - start) / 1e6);
+    }
+    return timings.sort((a, b) => a - b)[timings.length >> 1];
+}
+
+const expected = JSON.stringify(JSON.parse(json).data.books);
+const decoded = JSON.stringify(CompactFormat.decode(JSON.parse(compact).data.books));
+console.log(JSON.stringify({
+    json_ms: median(() => JSON.parse(json).data.books),
+    compact_ms: median(() => CompactFormat.decode(JSON.parse(compact).data.books)),
+    identical: expected === decoded,
+}));
+"""
+
+
+def decode_in_node(json_body, compact_body, repeat):
+    """Return the median ms node takes to decode each payload, or None without node."""
+    node = shutil.which("node")
+    if node is None:
+        return None
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, name) for name in ("json", "compact")]
+        for path, body in zip(paths, (json_body, compact_body)):
+            Path(path).write_bytes(body)
+        process = subprocess.run(
+            [node, "-e", NODE_SCRIPT, str(LIBRARY_JS), *paths, str(repeat)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(process.stdout)
+
+
+def bench_formats(client, size, limit, repeat):
+    urls = {
+        "json": f"/api/books?limit={limit}",
+        "compact": f"/api/books?limit={limit}&format=compact",
+    }
+    bodies = {name: client.get(url).data for name, url in urls.items()}
+    for name, url in urls.items():
+        body = bodies[name]
+        yield {
+            "size": size,
+            "limit": limit,
+            "format": name,
+            "bytes": len(body),
+            "gzip_bytes": len(gzip.compress(body)),
+            "server": measure(lambda: client.get(url), repeat),
+            "python_parse": measure(lambda: json.loads(body), repeat),
+        }
+
+    node = decode_in_node(bodies["json"], bodies["compact"], repeat)
+    if node is not None:
+        yield {"size": size, "limit": limit, "format": "node"} | node
+
+
+def run(size, limits, repeat, seed):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        build_library(path, size, seed)
+        os.environ["BOOKTRACKER_DATABASE_PATH"] = path
+        from app import create_app
+        from app.db import pool
+
+        client = create_app().test_client()
+        for limit in limits:
+            for result in bench_formats(client, size, limit, repeat):
+                results.append(result)
+                if result["format"] == "node":
+                    print(
+                        f"[{limit}] node decode: json {result['json_ms']:.3f} ms, "
+                        f"compact {result['compact_ms']:.3f} ms, "
+                        f"identical: {result['identical']}",
+                        file=sys.stderr,
+                    )
+                else:
+                    print(
+                        f"[{limit}] {result['format']:<8} {result['bytes']:>9} bytes "
+                        f"({result['gzip_bytes']:>7} gzipped)  "
+                        f"server {result['server']['median_ms']:.3f} ms  "
+                        f"python parse {result['python_parse']['median_ms']:.3f} ms",
+                        file=sys.stderr,
+                    )
+        pool.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10_000, help="Books in the library.")
+    parser.add_argument("--limits", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per measurement.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = run(args.size, args.limits, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
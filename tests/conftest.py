@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+
+import pytest
+
+from app.db import current_library
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """The app, keeping its libraries in a directory of its own.
+
+    The app is created once, its routes and commands register on import. Tests
+    keep apart by using libraries of their own.
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("BOOKTRACKER_LIBRARIES_PATH", str(tmp_path_factory.mktemp("libraries")))
+        monkeypatch.setenv("BOOKTRACKER_BACKUP_PATH", str(tmp_path_factory.mktemp("backups")))
+        from app import create_app
+
+        app = create_app()
+    yield app
+
+    from app.db import pool
+
+    pool.close()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@contextmanager
+def selected(library):
+    """Select a library for the repository calls of the block."""
+    token = current_library.set(library)
+    try:
+        yield
+    finally:
+        current_library.reset(token)
+
+
+
+@pytest.fixture(scope="session")
+def seeded(app):
+    """Name of a library seeded with synthetic books."""
+    from app.importer import BulkImporter
+    from benchmarks.synthetic import generate_lines
+
+    with app.app_context(), selected("seeded"):
+        report = BulkImporter(batch_size=1000).run(generate_lines(2000, 0))
+    assert not report.failures
+    return "seeded"
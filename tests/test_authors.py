@@ -0,0 +1,53 @@
+import pytest
+
+from app.authors import author_resolver
+from app.db import pool
+
+from .conftest import selected
+
+LIBRARY = {"X-Library": "authors"}
+
+
+def create(client, **book):
+    items = [book | {"title": book.get("title", "Untitled")}]
+    data = client.post("/api/books/batch", json={"books": items}, headers=LIBRARY).get_json()
+    return data["data"]["results"][0]
+
+
+def test_rolled_back_savepoint_does_not_cache_authors(client):
+    isbn = "9780306406157"
+    assert create(client, title="Taken", author_last="Doe", isbn=isbn)["status"] == "success"
+
+    # The new author is inserted, then rolled back with the item.
+    items = [{"title": "Zed's", "author_last": "Zed", "isbn": isbn}]
+    payload = {"books": items, "mode": "best_effort"}
+    data = client.post("/api/books/batch", json=payload, headers=LIBRARY).get_json()["data"]
+    assert data["results"][0]["status"] != "success"
+
+    # Which hands its ID to the next new author.
+    other = create(client, title="Other's", author_last="Other")
+    zed = create(client, title="Zed's", author_last="Zed")
+    assert other["status"] == zed["status"] == "success"
+
+    books = client.get("/api/books?per_page=10", headers=LIBRARY).get_json()["data"]["books"]
+    authors = {book["title"]: book["author_last"] for book in books}
+    assert authors["Zed's"] == "Zed"
+    assert authors["Other's"] == "Other"
+
+
+def test_rolled_back_sweep_keeps_candidates(app, monkeypatch):
+    monkeypatch.setattr(author_resolver, "sweep_batch", 1)
+    with app.app_context(), selected("sweep"):
+        with pool.connection() as conn:
+            author_id = author_resolver.resolve(conn.cursor(), "Orphan", "")
+        _, candidates = author_resolver._library()
+
+        with pytest.raises(RuntimeError):
+            with pool.connection() as conn:
+                author_resolver.release(conn.cursor(), author_id)
+                raise RuntimeError("rolled back")
+        assert author_id in candidates
+
+        with pool.connection() as conn:
+            assert author_resolver.sweep(conn.cursor()) == 1
+        assert author_id not in candidates
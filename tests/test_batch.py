@@ -0,0 +1,22 @@
+import pytest
+
+LIBRARY = {"X-Library": "batch"}
+
+
+@pytest.mark.parametrize("route", ["/api/books/batch", "/api/books/status/batch"])
+@pytest.mark.parametrize(
+    "payload",
+    [[{"title": "Listed"}], "books", 7, {"books": {"title": "Not a list"}}, {"statuses": "x"}, {}],
+)
+def test_invalid_payloads_fail(client, route, payload):
+    method = client.post if route == "/api/books/batch" else client.patch
+    response = method(route, json=payload, headers=LIBRARY)
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "fail"
+
+
+def test_atomic_batch_creates_books(client):
+    items = [{"title": "One", "author_last": "Doe"}, {"title": "Two", "author_last": "Doe"}]
+    data = client.post("/api/books/batch", json={"books": items}, headers=LIBRARY).get_json()["data"]
+    assert data["committed"] is True
+    assert [result["status"] for result in data["results"]] == ["success", "success"]
@@ -0,0 +1,41 @@
+import re
+
+from app.models import BookRepository
+
+from .conftest import selected
+from .test_libraries import add_book
+
+LIBRARY = {"X-Library": "changes"}
+
+
+def changes(client, since):
+    return client.get(f"/api/books/changes?since={since}", headers=LIBRARY).get_json()["data"]
+
+
+def test_cursor_survives_full_compaction(app, client):
+    add_book(client, "changes", "First")
+    add_book(client, "changes", "Second")
+    page = client.get("/index", headers=LIBRARY)
+
+    with app.app_context(), selected("changes"):
+        seq = BookRepository.get_change_seq()
+        assert BookRepository.compact_changes(-10) > 0
+        # Every entry expired, the cursor stays where the log ended.
+        assert BookRepository.get_change_seq() == seq
+
+    assert changes(client, seq) | {"books": []} == {
+        "resync": False,
+        "books": [],
+        "deleted": [],
+        "seq": seq,
+        "more": False,
+    }
+    resync = changes(client, 0)
+    assert resync == {"resync": True, "seq": seq}
+    assert changes(client, resync["seq"])["resync"] is False
+
+    # The page embedding the old sequence number is not served from cache.
+    response = client.get("/index", headers=LIBRARY | {"If-None-Match": page.headers["ETag"]})
+    assert response.status_code == 200
+    embedded = re.search(rb'data-changes-seq="(\d+)"', response.data).group(1)
+    assert int(embedded) == seq
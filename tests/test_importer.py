@@ -0,0 +1,71 @@
+import pytest
+
+from app.importer import BulkImporter, ParsedRow, format_row, parse_row
+from app.models import BookRepository
+
+from .conftest import selected
+
+HEADER = "Titre;Auteur;Série;Année;Forme;Genre;Éditeur;Langue;Lu;ISBN\n"
+
+
+def test_numbers_are_parsed():
+    row = parse_row(2, ["Dune", "Herbert, Frank", "Dune #2", "1969", "", "", "", "", "Oui"])
+    assert (row.volume, row.year) == (2, 1969)
+    assert parse_row(3, ["Dune", "Herbert", "", "", "", "", "", "", "Non"]).year is None
+
+
+@pytest.mark.parametrize(
+    "row, error",
+    [
+        (["Dune", "Herbert", "", "circa 1965", "", "", "", "", "Oui"], "invalid year"),
+        (["Dune", "Herbert", "Dune #two", "1965", "", "", "", "", "Oui"], "invalid volume"),
+    ],
+)
+def test_invalid_numbers_fail_the_row(row, error):
+    with pytest.raises(ValueError, match=error):
+        parse_row(2, row)
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        {"series": "Dune", "volume": 2, "publisher": "Pocket", "collection": "Science-fiction"},
+        {"series": "Dune", "volume": None, "publisher": None, "collection": "Folio"},
+        {"series": "Les #Hashtags", "volume": 3, "publisher": "Pocket", "collection": None},
+    ],
+)
+def test_exported_rows_import_back(fields):
+    book = ParsedRow(
+        line=2,
+        title="Dune",
+        author_last="Herbert",
+        author_first="Frank",
+        year=1965,
+        language="Anglais",
+        genre="Sf",
+        written_form="Roman",
+        isbn="9780306406157",
+        status="read",
+        **fields,
+    )
+    assert parse_row(2, format_row(book)) == book
+
+
+def test_invalid_rows_are_reported(app):
+    lines = [
+        HEADER,
+        "Dune;Herbert, Frank;Dune #1;1965;Roman;Sf;;Anglais;Oui;\n",
+        "Hyperion;Simmons, Dan;;vers 1989;Roman;Sf;;Anglais;Non;\n",
+        "Fondation;Asimov, Isaac;Fondation #un;1951;Roman;Sf;;Français;Non;\n",
+    ]
+    with app.app_context(), selected("importer"):
+        report = BulkImporter().run(lines)
+        books = BookRepository.find_all()
+
+    assert report.imported == 1
+    assert [(failure["line"], failure["title"]) for failure in report.failures] == [
+        (3, "Hyperion"),
+        (4, "Fondation"),
+    ]
+    assert [(book.title, book.volume, book.year) for book in books] == [("Dune", 1, 1965)]
+    assert parse_row(2, format_row(books[0])).year == 1965
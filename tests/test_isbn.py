@@ -0,0 +1,18 @@
+import pytest
+
+BATCH = "/api/books/isbn/batch"
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [["9780000000002"], "9780000000002", 42, None, {"isbns": "9780000000002"}, {"isbns": [1, 2]}],
+)
+def test_invalid_json_batches_fail(client, payload):
+    response = client.post(BATCH, json=payload)
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "fail"
+
+
+def test_batch_without_isbns_fails(client):
+    response = client.post(BATCH, data={})
+    assert response.get_json()["status"] == "fail"
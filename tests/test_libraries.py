@@ -0,0 +1,45 @@
+import gzip
+
+
+def add_book(client, library, title):
+    response = client.post(
+        "/api/books",
+        data={"title": title, "author_last": "Doe", "author_first": "Jane"},
+        headers={"X-Library": library},
+    )
+    assert response.get_json()["status"] == "success"
+    return response.get_json()["data"]["book"]["id"]
+
+
+def test_listings_are_kept_apart(client):
+    add_book(client, "list-a", "Only in A")
+    add_book(client, "list-b", "Only in B")
+
+    for library, title in (("list-a", "Only in A"), ("list-b", "Only in B")):
+        books = client.get("/api/books", headers={"X-Library": library}).get_json()["data"]["books"]
+        assert [book["title"] for book in books] == [title]
+
+
+def test_exports_are_kept_apart(client):
+    add_book(client, "export-a", "Exported from A")
+    add_book(client, "export-b", "Exported from B")
+
+    csv = {
+        library: client.get(
+            "/api/books/export?format=csv", headers={"X-Library": library}
+        ).get_data(as_text=True)
+        for library in ("export-a", "export-b")
+    }
+    assert "Exported from A" in csv["export-a"] and "Exported from B" not in csv["export-a"]
+    assert "Exported from B" in csv["export-b"] and "Exported from A" not in csv["export-b"]
+
+    ndjson = client.get(
+        "/api/books/export", headers={"X-Library": "export-b", "Accept-Encoding": "gzip"}
+    )
+    assert b"Exported from B" in gzip.decompress(ndjson.data)
+    assert b"Exported from A" not in gzip.decompress(ndjson.data)
+
+
+def test_invalid_library_is_turned_down(client):
+    response = client.get("/api/books", headers={"X-Library": "../escape"})
+    assert response.get_json()["status"] == "fail"
@@ -0,0 +1,24 @@
+from .test_libraries import add_book
+
+LIBRARY = {"X-Library": "listing"}
+
+
+def titles(client, query):
+    books = client.get(f"/api/books?{query}", headers=LIBRARY).get_json()["data"]["books"]
+    return [book["title"] for book in books]
+
+
+def test_status_filter(client):
+    add_book(client, "listing", "Never opened")
+    add_book(client, "listing", "Finished")
+    finished = next(
+        book["id"]
+        for book in client.get("/api/books", headers=LIBRARY).get_json()["data"]["books"]
+        if book["title"] == "Finished"
+    )
+    client.patch(f"/api/books/{finished}/status", data={"status": "read"}, headers=LIBRARY)
+
+    assert titles(client, "status=not_read") == ["Never opened"]
+    assert titles(client, "status=read") == ["Finished"]
+    assert sorted(titles(client, "status=read&status=not_read")) == ["Finished", "Never opened"]
+    assert titles(client, "status=reading") == []
@@ -0,0 +1,23 @@
+from app.metrics import normalize_query
+
+
+def test_in_lists_share_a_label():
+    labels = {
+        normalize_query(f"SELECT id FROM books WHERE id IN ({', '.join('?' * size)})")
+        for size in (1, 2, 50)
+    }
+    assert labels == {"SELECT id FROM books WHERE id IN (...)"}
+    assert normalize_query("SELECT 1 WHERE x in (?,?)") == "SELECT 1 WHERE x IN (...)"
+
+
+def test_values_lists_share_a_label():
+    rows = ", ".join(["(?, ?)"] * 3)
+    assert normalize_query(f"INSERT INTO t (a, b)\n  VALUES {rows}") == (
+        "INSERT INTO t (a, b) VALUES (...)"
+    )
+
+
+def test_subqueries_are_kept():
+    sql = "SELECT id FROM books WHERE id IN (SELECT book_id FROM read_status)"
+    assert normalize_query(sql) == sql
+
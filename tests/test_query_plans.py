@@ -0,0 +1,54 @@
+import pytest
+
+from app.models import BookRepository
+
+from .conftest import selected
+
+
+@pytest.fixture
+def traced(app, seeded):
+    """Statements issued by every repository query, run on the seeded library."""
+    from app.commands import trace_repository_queries
+
+    with app.app_context(), selected(seeded):
+        yield trace_repository_queries()
+
+
+def test_every_repository_query_is_traced(traced):
+    assert any(statement.lstrip().startswith("INSERT") for statement in traced)
+    assert any("books_changes" in statement for statement in traced)
+    assert len(traced) > 20
+
+
+def test_no_repository_query_scans_a_table(app, seeded, traced):
+    from app.commands import FULL_SCAN
+
+    scans = {}
+    with app.app_context(), selected(seeded):
+        for statement in traced:
+            steps = [step for step in BookRepository.explain(statement, ()) if FULL_SCAN.match(step)]
+            if steps:
+                scans[statement] = steps
+    assert scans == {}
+
+
+def test_no_listing_page_or_facet_scans_a_table(app, seeded):
+    from app.commands import listing_queries, plan_scans
+
+    scans = {}
+    with app.app_context(), selected(seeded):
+        for name, (sql, params), page, unfiltered in listing_queries():
+            steps = plan_scans(BookRepository.explain(sql, params), page, unfiltered)
+            if steps:
+                scans[name] = steps
+    assert scans == {}
+
+
+def test_only_unfiltered_pages_may_walk_the_listing_order():
+    from app.commands import plan_scans
+
+    walk = ["SCAN books USING INDEX books_title", "SEARCH authors USING INTEGER PRIMARY KEY"]
+    assert plan_scans(walk, page=True, unfiltered=True) == []
+    assert plan_scans(walk, page=True) == walk[:1]
+    assert plan_scans(["SCAN books"], page=True) == ["SCAN books"]
+    assert plan_scans(["SCAN books", "USE TEMP B-TREE FOR ORDER BY"], True, True) == ["SCAN books"]
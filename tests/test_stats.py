@@ -0,0 +1,18 @@
+from app.stats import StatsRepository
+
+from .conftest import selected
+from .test_libraries import add_book
+
+LIBRARY = "stats"
+
+
+def test_status_counts_include_not_read(app, client):
+    book_ids = [add_book(client, LIBRARY, title) for title in ("One", "Two", "Three")]
+    client.patch(
+        f"/api/books/{book_ids[0]}/status", data={"status": "read"}, headers={"X-Library": LIBRARY}
+    )
+
+    with app.app_context(), selected(LIBRARY):
+        assert StatsRepository.summary()["status"] == {"not_read": 2, "read": 1}
+        assert StatsRepository.facet("status", 10) == [("not_read", 2), ("read", 1)]
+        assert StatsRepository.check() == []